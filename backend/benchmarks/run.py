@@ -0,0 +1,303 @@
+# benchmarks/run.py - Offline per-stage timings for the analysis pipeline
+"""Time each stage of the analysis pipeline without a camera or network.
+
+Run from backend/:
+
+    python -m benchmarks.run                    # run, compare with benchmarks/baseline.json
+    python -m benchmarks.run --output out.json  # also write the results as JSON
+    python -m benchmarks.run --only scoring     # stages whose name starts with "scoring"
+    python -m benchmarks.run --update-baseline  # store this run as the new baseline
+
+Speech stages also report their real-time factor (processing time per
+second of audio). The nearby.* stages compare k-nearest stroke-center
+lookups on the offline index with a brute-force haversine scan.
+
+A stage whose median time exceeds its baseline by more than --tolerance is
+reported as a regression and the exit status is 1. Baselines are only
+comparable on the machine that recorded them.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+# Importing main must not send SMS or create an outbox file next to the code
+os.environ.setdefault('SMS_PROVIDER', 'fake')
+os.environ.setdefault('NOTIFY_OUTBOX_PATH', ':memory:')
+
+import cv2
+import mediapipe as mp
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+IMAGES_DIR = os.path.join(BACKEND_DIR, '..', 'frontend', 'flutter_app', 'assets', 'images')
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baseline.json')
+
+SYNTHETIC_FRAMES = 300
+SPEECH_SECONDS = 60
+SPEECH_SAMPLE_RATE = 16000
+FACILITIES = 10000
+NEARBY_QUERIES = 200
+
+
+def load_jpeg(name, quality=90):
+    """Sample image re-encoded as the JPEG bytes a phone would upload"""
+    image = cv2.imread(os.path.join(IMAGES_DIR, name))
+    if image is None:
+        raise FileNotFoundError(f"Sample image {name} not found in {IMAGES_DIR}")
+    ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buffer.tobytes()
+
+
+def synthetic_points(frames, landmarks, seed=0):
+    """Landmarks scattered around the image centre, shaped like extracted MediaPipe output"""
+    rng = np.random.default_rng(seed)
+    points = rng.normal(0.5, 0.1, size=(frames, landmarks, 3)).astype(np.float32)
+    visibility = rng.uniform(0.6, 1.0, size=(frames, landmarks)).astype(np.float32)
+    return points, visibility
+
+
+def synthetic_speech(seconds, sample_rate=SPEECH_SAMPLE_RATE, seed=0):
+    """Voiced syllables (harmonic series, ~4.5 per second, varying pitch) with pauses, as 16-bit PCM"""
+    rng = np.random.default_rng(seed)
+    signal = rng.normal(0, 0.003, int(seconds * sample_rate))
+    position = 0.2
+    while position < seconds - 0.3:
+        duration = rng.uniform(0.12, 0.2)
+        t = np.arange(int(duration * sample_rate)) / sample_rate
+        phase = 2 * np.pi * 120 * 2 ** (rng.normal(0, 3) / 12) * t
+        start = int(position * sample_rate)
+        signal[start:start + len(t)] += np.sin(np.pi * t / duration) ** 2 * sum(
+            np.sin(k * phase) / k for k in range(1, 8)
+        )
+        position += 1 / 4.5 + (0.35 if rng.random() < 0.15 else 0.0)
+    return (signal / np.abs(signal).max() * 0.5 * 32767).astype('<i2').reshape(-1, 1)
+
+
+def write_facilities(path, count, seed=0):
+    """Facility CSV with ``count`` centers scattered over the inhabited latitudes"""
+    rng = np.random.default_rng(seed)
+    latitudes = rng.uniform(-55, 70, count)
+    longitudes = rng.uniform(-180, 180, count)
+    with open(path, 'w') as f:
+        f.write("name,latitude,longitude,phone\n")
+        for i, (lat, lon) in enumerate(zip(latitudes, longitudes)):
+            f.write(f"Center {i},{lat:.6f},{lon:.6f},555-{i:04d}\n")
+
+
+def write_video(path, image, fps=60, seconds=2):
+    height, width = image.shape[:2]
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    for _ in range(int(fps * seconds)):
+        writer.write(image)
+    writer.release()
+
+
+def time_stage(fn, repeat, warmup=2, items=1):
+    """Run ``fn`` ``warmup + repeat`` times and summarize the timed runs in milliseconds"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples = np.array(samples)
+    median = float(np.median(samples))
+    return {
+        "median_ms": median,
+        "p90_ms": float(np.percentile(samples, 90)),
+        "mean_ms": float(samples.mean()),
+        "min_ms": float(samples.min()),
+        "runs": repeat,
+        "items_per_run": items,
+        "items_per_second": items * 1000 / median if median else None,
+    }
+
+
+def build_stages(repeat):
+    """(name, fn, repeat, items) for every stage; models are created once, outside the timings"""
+    import main
+    import facial_arm
+    from utils.aggregation import ScoreAggregator
+    from utils.nearby_services import StrokeCenterIndex, build_index
+    from utils.preprocessing import RgbFrameBuffer, decode_frame
+    from utils.speech import SpeechFeatureExtractor, analyze_samples, to_mono_float
+
+    face_jpeg = load_jpeg('normal_face.png')
+    arm_jpeg = load_jpeg('asymmetrical_arms.png')
+    face_bgr = cv2.imdecode(np.frombuffer(face_jpeg, np.uint8), cv2.IMREAD_COLOR)
+    arm_bgr = cv2.imdecode(np.frombuffer(arm_jpeg, np.uint8), cv2.IMREAD_COLOR)
+    face_rgb = RgbFrameBuffer(main.FACE_INPUT_SIZE).convert(face_bgr).copy()
+    arm_rgb = RgbFrameBuffer(main.POSE_INPUT_SIZE).convert(arm_bgr).copy()
+    rgb_buffer = RgbFrameBuffer(main.FACE_INPUT_SIZE)
+
+    face_mesh = main.create_face_mesh()
+    pose = main.create_pose()
+    analyzer = main.SymmetryAnalyzer()
+
+    face_points, _ = synthetic_points(SYNTHETIC_FRAMES, 478)
+    arm_points, arm_visibility = synthetic_points(SYNTHETIC_FRAMES, 33, seed=1)
+    face_frames = list(face_points)
+    arm_frames, arm_frame_visibility = list(arm_points), list(arm_visibility)
+    scores = np.random.default_rng(2).uniform(0.4, 1.0, size=1000)
+
+    speech = synthetic_speech(SPEECH_SECONDS)
+    speech_second = to_mono_float(speech[:SPEECH_SAMPLE_RATE])
+
+    full_aggregator = ScoreAggregator()
+    full_aggregator.extend(scores)
+
+    def push_scores():
+        aggregator = ScoreAggregator()
+        for score in scores:
+            aggregator.push(score)
+
+    def upload(test, frames):
+        main.score_uploaded_frames(test, frames)
+
+    def detect(model, detect_fn, image):
+        # A reset forces the full detector instead of the cheaper landmark tracking path
+        model.reset()
+        detect_fn(model, image)
+
+    video_dir = tempfile.mkdtemp(prefix='stroke-bench-')
+    video_path = os.path.join(video_dir, 'arms_60fps.mp4')
+    write_video(video_path, arm_bgr)
+
+    facilities_path = os.path.join(video_dir, 'facilities.csv')
+    index_dir = os.path.join(video_dir, 'stroke_centers')
+    write_facilities(facilities_path, FACILITIES)
+    build_index(facilities_path, index_dir)
+    centers = StrokeCenterIndex.load(index_dir)
+    locations = np.random.default_rng(3).uniform([-55, -180], [70, 180], size=(NEARBY_QUERIES, 2)).tolist()
+
+    def nearest(query):
+        for lat, lon in locations:
+            query(lat, lon, 3)
+
+    inference_repeat = max(3, repeat // 4)
+    return video_dir, [
+        ("decode.full", lambda: cv2.imdecode(np.frombuffer(face_jpeg, np.uint8), cv2.IMREAD_COLOR), repeat, 1),
+        ("decode.reduced", lambda: decode_frame(face_jpeg, max_side=main.FACE_INPUT_SIZE), repeat, 1),
+        ("color.cvtcolor", lambda: cv2.cvtColor(face_bgr, cv2.COLOR_BGR2RGB), repeat, 1),
+        ("color.rgb_buffer", lambda: rgb_buffer.convert(face_bgr), repeat, 1),
+        ("inference.face_mesh.detect", lambda: detect(face_mesh, main.detect_face_landmarks, face_rgb), inference_repeat, 1),
+        ("inference.face_mesh.track", lambda: main.detect_face_landmarks(face_mesh, face_rgb), inference_repeat, 1),
+        ("inference.pose.detect", lambda: detect(pose, main.detect_pose_landmarks, arm_rgb), inference_repeat, 1),
+        ("inference.pose.track", lambda: main.detect_pose_landmarks(pose, arm_rgb), inference_repeat, 1),
+        ("scoring.face_batch", lambda: analyzer.score_face_batch(face_frames), repeat, SYNTHETIC_FRAMES),
+        ("scoring.arm_batch", lambda: analyzer.score_arm_batch(arm_frames, arm_frame_visibility), repeat, SYNTHETIC_FRAMES),
+        ("aggregation.push", push_scores, repeat, len(scores)),
+        ("aggregation.finalize", full_aggregator.finalize, repeat, 1),
+        ("pipeline.face_upload", lambda: upload("face", [face_jpeg] * 8), inference_repeat, 8),
+        ("pipeline.arm_upload", lambda: upload("arm", [arm_jpeg] * 8), inference_repeat, 8),
+        ("speech.features_1s", lambda: SpeechFeatureExtractor(SPEECH_SAMPLE_RATE).feed(speech_second), repeat, 1),
+        ("speech.analyze", lambda: analyze_samples(speech, SPEECH_SAMPLE_RATE), max(3, repeat // 4), SPEECH_SECONDS),
+        ("nearby.load", lambda: StrokeCenterIndex.load(index_dir), repeat, 1),
+        ("nearby.kdtree_k3", lambda: nearest(centers.nearest_ids), repeat, NEARBY_QUERIES),
+        ("nearby.brute_force_k3", lambda: nearest(centers.brute_force_ids), repeat, NEARBY_QUERIES),
+        ("facial_arm.frame", lambda: facial_arm.is_symmetrical(arm_bgr), inference_repeat, 1),
+        ("facial_arm.video", lambda: facial_arm.analyze_arm_symmetry(video_path, workers=1), max(2, repeat // 10), 120),
+    ]
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "mediapipe": getattr(mp, '__version__', 'unknown'),
+    }
+
+
+def run(repeat=20, only=None):
+    video_dir, stages = build_stages(repeat)
+    results = {}
+    try:
+        for name, fn, stage_repeat, items in stages:
+            if only and not any(name.startswith(prefix) for prefix in only):
+                continue
+            results[name] = time_stage(fn, stage_repeat, items=items)
+            line = f"{name:<30} {results[name]['median_ms']:>10.3f} ms  (p90 {results[name]['p90_ms']:.3f})"
+            if name.startswith("speech."):
+                # Speech stages count seconds of audio; below 1 is faster than real time
+                results[name]["realtime_factor"] = results[name]["median_ms"] / 1000 / items
+                line += f"  RTF {results[name]['realtime_factor']:.4f}"
+            print(line)
+    finally:
+        shutil.rmtree(video_dir)
+    return {"environment": environment(), "created_at": time.time(), "results": results}
+
+
+def compare(report, baseline, tolerance):
+    """Per-stage ratio against the baseline medians; returns the names of regressed stages"""
+    if baseline["environment"].get("platform") != report["environment"]["platform"] or \
+            baseline["environment"].get("cpu_count") != report["environment"]["cpu_count"]:
+        print("warning: baseline was recorded on a different machine; ratios are indicative only")
+
+    regressions = []
+    print(f"\n{'stage':<30} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for name, current in report["results"].items():
+        reference = baseline["results"].get(name)
+        if reference is None:
+            print(f"{name:<30} {'-':>10} {current['median_ms']:>10.3f} {'new':>7}")
+            continue
+        ratio = current["median_ms"] / reference["median_ms"] if reference["median_ms"] else 1.0
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 - tolerance:
+            flag = "  improved"
+        current["baseline_median_ms"] = reference["median_ms"]
+        current["ratio"] = ratio
+        print(f"{name:<30} {reference['median_ms']:>10.3f} {current['median_ms']:>10.3f} {ratio:>7.2f}{flag}")
+    report["regressions"] = regressions
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=20, help="timed runs per cheap stage")
+    parser.add_argument('--only', action='append', help="run stages starting with this prefix (repeatable)")
+    parser.add_argument('--output', help="write the JSON report here")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown before flagging, as a fraction")
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args(argv)
+
+    report = run(args.repeat, args.only)
+
+    regressions = []
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"\nBaseline written to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+    else:
+        print(f"\nNo baseline at {args.baseline}; run with --update-baseline to record one")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if regressions:
+        print(f"\n{len(regressions)} stage(s) regressed by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
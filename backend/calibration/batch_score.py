@@ -0,0 +1,316 @@
+# calibration/batch_score.py - Parallel, resumable landmark extraction and scoring over datasets
+"""Score directories of images and videos with the server's analysis pipeline, for threshold calibration.
+
+Run from backend/:
+
+    python -m calibration.batch_score data/stroke data/normal --output runs/calibration --workers 8
+
+Every image and every sampled video frame becomes one row of the output
+store (see calibration/feature_store.py): its FaceMesh and Pose landmarks,
+the arm landmark visibility, the frame size and both symmetry scores. The
+label of a file is the name of the directory it is in. Files are spread over
+a process pool, each worker with its own FaceMesh and Pose.
+
+Frames take the upload endpoints' path at the best quality tier: that tier's
+model variant and input size, images decoded by ``decode_frame`` (reduced
+JPEG scale), and one ROI tracker per file, which is one session. Video frames
+come out of the container already decoded, so only their resize to the input
+size matches an upload.
+
+Rows are committed in shards of whole files, so running the same command
+again after an interruption skips every file already in the store.
+calibration.sweep then re-derives the thresholds from the stored landmarks.
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from calibration.feature_store import ShardWriter
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.webp'}
+VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mov', '.mkv', '.webm'}
+TESTS = ("face", "arm")
+POSE_LANDMARKS = 33
+# FaceMesh adds 10 iris landmarks when the tier refines landmarks
+FACE_LANDMARKS = 468
+REFINED_FACE_LANDMARKS = 478
+
+# Per-process state, set up by init_worker
+_worker = None
+
+
+def discover(inputs):
+    """``(path, label, kind)`` for every image and video under ``inputs``, in a stable order"""
+    found = []
+    for root in inputs:
+        if os.path.isfile(root):
+            paths = [os.path.abspath(root)]
+        else:
+            paths = [
+                os.path.abspath(os.path.join(directory, name))
+                for directory, _, names in os.walk(root)
+                for name in names
+            ]
+        for path in paths:
+            extension = os.path.splitext(path)[1].lower()
+            kind = "image" if extension in IMAGE_EXTENSIONS else "video" if extension in VIDEO_EXTENSIONS else None
+            if kind:
+                found.append((path, os.path.basename(os.path.dirname(path)), kind))
+    return sorted(set(found))
+
+
+def init_worker(tests):
+    """Build this process's models once; importing main keeps every setting identical to the server"""
+    global _worker
+    # Importing main must not send SMS; the outbox is never used here
+    os.environ.setdefault('SMS_PROVIDER', 'fake')
+    os.environ.setdefault('NOTIFY_OUTBOX_PATH', ':memory:')
+    import main
+    from utils.preprocessing import RgbFrameBuffer
+
+    tier = main.quality.tier(main.QUALITY_BEST_TIER)
+    _worker = {
+        "main": main, "tests": tests, "analyzer": main.SymmetryAnalyzer(),
+        "face_landmarks": REFINED_FACE_LANDMARKS if tier.face_refine else FACE_LANDMARKS,
+    }
+    for test in tests:
+        _, input_size = main.model_for(test, tier)
+        model = main.create_face_mesh(tier.face_refine) if test == "face" else main.create_pose(tier.pose_complexity)
+        _worker[test] = (model, input_size, RgbFrameBuffer(input_size))
+
+
+def iter_frames(path, kind, fps):
+    """``(frame_index, frame)``: an image's file bytes, or the BGR frames of a video sampled at about ``fps`` (0 keeps every frame)"""
+    cv2 = _worker["main"].cv2
+    if kind == "image":
+        with open(path, "rb") as f:
+            yield 0, f.read()
+        return
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError("unreadable video")
+    source_fps = cap.get(cv2.CAP_PROP_FPS)
+    # Same sampling as facial_arm.sample_stride
+    stride = max(1, int(round(source_fps / fps))) if fps > 0 and source_fps > 0 else 1
+    try:
+        frame_index = 0
+        while cap.grab():
+            if frame_index % stride == 0:
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+                yield frame_index, frame
+            frame_index += 1
+    finally:
+        cap.release()
+
+
+def decode_image(contents, input_sizes):
+    """An image file decoded like an uploaded frame for each input size, and its full ``(width, height)``"""
+    from utils.preprocessing import decode_frame, jpeg_dimensions
+
+    images = {size: decode_frame(contents, max_side=size) for size in set(input_sizes)}
+    if any(image is None for image in images.values()):
+        raise ValueError("unreadable image")
+    # Reduced decodes are smaller than the file; only JPEGs are reduced and their header has the size
+    size = jpeg_dimensions(contents) or next(iter(images.values())).shape[1::-1]
+    return images, size
+
+
+def score_file(path, kind, fps):
+    """Landmarks and scores of every sampled frame of one file, as columns; runs in a worker"""
+    from utils.scoring import arm_symmetry_scores, face_symmetry_scores
+
+    main = _worker["main"]
+    tests = _worker["tests"]
+    analyzer = _worker["analyzer"]
+    trackers = {}
+    for test in tests:
+        model = _worker[test][0]
+        # No tracking state may carry over from the previous file
+        model.reset()
+        trackers[test] = main.create_tracker(test, model)
+
+    rows = {"frame_index": [], "frame_size": []}
+    face_points, arm_points, arm_visibility = [], [], []
+    for frame_index, frame in iter_frames(path, kind, fps):
+        if kind == "image":
+            images, size = decode_image(frame, [_worker[test][1] for test in tests])
+        else:
+            images, size = None, frame.shape[1::-1]
+        rows["frame_index"].append(frame_index)
+        rows["frame_size"].append(size)
+        for test in tests:
+            model, input_size, buffer = _worker[test]
+            img_rgb = buffer.convert(frame if images is None else images[input_size])
+            if test == "face":
+                face_points.append(analyzer.extract_face_points(img_rgb, model, trackers[test]))
+            else:
+                extracted = analyzer.extract_pose_points(img_rgb, model, trackers[test])
+                arm_points.append(None if extracted is None else extracted[0])
+                arm_visibility.append(None if extracted is None else extracted[1])
+
+    frames = len(rows["frame_index"])
+    if not frames:
+        return None
+    columns = {
+        "frame_index": np.array(rows["frame_index"], dtype=np.int32),
+        "frame_size": np.array(rows["frame_size"], dtype=np.int32).reshape(frames, 2),
+    }
+    if "face" in tests:
+        # Fixed by the tier, so shards stay stackable even for files without a single face
+        found, points = stack_found(face_points, (_worker["face_landmarks"], 3))
+        columns.update(face_found=found, face_points=points, face_score=found_scores(found, points, face_symmetry_scores))
+    if "arm" in tests:
+        found, points = stack_found(arm_points, (POSE_LANDMARKS, 3))
+        _, visibility = stack_found(arm_visibility, (POSE_LANDMARKS,))
+        columns.update(
+            arm_found=found, arm_points=points, arm_visibility=visibility,
+            arm_score=found_scores(found, points, lambda p: arm_symmetry_scores(p, visibility[found]))
+        )
+    return columns
+
+
+def stack_found(values, shape):
+    """Per-frame arrays (None where nothing was detected) as a found mask and one zero-filled float32 array"""
+    found = np.array([value is not None for value in values])
+    stacked = np.zeros((len(values),) + shape, dtype=np.float32)
+    if found.any():
+        stacked[found] = np.stack([value for value in values if value is not None])
+    return found, stacked
+
+
+def found_scores(found, points, score):
+    """Scores of the frames with a detection, NaN elsewhere"""
+    scores = np.full(len(found), np.nan, dtype=np.float32)
+    if found.any():
+        scores[found] = score(points[found])
+    return scores
+
+
+def score_task(path, kind, fps):
+    """Worker entry point: never raises, so one bad file cannot stop the run"""
+    start = time.perf_counter()
+    try:
+        columns, error = score_file(path, kind, fps), None
+    except Exception as e:
+        columns, error = None, str(e)
+    return columns, error, time.perf_counter() - start
+
+
+def run(inputs, output, workers=None, fps=15.0, tests=TESTS, shard_rows=4096, limit=None):
+    """Score every file under ``inputs`` not yet in ``output``; returns ``(files_scored, frames)``"""
+    workers = workers or os.cpu_count() or 1
+    tests = [test for test in TESTS if test in tests]
+    settings = scoring_settings(tests, fps)
+    writer = ShardWriter(output, settings, shard_rows)
+    done = writer.completed
+    todo = [item for item in discover(inputs) if item[0] not in done]
+    if limit is not None:
+        todo = todo[:limit]
+    print(f"{len(todo)} files to score ({len(done)} already in {output}), {workers} worker(s)", flush=True)
+
+    scored = 0
+    frames = 0
+    started = time.perf_counter()
+
+    def record(item, outcome):
+        nonlocal scored, frames
+        path, label, kind = item
+        columns, error, elapsed = outcome
+        entry = {"path": path, "label": label, "kind": kind, "seconds": round(elapsed, 3)}
+        if error:
+            entry["error"] = error
+        writer.add_file(entry, columns)
+        scored += 1
+        rows = 0 if columns is None else len(columns["frame_index"])
+        frames += rows
+        status = f"error: {error}" if error else f"{rows} frames"
+        print(f"[{scored}/{len(todo)}] {path}: {status} in {elapsed:.1f}s", flush=True)
+
+    try:
+        if workers <= 1:
+            init_worker(tests)
+            for item in todo:
+                record(item, score_task(item[0], item[2], fps))
+        else:
+            # spawn rather than fork: MediaPipe graphs own threads that do not survive a fork
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_worker,
+                initargs=(tests,)
+            ) as pool:
+                pending = {}
+                queue = iter(todo)
+                try:
+                    while True:
+                        # A couple of files per worker in flight keeps them busy without holding the whole dataset's results
+                        for item in queue:
+                            pending[pool.submit(score_task, item[0], item[2], fps)] = item
+                            if len(pending) >= workers * 2:
+                                break
+                        if not pending:
+                            break
+                        finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            record(pending.pop(future), future.result())
+                except BaseException:
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    raise
+    finally:
+        # Files finished before an interruption are kept; only those still in flight are redone
+        writer.flush()
+
+    elapsed = time.perf_counter() - started
+    print(f"Scored {scored} files, {frames} frames in {elapsed:.1f}s "
+          f"({frames / elapsed if elapsed else 0:.1f} frames/s)", flush=True)
+    return scored, frames
+
+
+def scoring_settings(tests, fps):
+    """Everything that changes the rows; a store can only be resumed with the same settings"""
+    # Read from the environment the way main does, without importing it (and MediaPipe) in the parent
+    import mediapipe
+
+    return {
+        "tests": list(tests),
+        "fps": fps,
+        "quality_tier": os.getenv('QUALITY_BEST_TIER', 'standard'),
+        "face_input_size": int(os.getenv('FACE_INPUT_SIZE', '640')),
+        "pose_input_size": int(os.getenv('POSE_INPUT_SIZE', '640')),
+        "roi_tracking": os.getenv('ROI_TRACKING', '1') != '0',
+        "mediapipe": mediapipe.__version__,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('inputs', nargs='+', help="image/video files or directories (searched recursively)")
+    parser.add_argument('--output', required=True, help="store directory; an existing one is resumed")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument('--fps', type=float, default=15.0, help="video frames analyzed per second; 0 for every frame")
+    parser.add_argument('--tests', nargs='+', choices=TESTS, default=list(TESTS))
+    parser.add_argument('--shard-rows', type=int, default=4096, help="frames per output shard")
+    parser.add_argument('--limit', type=int, default=None, help="score at most this many new files")
+    args = parser.parse_args(argv)
+
+    try:
+        run(args.inputs, args.output, args.workers, args.fps, args.tests, args.shard_rows, args.limit)
+    except ValueError as e:
+        parser.error(str(e))
+    except KeyboardInterrupt:
+        print("\nInterrupted; run the same command again to continue", file=sys.stderr)
+        return 130
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
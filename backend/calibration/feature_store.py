@@ -0,0 +1,185 @@
+# calibration/feature_store.py - Columnar .npy shards of per-frame landmarks and scores
+"""On-disk layout of a scoring run, written by ``ShardWriter`` and read by ``FeatureStore``:
+
+    <store>/manifest.json                 settings, finished input files and committed shards
+    <store>/shards/00000/<column>.npy     one array per column; row i of every column is one frame
+
+A shard is written under a temporary name and renamed into place before the
+manifest listing it is replaced, so after an interruption the manifest only
+names complete shards and exactly the input files whose rows they hold.
+"""
+
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+MANIFEST_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+SHARDS_DIR = "shards"
+
+# Per-frame columns; the landmark columns of a test are only present when it was scored
+FRAME_COLUMNS = ("file_id", "frame_index", "frame_size")
+TEST_COLUMNS = {
+    "face": ("face_found", "face_points", "face_score"),
+    "arm": ("arm_found", "arm_points", "arm_visibility", "arm_score"),
+}
+
+
+def columns_for(tests):
+    return FRAME_COLUMNS + tuple(column for test in tests for column in TEST_COLUMNS[test])
+
+
+def read_manifest(directory):
+    """The store's manifest, or None if nothing has been committed yet"""
+    path = os.path.join(directory, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"Unsupported feature store version {manifest.get('version')} in {directory}")
+    return manifest
+
+
+def write_json_atomic(path, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class ShardWriter:
+    """Buffers the rows of finished input files and commits them as shards of about ``shard_rows`` frames.
+
+    Files are the unit of progress: a file's rows all go into one shard, and
+    the file counts as done once that shard is committed. Opening an existing
+    store resumes it; ``settings`` must match those it was created with,
+    since rows scored differently cannot be mixed.
+    """
+
+    def __init__(self, directory, settings, shard_rows=4096):
+        self.directory = directory
+        self.shard_rows = shard_rows
+        self.columns = columns_for(settings["tests"])
+        os.makedirs(os.path.join(directory, SHARDS_DIR), exist_ok=True)
+
+        manifest = read_manifest(directory)
+        if manifest is None:
+            manifest = {"version": MANIFEST_VERSION, "settings": settings, "files": [], "shards": [],
+                        "created_at": time.time()}
+        elif manifest["settings"] != settings:
+            raise ValueError(
+                f"{directory} was scored with different settings ({manifest['settings']}); "
+                f"use a new output directory"
+            )
+        self.manifest = manifest
+        self._remove_uncommitted()
+
+        self._pending_files = []
+        self._pending = {column: [] for column in self.columns}
+        self.pending_rows = 0
+
+    @property
+    def completed(self):
+        """Paths of the input files already in the store"""
+        return {entry["path"] for entry in self.manifest["files"]}
+
+    def _remove_uncommitted(self):
+        # Leftovers of an interrupted run: renamed or half-written shards the manifest never listed
+        committed = {shard["name"] for shard in self.manifest["shards"]}
+        shards_dir = os.path.join(self.directory, SHARDS_DIR)
+        for name in os.listdir(shards_dir):
+            if name not in committed:
+                shutil.rmtree(os.path.join(shards_dir, name), ignore_errors=True)
+
+    def add_file(self, entry, columns=None):
+        """Queue one input file; ``entry`` is its manifest record and ``columns`` its rows (None for none)"""
+        file_id = len(self.manifest["files"]) + len(self._pending_files)
+        entry = dict(entry, id=file_id, frames=0)
+        if columns is not None:
+            rows = len(columns["frame_index"])
+            entry["frames"] = rows
+            columns["file_id"] = np.full(rows, file_id, dtype=np.int32)
+            for column in self.columns:
+                self._pending[column].append(columns[column])
+            self.pending_rows += rows
+        self._pending_files.append(entry)
+        if self.pending_rows >= self.shard_rows:
+            self.flush()
+        return file_id
+
+    def flush(self):
+        """Commit the buffered files: write their shard, then the manifest that lists it"""
+        if not self._pending_files:
+            return
+        if self.pending_rows:
+            name = f"{len(self.manifest['shards']):05d}"
+            final = os.path.join(self.directory, SHARDS_DIR, name)
+            tmp = os.path.join(self.directory, SHARDS_DIR, f".tmp-{name}")
+            os.makedirs(tmp, exist_ok=True)
+            for column in self.columns:
+                np.save(os.path.join(tmp, f"{column}.npy"), np.concatenate(self._pending[column]))
+            os.replace(tmp, final)
+            self.manifest["shards"].append({
+                "name": name,
+                "rows": self.pending_rows,
+                "files": [entry["id"] for entry in self._pending_files if entry["frames"]],
+            })
+        self.manifest["files"].extend(self._pending_files)
+        self.manifest["updated_at"] = time.time()
+        write_json_atomic(os.path.join(self.directory, MANIFEST_NAME), self.manifest)
+
+        self._pending_files = []
+        self._pending = {column: [] for column in self.columns}
+        self.pending_rows = 0
+
+
+class FeatureStore:
+    """Read-only view of a store: shards are memory-mapped, so opening it reads only the manifest.
+
+    ``files`` is the file index (entry ``i`` has id ``i``); the ``file_id``
+    column ties every frame row to it. Rows of a file are contiguous and in
+    frame order.
+    """
+
+    def __init__(self, directory):
+        manifest = read_manifest(directory)
+        if manifest is None:
+            raise FileNotFoundError(f"No feature store at {directory}")
+        self.directory = directory
+        self.settings = manifest["settings"]
+        self.files = manifest["files"]
+        self.shards = manifest["shards"]
+        self.columns = columns_for(self.settings["tests"])
+        self.rows = sum(shard["rows"] for shard in self.shards)
+
+    def __len__(self):
+        return self.rows
+
+    @property
+    def labels(self):
+        """Label of every file, indexed by file id"""
+        return np.array([entry["label"] for entry in self.files])
+
+    def shard(self, index, columns):
+        """Memory-mapped ``columns`` of one shard"""
+        missing = set(columns) - set(self.columns)
+        if missing:
+            raise KeyError(f"Columns not in this store: {', '.join(sorted(missing))}")
+        path = os.path.join(self.directory, SHARDS_DIR, self.shards[index]["name"])
+        return {column: np.load(os.path.join(path, f"{column}.npy"), mmap_mode="r") for column in columns}
+
+    def iter_shards(self, columns):
+        for index in range(len(self.shards)):
+            yield self.shard(index, columns)
+
+    def column(self, name):
+        """One column over the whole store, in memory; meant for the small per-frame columns"""
+        if not self.shards:
+            return np.empty(0)
+        return np.concatenate([shard[name] for shard in self.iter_shards([name])])
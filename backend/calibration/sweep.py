@@ -0,0 +1,244 @@
+# calibration/sweep.py - Vectorized rescoring and threshold sweeps over a feature store
+"""Recompute symmetry scores from stored landmarks and sweep the decision threshold.
+
+Run from backend/ on a store written by calibration.batch_score:
+
+    python -m calibration.sweep runs/calibration --test face
+    python -m calibration.sweep runs/calibration --test face --drop-pair 17:18 --output face_roc.json
+    python -m calibration.sweep runs/calibration --test arm --arm-weights 0.6 0.4 --arm-scales 4 3
+
+No model runs: scores come from the stored landmarks with the same
+vectorized functions the server uses, one memory-mapped shard at a time.
+Candidate landmark pairs and weights can therefore be evaluated in seconds.
+
+By default each recording is scored as the upload endpoints do (the mean of
+the rolling-median-smoothed frame scores). A test is positive when that score
+is below the threshold. Files whose label is one of --positive are strokes.
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from calibration.feature_store import FeatureStore
+from utils.scoring import (
+    ARM_SYMMETRY_SCALES, ARM_SYMMETRY_WEIGHTS, ARM_THRESHOLD, FACE_THRESHOLD, FACIAL_SYMMETRY_PAIRS,
+    MIN_ARM_VISIBILITY, arm_symmetry_scores, face_symmetry_scores
+)
+
+CURRENT_THRESHOLDS = {"face": FACE_THRESHOLD, "arm": ARM_THRESHOLD}
+# Same window as utils.aggregation.ScoreAggregator
+SMOOTHING_WINDOW = 5
+
+
+def frame_scores(store, test, pairs=FACIAL_SYMMETRY_PAIRS, pair_weights=None,
+                 weights=ARM_SYMMETRY_WEIGHTS, scales=ARM_SYMMETRY_SCALES, min_visibility=MIN_ARM_VISIBILITY):
+    """``(file_ids, scores)`` of every usable frame in the store, rescored with the given parameters.
+
+    Usable frames are those the server would score: a detection, and for
+    arms all key landmarks visible. Rows keep store order, so each file's
+    frames stay contiguous and in frame order.
+    """
+    columns = ["file_id", f"{test}_found", f"{test}_points"] + (["arm_visibility"] if test == "arm" else [])
+    file_ids = []
+    scores = []
+    for shard in store.iter_shards(columns):
+        found = np.asarray(shard[f"{test}_found"])
+        if not found.any():
+            continue
+        points = shard[f"{test}_points"][found]
+        if test == "face":
+            shard_scores = face_symmetry_scores(points, pairs, pair_weights)
+        else:
+            visibility = shard["arm_visibility"][found]
+            shard_scores = arm_symmetry_scores(points, visibility, min_visibility, weights, scales)
+        usable = ~np.isnan(shard_scores)
+        file_ids.append(np.asarray(shard["file_id"])[found][usable])
+        scores.append(shard_scores[usable])
+    if not scores:
+        return np.empty(0, dtype=np.int32), np.empty(0)
+    return np.concatenate(file_ids), np.concatenate(scores)
+
+
+def smoothed_frame_scores(file_ids, scores, window=SMOOTHING_WINDOW):
+    """Centred rolling median of each file's scores, the window truncated at the file's first and last frames.
+
+    Equals the per-frame values ScoreAggregator sums for ``smoothed_mean``,
+    for every file at once.
+    """
+    half = window // 2
+    n = len(scores)
+    offsets = np.arange(-half, half + 1)
+    index = np.arange(n)[:, None] + offsets
+    inside = (index >= 0) & (index < n)
+    index = np.clip(index, 0, max(n - 1, 0))
+    inside &= file_ids[index] == file_ids[:, None]
+    # NaN sorts last, so each row's valid values come first
+    windows = np.sort(np.where(inside, scores[index], np.nan), axis=1)
+    valid = inside.sum(axis=1)
+    rows = np.arange(n)
+    return (windows[rows, (valid - 1) // 2] + windows[rows, valid // 2]) / 2
+
+
+def file_scores(file_ids, scores, files, statistic="smoothed_mean"):
+    """Per-file score (NaN for files without usable frames) and usable frame count, indexed by file id"""
+    counts = np.bincount(file_ids, minlength=files)
+    means = np.bincount(file_ids, weights=scores, minlength=files)
+    if statistic == "smoothed_mean":
+        smoothed = np.bincount(file_ids, weights=smoothed_frame_scores(file_ids, scores), minlength=files)
+        # Like ScoreAggregator, short recordings use the plain mean
+        means = np.where(counts > SMOOTHING_WINDOW, smoothed, means)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return means / counts, counts
+
+
+def roc_curve(scores, positive):
+    """``(thresholds, tpr, fpr)`` with one point per distinct score; ``score < threshold`` is a positive call"""
+    order = np.argsort(scores, kind="stable")
+    ordered = scores[order]
+    true_positives = np.cumsum(positive[order])
+    false_positives = np.cumsum(~positive[order])
+    # The last row of each run of equal scores: raising the threshold just past it flags the whole run
+    last = np.append(ordered[1:] != ordered[:-1], True)
+    thresholds = np.concatenate([[ordered[0]], np.nextafter(ordered[last], np.inf)])
+    tpr = np.concatenate([[0], true_positives[last]]) / max(positive.sum(), 1)
+    fpr = np.concatenate([[0], false_positives[last]]) / max((~positive).sum(), 1)
+    return thresholds, tpr, fpr
+
+
+def auc(tpr, fpr):
+    return float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2))
+
+
+def sweep(scores, positive, thresholds):
+    """Confusion counts and rates at every threshold, vectorized over thresholds"""
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    true_positives = np.searchsorted(np.sort(scores[positive]), thresholds, side="left")
+    false_positives = np.searchsorted(np.sort(scores[~positive]), thresholds, side="left")
+    positives = int(positive.sum())
+    negatives = len(scores) - positives
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sensitivity = true_positives / positives
+        specificity = 1 - false_positives / negatives
+        precision = true_positives / (true_positives + false_positives)
+        f1 = 2 * precision * sensitivity / (precision + sensitivity)
+    return {
+        "threshold": thresholds,
+        "true_positives": true_positives,
+        "false_positives": false_positives,
+        "sensitivity": sensitivity,
+        "specificity": specificity,
+        "precision": precision,
+        "accuracy": (true_positives + negatives - false_positives) / len(scores),
+        "f1": f1,
+        "youden_j": sensitivity + specificity - 1,
+    }
+
+
+def operating_point(metrics, i):
+    return {key: float(values[i]) for key, values in metrics.items()}
+
+
+def evaluate(store, test, positive_labels, level="file", statistic="smoothed_mean",
+             thresholds=None, min_sensitivity=0.95, **params):
+    """Rescore ``test`` over the store and summarize its ROC and the notable thresholds"""
+    start = time.perf_counter()
+    file_ids, scores = frame_scores(store, test, **params)
+    is_positive = np.isin(store.labels, list(positive_labels)) if store.files else np.empty(0, dtype=bool)
+    if level == "file":
+        scores, counts = file_scores(file_ids, scores, len(store.files), statistic)
+        usable = counts > 0
+        scores, positive = scores[usable], is_positive[usable]
+    else:
+        positive = is_positive[file_ids]
+    rescored = time.perf_counter() - start
+    if not positive.any() or positive.all():
+        raise ValueError(f"Need both positive ({', '.join(positive_labels)}) and negative {level}s with a usable {test} score")
+
+    roc_thresholds, tpr, fpr = roc_curve(scores, positive)
+    if thresholds is None:
+        thresholds = np.linspace(0, 1, 101)
+    grid = sweep(scores, positive, thresholds)
+    candidates = sweep(scores, positive, roc_thresholds)
+    current = sweep(scores, positive, [CURRENT_THRESHOLDS[test]])
+    best = int(np.nanargmax(candidates["youden_j"]))
+    report = {
+        "test": test,
+        "level": level,
+        "statistic": statistic if level == "file" else "frame",
+        "samples": int(len(scores)),
+        "positives": int(positive.sum()),
+        "negatives": int((~positive).sum()),
+        "auc": auc(tpr, fpr),
+        "current": operating_point(current, 0),
+        "best_youden": operating_point(candidates, best),
+        "roc": {"threshold": roc_thresholds.tolist(), "tpr": tpr.tolist(), "fpr": fpr.tolist()},
+        "sweep": {key: np.asarray(values).tolist() for key, values in grid.items()},
+        "seconds": {"rescore": rescored, "total": time.perf_counter() - start},
+    }
+    # Screening favours sensitivity: the most specific threshold that still catches enough strokes
+    meets = np.flatnonzero(candidates["sensitivity"] >= min_sensitivity)
+    if len(meets):
+        i = meets[np.nanargmax(candidates["specificity"][meets])]
+        report["min_sensitivity"] = dict(operating_point(candidates, i), target=min_sensitivity)
+    return report
+
+
+def parse_pair(value):
+    left, right = value.split(":")
+    return int(left), int(right)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('store', help="directory written by calibration.batch_score")
+    parser.add_argument('--test', choices=sorted(CURRENT_THRESHOLDS), required=True)
+    parser.add_argument('--positive', action='append', help="label of stroke recordings (repeatable; default: stroke)")
+    parser.add_argument('--level', choices=("file", "frame"), default="file")
+    parser.add_argument('--statistic', choices=("smoothed_mean", "mean"), default="smoothed_mean")
+    parser.add_argument('--pairs', type=parse_pair, nargs='+', metavar="LEFT:RIGHT",
+                        help="face landmark pairs to use instead of FACIAL_SYMMETRY_PAIRS")
+    parser.add_argument('--drop-pair', type=parse_pair, action='append', default=[], metavar="LEFT:RIGHT")
+    parser.add_argument('--pair-weights', type=float, nargs='+', help="one weight per face pair")
+    parser.add_argument('--arm-weights', type=float, nargs=2, default=ARM_SYMMETRY_WEIGHTS, metavar=("HEIGHT", "DISTANCE"))
+    parser.add_argument('--arm-scales', type=float, nargs=2, default=ARM_SYMMETRY_SCALES, metavar=("HEIGHT", "DISTANCE"))
+    parser.add_argument('--min-visibility', type=float, default=MIN_ARM_VISIBILITY)
+    parser.add_argument('--min-sensitivity', type=float, default=0.95)
+    parser.add_argument('--output', help="write the full report (ROC curve and sweep) as JSON")
+    args = parser.parse_args(argv)
+
+    pairs = [pair for pair in (args.pairs or FACIAL_SYMMETRY_PAIRS) if tuple(pair) not in set(args.drop_pair)]
+    if args.pair_weights is not None and len(args.pair_weights) != len(pairs):
+        parser.error(f"--pair-weights needs one weight per pair ({len(pairs)})")
+    store = FeatureStore(args.store)
+    if args.test not in store.settings["tests"]:
+        parser.error(f"{args.store} has no {args.test} landmarks")
+    try:
+        report = evaluate(
+            store, args.test, args.positive or ["stroke"], args.level, args.statistic,
+            min_sensitivity=args.min_sensitivity, pairs=pairs, pair_weights=args.pair_weights,
+            weights=tuple(args.arm_weights), scales=tuple(args.arm_scales), min_visibility=args.min_visibility
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    print(f"{report['test']} ({report['level']} level): {report['samples']} samples, "
+          f"{report['positives']} positive / {report['negatives']} negative, "
+          f"{len(store)} frames rescored in {report['seconds']['rescore']:.2f}s")
+    print(f"AUC {report['auc']:.4f}")
+    for name in ("current", "best_youden", "min_sensitivity"):
+        if name in report:
+            point = report[name]
+            print(f"{name:<16} threshold {point['threshold']:.4f}  sensitivity {point['sensitivity']:.3f}  "
+                  f"specificity {point['specificity']:.3f}  accuracy {point['accuracy']:.3f}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,66 +1,227 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Request, request, jsonify
 import cv2
 import mediapipe as mp
 import numpy as np
 import time
 import os
+import multiprocessing
+import queue
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from werkzeug.utils import secure_filename
 
+class SpoolingRequest(Request):
+    """Parses uploaded files straight into SPOOL_FOLDER rather than werkzeug's /tmp rollover file"""
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        extension = os.path.splitext(secure_filename(filename or ''))[1]
+        # Deleted when closed, which Flask does when the request ends
+        return tempfile.NamedTemporaryFile(suffix=extension, dir=app.config['SPOOL_FOLDER'])
+
 app = Flask(__name__)
+app.request_class = SpoolingRequest
 mp_pose = mp.solutions.pose
-pose = mp_pose.Pose()
+# Idle Pose models; a model keeps tracking state, so each is used by one request thread at a time
+_poses = queue.SimpleQueue()
 
 # Configuration
-UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov'}
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+
+# Uploads are parsed straight into tmpfs when available (OpenCV needs a path to open a video) and removed with the request
+SPOOL_FOLDER = os.getenv('SPOOL_FOLDER', '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir())
+app.config['SPOOL_FOLDER'] = SPOOL_FOLDER
+
+# Frames per second actually analyzed; 0 analyzes every recorded frame
+ANALYSIS_FPS = float(os.getenv('ANALYSIS_FPS', '15'))
+
+# Long clips are split into time segments analyzed in parallel, each worker process with its own Pose
+VIDEO_WORKERS = int(os.getenv('VIDEO_WORKERS', os.cpu_count() or 1))
+SEGMENT_SECONDS = float(os.getenv('SEGMENT_SECONDS', '10'))
+_video_pool = None
+_video_pool_lock = threading.Lock()
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def analyze_arm_symmetry(video_path):
-    cap = cv2.VideoCapture(video_path)
+def sample_stride(source_fps, target_fps):
+    """Keep every n-th frame so a clip recorded at source_fps is analyzed at about target_fps"""
+    if not target_fps or target_fps <= 0 or not source_fps or source_fps <= 0:
+        return 1
+    return max(1, int(round(source_fps / target_fps)))
+
+@contextmanager
+def borrowed_pose():
+    """A Pose model with fresh tracking state, returned to the pool afterwards"""
+    try:
+        model = _poses.get_nowait()
+    except queue.Empty:
+        model = mp_pose.Pose()
+    model.reset()
+    try:
+        yield model
+    finally:
+        _poses.put(model)
+
+def is_symmetrical(frame, pose=None):
+    """None if no pose was found, otherwise whether the wrists are level about the midline"""
+    if pose is None:
+        with borrowed_pose() as model:
+            return is_symmetrical(frame, model)
+    image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    results = pose.process(image)
+    
+    if not results.pose_landmarks:
+        return None
+    
+    landmarks = results.pose_landmarks.landmark
+    frame_width = frame.shape[1]
+    frame_height = frame.shape[0]
+    
+    # Get keypoints
+    left_shoulder = (int(landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER].x * frame_width),
+                    int(landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER].y * frame_height))
+    right_shoulder = (int(landmarks[mp_pose.PoseLandmark.RIGHT_SHOULDER].x * frame_width),
+                     int(landmarks[mp_pose.PoseLandmark.RIGHT_SHOULDER].y * frame_height))
+    left_wrist = (int(landmarks[mp_pose.PoseLandmark.LEFT_WRIST].x * frame_width),
+                 int(landmarks[mp_pose.PoseLandmark.LEFT_WRIST].y * frame_height))
+    right_wrist = (int(landmarks[mp_pose.PoseLandmark.RIGHT_WRIST].x * frame_width),
+                  int(landmarks[mp_pose.PoseLandmark.RIGHT_WRIST].y * frame_height))
+    
+    # Calculate midline
+    mid_x = (left_shoulder[0] + right_shoulder[0]) // 2
+    
+    # Calculate distances from symmetry line
+    left_dist = abs(left_wrist[0] - mid_x)
+    right_dist = abs(right_wrist[0] - mid_x)
+    
+    # Symmetry check
+    threshold = 20
+    return abs(left_dist - right_dist) <= threshold
+
+def count_frames(cap, pose, stride, limit=None):
+    """Count sampled frames among the next ``limit`` frames of cap (all remaining ones if None)"""
     symmetrical_frames = 0
     total_frames = 0
+    frames_read = 0
     
-    while cap.isOpened():
-        ret, frame = cap.read()
+    while limit is None or frames_read < limit:
+        # Dropped frames are only grabbed: no retrieve/colour conversion and no inference
+        if not cap.grab():
+            break
+        frames_read += 1
+        if (frames_read - 1) % stride:
+            continue
+        
+        ret, frame = cap.retrieve()
         if not ret:
             break
-            
-        image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = pose.process(image)
         
-        if results.pose_landmarks:
-            landmarks = results.pose_landmarks.landmark
-            frame_width = frame.shape[1]
-            frame_height = frame.shape[0]
-            
-            # Get keypoints
-            left_shoulder = (int(landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER].x * frame_width),
-                            int(landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER].y * frame_height))
-            right_shoulder = (int(landmarks[mp_pose.PoseLandmark.RIGHT_SHOULDER].x * frame_width),
-                             int(landmarks[mp_pose.PoseLandmark.RIGHT_SHOULDER].y * frame_height))
-            left_wrist = (int(landmarks[mp_pose.PoseLandmark.LEFT_WRIST].x * frame_width),
-                         int(landmarks[mp_pose.PoseLandmark.LEFT_WRIST].y * frame_height))
-            right_wrist = (int(landmarks[mp_pose.PoseLandmark.RIGHT_WRIST].x * frame_width),
-                          int(landmarks[mp_pose.PoseLandmark.RIGHT_WRIST].y * frame_height))
-            
-            # Calculate midline
-            mid_x = (left_shoulder[0] + right_shoulder[0]) // 2
-            
-            # Calculate distances from symmetry line
-            left_dist = abs(left_wrist[0] - mid_x)
-            right_dist = abs(right_wrist[0] - mid_x)
-            
-            # Symmetry check
-            threshold = 20
-            if abs(left_dist - right_dist) <= threshold:
-                symmetrical_frames += 1
-            total_frames += 1
+        symmetrical = is_symmetrical(frame, pose)
+        if symmetrical is None:
+            continue
+        if symmetrical:
+            symmetrical_frames += 1
+        total_frames += 1
+    
+    return {
+        "symmetrical_frames": symmetrical_frames,
+        "total_frames": total_frames,
+        "frames_read": frames_read
+    }
+
+def seek_exact(cap, frame_index, source_fps):
+    """Position cap so the next grab returns frame_index; False if that cannot be confirmed.
     
+    CAP_PROP_POS_FRAMES seeks through the container index, which is not frame
+    accurate for every file (variable frame rate, sparse keyframe index). The
+    frame just before the target is decoded and its timestamp checked instead.
+    """
+    if not source_fps or source_fps <= 0:
+        return False
+    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index - 1)
+    if not cap.grab():
+        return False
+    expected = (frame_index - 1) * 1000 / source_fps
+    return abs(cap.get(cv2.CAP_PROP_POS_MSEC) - expected) < 500 / source_fps
+
+def analyze_segment(video_path, stride, start=0, end=None):
+    """Count sampled frames in [start, end) of a video; start must be a multiple of stride.
+    
+    None if the video cannot be seeked exactly to start.
+    """
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if start and not seek_exact(cap, start, cap.get(cv2.CAP_PROP_FPS)):
+            return None
+        # A fresh tracking state per segment, so a segment scores the same in any worker
+        with borrowed_pose() as pose:
+            return count_frames(cap, pose, stride, None if end is None else end - start)
+    finally:
+        cap.release()
+
+def analyze_sequential(video_path, stride, segments):
+    """The segments in one decoding pass, no seeking; each still starts from a fresh tracking state"""
+    cap = cv2.VideoCapture(video_path)
+    parts = []
+    try:
+        with borrowed_pose() as pose:
+            for start, end in segments:
+                pose.reset()
+                parts.append(count_frames(cap, pose, stride, None if end is None else end - start))
+    finally:
+        cap.release()
+    return parts
+
+def get_video_pool():
+    """Process pool for sharded videos, created on first use; each worker builds its own Pose model"""
+    global _video_pool
+    # Concurrent first requests would otherwise each start a pool and leak all but one
+    with _video_pool_lock:
+        if _video_pool is None:
+            # spawn rather than fork: MediaPipe graphs own threads that do not survive a fork
+            _video_pool = ProcessPoolExecutor(
+                max_workers=VIDEO_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+    return _video_pool
+
+def plan_segments(frame_count, source_fps, stride):
+    """Split [0, frame_count) into stride-aligned segments of about SEGMENT_SECONDS; the last runs to EOF.
+    
+    The split depends only on the video, never on the worker count, and every
+    segment starts from a fresh tracking state, so sharded and sequential runs
+    count exactly the same frames. frame_count is the container's estimate:
+    it only places the boundaries, since the last segment reads to the end.
+    """
+    length = int(round((source_fps or 30) * SEGMENT_SECONDS))
+    length = max(stride, length + -length % stride)
+    starts = list(range(0, max(frame_count, 1), length))
+    return list(zip(starts, starts[1:] + [None]))
+
+def analyze_arm_symmetry(video_path, target_fps=ANALYSIS_FPS, workers=None):
+    workers = VIDEO_WORKERS if workers is None else workers
+    cap = cv2.VideoCapture(video_path)
+    source_fps = cap.get(cv2.CAP_PROP_FPS)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     cap.release()
     
+    stride = sample_stride(source_fps, target_fps)
+    segments = plan_segments(frame_count, source_fps, stride)
+    if workers <= 1 or len(segments) == 1:
+        parts = analyze_sequential(video_path, stride, segments)
+    else:
+        pool = get_video_pool()
+        futures = [pool.submit(analyze_segment, video_path, stride, start, end) for start, end in segments]
+        parts = [f.result() for f in futures]
+        if any(part is None for part in parts):
+            # A segment could not seek exactly; counting from the wrong frames would change the result
+            parts = analyze_sequential(video_path, stride, segments)
+    
+    symmetrical_frames = sum(part["symmetrical_frames"] for part in parts)
+    total_frames = sum(part["total_frames"] for part in parts)
+    frames_read = sum(part["frames_read"] for part in parts)
+    
     if total_frames == 0:
         return {"error": "No frames processed"}
     
@@ -71,7 +232,10 @@ def analyze_arm_symmetry(video_path):
         "symmetry_percentage": symmetry_percentage,
         "stroke_detected": stroke_detected,
         "total_frames": total_frames,
-        "symmetrical_frames": symmetrical_frames
+        "symmetrical_frames": symmetrical_frames,
+        "frames_read": frames_read,
+        "sample_stride": stride,
+        "segments": len(segments)
     }
 
 @app.route('/analyze-arm-symmetry', methods=['POST'])
@@ -84,13 +248,11 @@ def analyze_video():
         return jsonify({"error": "No selected file"}), 400
     
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
         try:
-            result = analyze_arm_symmetry(filepath)
-            os.remove(filepath)  # Clean up after analysis
+            # The upload was parsed into a spool file already; OpenCV opens it by name
+            file.stream.flush()
+            target_fps = request.args.get('fps', ANALYSIS_FPS, type=float)
+            result = analyze_arm_symmetry(file.stream.name, target_fps)
             return jsonify(result)
         except Exception as e:
             return jsonify({"error": str(e)}), 500
@@ -98,5 +260,4 @@ def analyze_video():
     return jsonify({"error": "Invalid file type"}), 400
 
 if __name__ == '__main__':
-    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
     app.run(host='0.0.0.0', port=8000, debug=True)
\ No newline at end of file
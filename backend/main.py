@@ -1,20 +1,40 @@
 # main.py - Improved Stroke Detection System
 
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+from fastapi import FastAPI, Form, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import cv2
-import mediapipe as mp
+from fastapi.responses import JSONResponse, Response
+import asyncio
 import os
-import shutil
 import numpy as np
-from twilio.rest import Client
-from typing import List
+from typing import List, Optional
+import threading
 import time
-import math
 from collections import deque
 import logging
 
+from utils.aggregation import ScoreAggregator, SequentialDecision
+from utils.cache import ResultCache, content_digest, content_key
+from utils.capture import CameraBusy, CaptureJobManager
+from utils.executor import BoundedExecutor, ExecutorBusy
+from utils.lazy import LazyModule
+from utils.metrics import (
+    EXECUTOR_IN_FLIGHT, FRAMES_LOW_VISIBILITY, FRAMES_NO_DETECTION, FRAMES_RECEIVED, INFERENCE_SECONDS,
+    REGISTRY, REQUEST_LATENCY, SCORING_SECONDS
+)
+from utils.nearby_services import StrokeCenterIndex
+from utils.notifications import FakeSmsProvider, NotificationDispatcher, Outbox, TwilioSmsProvider
+from utils.speech import PITCH_MAX_HZ, analyze_samples, pcm_view, read_wav, transcode_to_wav
+from utils.scoring import (
+    ARM_THRESHOLD, FACE_THRESHOLD, FACIAL_SYMMETRY_PAIRS, RIGHT_WRIST, angles, arm_symmetry_scores,
+    distances, face_symmetry_scores, landmarks_to_array
+)
+from utils.quality import QualityController, QualityTier, TieredModelRegistry
+from utils.preprocessing import (
+    NPY_HEADER_LIMIT, FrameChannel, RgbFrameBuffer, decode_landmark_tensor, iter_decoded_frames
+)
+from utils.tracking import RoiTracker
+from utils.uploads import UploadError, iter_multipart_files, iter_multipart_parts, read_body, with_part_timeout
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -24,8 +44,6 @@ TWILIO_SID = os.getenv('TWILIO_SID')
 TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
 TWILIO_PHONE = os.getenv('TWILIO_PHONE')
 
-twilio_client = Client(TWILIO_SID, TWILIO_AUTH_TOKEN) if TWILIO_SID else None
-
 app = FastAPI()
 
 app.add_middleware(
@@ -35,89 +53,245 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# MediaPipe setup
-mp_face_mesh = mp.solutions.face_mesh
-face_mesh = mp_face_mesh.FaceMesh(
-    static_image_mode=False, 
-    max_num_faces=1,
-    refine_landmarks=True,
-    min_detection_confidence=0.7,
-    min_tracking_confidence=0.5
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template so /capture/jobs/{job_id} stays one series
+        route = request.scope.get("route")
+        REQUEST_LATENCY.labels(
+            request.method, route.path if route is not None else "unmatched", status
+        ).observe(time.perf_counter() - start)
+
+# MediaPipe and OpenCV take over a second to import, so they load on first use (or during warm-up)
+mp = LazyModule("mediapipe")
+cv2 = LazyModule("cv2")
+
+# Under a pre-forking server (e.g. gunicorn --preload) import them in the parent instead, so
+# forked workers share those pages copy-on-write; models are still built per worker after the fork
+PRELOAD_MODULES = os.getenv('PRELOAD_MODULES', '0') == '1'
+if PRELOAD_MODULES:
+    cv2.load()
+    mp.load()
+
+# One model instance per core by default; each request checks one out for its whole frame sequence
+MODEL_POOL_SIZE = int(os.getenv('MODEL_POOL_SIZE', os.cpu_count() or 1))
+MODEL_CHECKOUT_TIMEOUT = float(os.getenv('MODEL_CHECKOUT_TIMEOUT', '30'))
+
+def create_face_mesh(refine_landmarks=True):
+    return mp.solutions.face_mesh.FaceMesh(
+        static_image_mode=False, 
+        max_num_faces=1,
+        refine_landmarks=refine_landmarks,
+        min_detection_confidence=0.7,
+        min_tracking_confidence=0.5
+    )
+
+def create_pose(model_complexity=1):
+    return mp.solutions.pose.Pose(
+        static_image_mode=False,
+        model_complexity=model_complexity,
+        smooth_landmarks=True,
+        min_detection_confidence=0.7,
+        min_tracking_confidence=0.5
+    )
+
+# Long side, in pixels, that frames are decoded/scaled to before inference (0 keeps full resolution)
+FACE_INPUT_SIZE = int(os.getenv('FACE_INPUT_SIZE', '640'))
+POSE_INPUT_SIZE = int(os.getenv('POSE_INPUT_SIZE', '640'))
+
+# Quality tiers, best first. Under load the controller steps down to lighter models and smaller
+# inputs (input_size caps the sizes above; None keeps them) and steps back up once load drops.
+QUALITY_TIERS = [
+    QualityTier("high", face_refine=True, pose_complexity=2, input_size=None),
+    QualityTier("standard", face_refine=True, pose_complexity=1, input_size=None),
+    QualityTier("reduced", face_refine=False, pose_complexity=1, input_size=480),
+    QualityTier("fast", face_refine=False, pose_complexity=0, input_size=480),
+    QualityTier("minimal", face_refine=False, pose_complexity=0, input_size=320),
+]
+QUALITY_ADAPTIVE = os.getenv('QUALITY_ADAPTIVE', '1') != '0'
+QUALITY_BEST_TIER = os.getenv('QUALITY_BEST_TIER', 'standard')
+QUALITY_WORST_TIER = os.getenv('QUALITY_WORST_TIER', 'minimal')
+QUALITY_SLO_QUEUE_WAIT_MS = float(os.getenv('QUALITY_SLO_QUEUE_WAIT_MS', '250'))
+QUALITY_SLO_INFERENCE_MS = float(os.getenv('QUALITY_SLO_INFERENCE_MS', '150'))
+QUALITY_WINDOW = float(os.getenv('QUALITY_WINDOW', '10'))
+QUALITY_COOLDOWN = float(os.getenv('QUALITY_COOLDOWN', '5'))
+
+tier_names = [tier.name for tier in QUALITY_TIERS]
+quality = QualityController(
+    QUALITY_TIERS,
+    slo_queue_wait=QUALITY_SLO_QUEUE_WAIT_MS / 1000,
+    slo_latency=QUALITY_SLO_INFERENCE_MS / 1000,
+    start=tier_names.index(QUALITY_BEST_TIER),
+    best=tier_names.index(QUALITY_BEST_TIER),
+    worst=tier_names.index(QUALITY_WORST_TIER),
+    window=QUALITY_WINDOW,
+    cooldown=QUALITY_COOLDOWN,
+    enabled=QUALITY_ADAPTIVE
 )
 
-mp_pose = mp.solutions.pose
-pose = mp_pose.Pose(
-    static_image_mode=False,
-    model_complexity=1,
-    smooth_landmarks=True,
-    min_detection_confidence=0.7,
-    min_tracking_confidence=0.5
+# Tiers that share a model variant share its pool
+face_mesh_models = TieredModelRegistry(create_face_mesh, lambda tier: tier.face_refine, MODEL_POOL_SIZE, name="FaceMesh")
+pose_models = TieredModelRegistry(create_pose, lambda tier: tier.pose_complexity, MODEL_POOL_SIZE, name="Pose")
+
+# Decode and inference run off the event loop; one worker per pooled model, plus a short bounded queue
+EXECUTOR_KIND = os.getenv('EXECUTOR_KIND', 'thread')
+EXECUTOR_WORKERS = int(os.getenv('EXECUTOR_WORKERS', MODEL_POOL_SIZE))
+EXECUTOR_QUEUE_SIZE = int(os.getenv('EXECUTOR_QUEUE_SIZE', EXECUTOR_WORKERS * 2))
+
+def init_analysis_process():
+    """Initializer of each analysis worker process: the models live there, so they are warmed there"""
+    if WARM_UP_ON_STARTUP:
+        warm_up_models()
+
+inference_executor = BoundedExecutor(
+    EXECUTOR_WORKERS, EXECUTOR_QUEUE_SIZE, kind=EXECUTOR_KIND, initializer=init_analysis_process
 )
+EXECUTOR_IN_FLIGHT.set_function(lambda: inference_executor.in_flight)
+inference_executor.add_listener(lambda queue_wait, run_time: quality.observe_queue_wait(queue_wait))
+
+# Retried uploads are answered from memory with the summary of the identical earlier request.
+# Landmarks are not cached per frame: the models run in video mode and the ROI tracker follows the
+# session, so a frame's landmarks depend on the frames before it
+REQUEST_CACHE_MB = float(os.getenv('REQUEST_CACHE_MB', '4'))
+RESULT_CACHE_TTL = float(os.getenv('RESULT_CACHE_TTL', '600'))
+
+request_cache = ResultCache(int(REQUEST_CACHE_MB * 1024 * 1024), RESULT_CACHE_TTL, name="requests")
+# Clients that retry send the same Idempotency-Key header, so the retry is answered before its body is read
+MAX_IDEMPOTENCY_KEY = 255
+
+# Upload limits, enforced while the multipart body streams in
+MAX_FRAME_BYTES = int(os.getenv('MAX_FRAME_BYTES', 8 * 1024 * 1024))
+MAX_UPLOAD_BYTES = int(os.getenv('MAX_UPLOAD_BYTES', 200 * 1024 * 1024))
+MAX_UPLOAD_FRAMES = int(os.getenv('MAX_UPLOAD_FRAMES', '300'))
+# Frames of one upload that may be received but not yet taken by the analysis worker
+UPLOAD_MAX_INFLIGHT = int(os.getenv('UPLOAD_MAX_INFLIGHT', '4'))
+# Longest wait for the next part while a running analysis job holds a worker and a pooled model
+UPLOAD_PART_TIMEOUT = float(os.getenv('UPLOAD_PART_TIMEOUT', '15'))
 
 # Directory setup
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
-# Enhanced facial landmark pairs for better symmetry detection
-FACIAL_SYMMETRY_PAIRS = [
-    (234, 454), (227, 447), (137, 366),  # Cheek landmarks
-    (130, 359), (133, 362), (145, 374),  # Eye region
-    (61, 291), (84, 314), (17, 18), (200, 199),  # Mouth region
-    (172, 397), (136, 365), (150, 379),  # Jawline
-    (98, 327), (115, 344),  # Nose region
-]
+
+# Decision thresholds on average symmetry (arm results are reported as a percentage)
+THRESHOLDS = {"face": FACE_THRESHOLD, "arm": ARM_THRESHOLD}
+
+# Stop scoring once a confidence interval on the smoothed mean clears the threshold (opt-in per request).
+# It is checked only at these frame counts, with the error budget split across them; no session
+# stops before 16 frames (see SequentialDecision), so the looks start there
+EARLY_STOP_DEFAULT = os.getenv('EARLY_STOP_DEFAULT', '0') == '1'
+EARLY_STOP_CONFIDENCE = float(os.getenv('EARLY_STOP_CONFIDENCE', '0.99'))
+EARLY_STOP_LOOKS = [int(n) for n in os.getenv('EARLY_STOP_LOOKS', '16,24,32,64,128,256').split(',')]
+
+# Crop later frames to the region found on earlier ones instead of running full-frame detection each time
+ROI_TRACKING = os.getenv('ROI_TRACKING', '1') != '0'
+
+# Pose landmarks 0-24 cover head, shoulders, arms, hands and hips; legs are irrelevant for arm drift
+UPPER_BODY_LANDMARKS = list(range(25))
+
+# Label children resolved once, so the per-frame hooks are a lock and an add
+FACE_INFERENCE = INFERENCE_SECONDS.labels("face")
+POSE_INFERENCE = INFERENCE_SECONDS.labels("arm")
+FACE_SCORING = SCORING_SECONDS.labels("face")
+ARM_SCORING = SCORING_SECONDS.labels("arm")
+FRAMES_RECEIVED_BY_TEST = {"face": FRAMES_RECEIVED.labels("face"), "arm": FRAMES_RECEIVED.labels("arm")}
+NO_FACE_DETECTED = FRAMES_NO_DETECTION.labels("face")
+NO_POSE_DETECTED = FRAMES_NO_DETECTION.labels("arm")
+
+def detect_face_landmarks(face_mesh, img_rgb):
+    """Landmarks of the first detected face, or None"""
+    start = time.perf_counter()
+    results = face_mesh.process(img_rgb)
+    elapsed = time.perf_counter() - start
+    FACE_INFERENCE.observe(elapsed)
+    quality.observe_latency(elapsed)
+    if not results.multi_face_landmarks:
+        return None
+    return results.multi_face_landmarks[0].landmark
+
+def detect_pose_landmarks(pose, img_rgb):
+    """Pose landmarks for the detected person, or None"""
+    start = time.perf_counter()
+    results = pose.process(img_rgb)
+    elapsed = time.perf_counter() - start
+    POSE_INFERENCE.observe(elapsed)
+    quality.observe_latency(elapsed)
+    if not results.pose_landmarks:
+        return None
+    return results.pose_landmarks.landmark
+
+def create_tracker(test, model):
+    """Per-session ROI tracker for a checked-out model, or None when tracking is disabled"""
+    if not ROI_TRACKING:
+        return None
+    if test == "face":
+        return RoiTracker(model, detect_face_landmarks, padding=0.25)
+    return RoiTracker(model, detect_pose_landmarks, keypoints=UPPER_BODY_LANDMARKS, padding=0.3)
+
+def stacked(frames):
+    """Per-frame arrays as one batch array; arrays that are already batched pass through uncopied"""
+    return frames if isinstance(frames, np.ndarray) else np.stack(frames)
 
 class SymmetryAnalyzer:
     def __init__(self):
         self.face_history = deque(maxlen=30)
         self.arm_history = deque(maxlen=60)
-        
+        self.aggregators = {
+            "face": ScoreAggregator(history=self.face_history),
+            "arm": ScoreAggregator(history=self.arm_history),
+        }
+    
+    def push_score(self, test, score):
+        """Add a frame score to the rolling state of a streaming session"""
+        self.aggregators[test].push(score)
+    
+    def summarize(self, test):
+        """Summary statistics over every score pushed so far, or None if there are none"""
+        return self.aggregators[test].finalize()
+    
     def calculate_angle(self, p1, p2, p3):
         """Calculate angle between three points"""
-        a = np.array([p1.x, p1.y])
-        b = np.array([p2.x, p2.y])
-        c = np.array([p3.x, p3.y])
-        
-        ba = a - b
-        bc = c - b
-        
-        cosine_angle = np.dot(ba, bc) / (np.linalg.norm(ba) * np.linalg.norm(bc) + 1e-8)
-        angle = np.arccos(np.clip(cosine_angle, -1.0, 1.0))
-        return np.degrees(angle)
+        return float(angles([p1.x, p1.y], [p2.x, p2.y], [p3.x, p3.y]))
     
     def calculate_distance(self, p1, p2):
         """Calculate Euclidean distance between two points"""
-        return math.sqrt((p1.x - p2.x)**2 + (p1.y - p2.y)**2)
+        return float(distances([p1.x, p1.y], [p2.x, p2.y]))
+    
+    def extract_face_points(self, img_rgb, face_mesh, tracker=None):
+        """Run FaceMesh and return the (N, 3) landmark array, or None if no face"""
+        if tracker is not None:
+            landmarks = tracker.process(img_rgb)
+        else:
+            landmarks = detect_face_landmarks(face_mesh, img_rgb)
+        if landmarks is None:
+            NO_FACE_DETECTED.inc()
+            return None
+        points, _ = landmarks_to_array(landmarks)
+        return points
+    
+    def extract_pose_points(self, img_rgb, pose, tracker=None):
+        """Run Pose and return ``(points, visibility)`` arrays, or None if no pose"""
+        if tracker is not None:
+            landmarks = tracker.process(img_rgb)
+        else:
+            landmarks = detect_pose_landmarks(pose, img_rgb)
+        if landmarks is None:
+            NO_POSE_DETECTED.inc()
+            return None
+        return landmarks_to_array(landmarks)
     
-    def calculate_enhanced_face_symmetry(self, frame):
+    def calculate_enhanced_face_symmetry(self, img_rgb, face_mesh, tracker=None):
         """Enhanced face symmetry calculation with multiple metrics"""
         try:
-            img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = face_mesh.process(img_rgb)
-
-            if not results.multi_face_landmarks:
+            points = self.extract_face_points(img_rgb, face_mesh, tracker)
+            if points is None:
                 return None
-
-            landmarks = results.multi_face_landmarks[0].landmark
-            
-            # Calculate multiple symmetry metrics
-            distance_diffs = []
-            for left_idx, right_idx in FACIAL_SYMMETRY_PAIRS:
-                left_point = landmarks[left_idx]
-                right_point = landmarks[right_idx]
-                
-                left_dist = abs(left_point.x - 0.5)  # Face center at 0.5
-                right_dist = abs(right_point.x - 0.5)
-                y_factor = 1 + abs(left_point.y - 0.5) * 0.5
-                diff = abs(left_dist - right_dist) / y_factor
-                distance_diffs.append(diff)
-            
-            face_width = abs(landmarks[234].x - landmarks[454].x) + 1e-6
-            avg_distance_diff = np.mean(distance_diffs)
-            distance_symmetry = max(0, 1 - (avg_distance_diff / (face_width * 0.5)))
-            
-            return max(0, min(1, distance_symmetry))
+            with FACE_SCORING.time():
+                return float(face_symmetry_scores(points))
         except Exception as e:
             logger.error(f"Error in face symmetry calculation: {e}")
             return None
@@ -125,259 +299,840 @@ class SymmetryAnalyzer:
     def calculate_enhanced_arm_symmetry(self, landmarks, frame_shape):
         """Enhanced arm symmetry calculation"""
         try:
-            left_shoulder = landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER]
-            right_shoulder = landmarks[mp_pose.PoseLandmark.RIGHT_SHOULDER]
-            left_wrist = landmarks[mp_pose.PoseLandmark.LEFT_WRIST]
-            right_wrist = landmarks[mp_pose.PoseLandmark.RIGHT_WRIST]
-            
-            min_visibility = 0.5
-            required_landmarks = [left_shoulder, right_shoulder, left_wrist, right_wrist]
-            if any(lm.visibility < min_visibility for lm in required_landmarks):
+            points, visibility = landmarks_to_array(landmarks)
+            score = arm_symmetry_scores(points, visibility)
+            return None if np.isnan(score) else float(score)
+        except Exception as e:
+            logger.error(f"Error in arm symmetry calculation: {e}")
+            return None
+    
+    def calculate_image_arm_symmetry(self, img_rgb, pose, tracker=None):
+        """Run Pose on an RGB frame and score arm symmetry, or None if no usable pose"""
+        try:
+            extracted = self.extract_pose_points(img_rgb, pose, tracker)
+            if extracted is None:
                 return None
-            
-            # Height symmetry
-            shoulder_midpoint_y = (left_shoulder.y + right_shoulder.y) / 2
-            left_wrist_height = abs(left_wrist.y - shoulder_midpoint_y)
-            right_wrist_height = abs(right_wrist.y - shoulder_midpoint_y)
-            height_diff = abs(left_wrist_height - right_wrist_height)
-            height_symmetry = max(0, 1 - (height_diff * 4))
-            
-            # Distance symmetry
-            body_center_x = (left_shoulder.x + right_shoulder.x) / 2
-            left_wrist_dist = abs(left_wrist.x - body_center_x)
-            right_wrist_dist = abs(right_wrist.x - body_center_x)
-            dist_diff = abs(left_wrist_dist - right_wrist_dist)
-            distance_symmetry = max(0, 1 - (dist_diff * 3))
-            
-            combined_symmetry = (height_symmetry * 0.5 + distance_symmetry * 0.5)
-            return max(0, min(1, combined_symmetry))
+            with ARM_SCORING.time():
+                score = arm_symmetry_scores(*extracted)
+            if np.isnan(score):
+                FRAMES_LOW_VISIBILITY.inc()
+                return None
+            return float(score)
         except Exception as e:
             logger.error(f"Error in arm symmetry calculation: {e}")
             return None
+    
+    def extract_points(self, test, img_rgb, model, tracker=None):
+        """``(points, visibility)`` for either test; visibility is None for faces"""
+        if test == "face":
+            points = self.extract_face_points(img_rgb, model, tracker)
+            return None if points is None else (points, None)
+        return self.extract_pose_points(img_rgb, model, tracker)
+    
+    def score_batch(self, test, frame_points, frame_visibility):
+        """Scores for every usable frame of either test, in frame order"""
+        if test == "face":
+            return self.score_face_batch(frame_points)
+        return self.score_arm_batch(frame_points, frame_visibility)
+    
+    def score_face_batch(self, frame_points):
+        """Face symmetry for a list of (N, 3) landmark arrays, or one (frames, N, 3) array, in one vectorized call"""
+        if len(frame_points) == 0:
+            return []
+        with FACE_SCORING.time():
+            return face_symmetry_scores(stacked(frame_points)).tolist()
+    
+    def score_arm_batch(self, frame_points, frame_visibility):
+        """Arm symmetry for lists (or stacked arrays) of pose points; frames failing the visibility check are dropped"""
+        if len(frame_points) == 0:
+            return []
+        with ARM_SCORING.time():
+            scores = arm_symmetry_scores(stacked(frame_points), stacked(frame_visibility))
+        usable = ~np.isnan(scores)
+        FRAMES_LOW_VISIBILITY.inc(int(len(scores) - usable.sum()))
+        return scores[usable].tolist()
 
 analyzer = SymmetryAnalyzer()
 
-@app.post("/analyze-face/")
-async def analyze_face_from_frames(frames: List[UploadFile] = File(...)):
-    """Analyze face symmetry from uploaded frames"""
-    try:
-        if not frames:
-            raise HTTPException(status_code=400, detail="No frames provided")
-        
-        symmetry_scores = []
-        processed_frames = 0
-        
-        for frame in frames:
-            try:
-                contents = await frame.read()
-                nparr = np.frombuffer(contents, np.uint8)
-                img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+def build_face_result(avg_symmetry, processed_frames):
+    """Face verdict shared by the upload and streaming endpoints"""
+    return {
+        "stroke_detected": avg_symmetry < FACE_THRESHOLD,
+        "avg_symmetry": avg_symmetry,
+        "frames_processed": processed_frames,
+        "threshold_used": FACE_THRESHOLD
+    }
+
+def build_arm_result(avg_symmetry, processed_frames):
+    """Arm verdict shared by the upload and streaming endpoints"""
+    return {
+        "stroke_detected": avg_symmetry < ARM_THRESHOLD,
+        "symmetry_percentage": avg_symmetry * 100,
+        "frames_processed": processed_frames,
+        "threshold_used": ARM_THRESHOLD * 100
+    }
+
+def model_for(test, tier):
+    """Model pool and input resolution used by a test at a quality tier"""
+    if test == "face":
+        pool, input_size = face_mesh_models.pool(tier), FACE_INPUT_SIZE
+    else:
+        pool, input_size = pose_models.pool(tier), POSE_INPUT_SIZE
+    if tier.input_size is not None:
+        input_size = min(input_size, tier.input_size) if input_size else tier.input_size
+    return pool, input_size
+
+def create_decision(test, early_stop):
+    """Sequential early-stopping test for a session, or None when disabled"""
+    if not early_stop:
+        return None
+    return SequentialDecision(
+        THRESHOLDS[test],
+        confidence=EARLY_STOP_CONFIDENCE,
+        looks=EARLY_STOP_LOOKS
+    )
+
+def cache_namespace(test, tier):
+    """Everything besides the frame bytes that changes a test's result"""
+    _, input_size = model_for(test, tier)
+    variant = tier.face_refine if test == "face" else tier.pose_complexity
+    return (test, input_size, variant, ROI_TRACKING, mp.__version__)
+
+def score_uploaded_frames(test, frames, early_stop=False, tier=None):
+    """Decode frames and score them on a pooled model (runs on the executor).
+    
+    ``frames`` is any iterable of JPEG bytes, including a FrameChannel fed
+    while the request body is still arriving; frames are processed in order
+    as they become available.
+    
+    Without early stopping the landmarks are collected and the whole upload is
+    scored in one vectorized call. With it, each frame is scored as soon as its
+    landmarks exist and inference stops once the verdict is settled; the rest
+    of the upload is then read but not processed.
+    
+    ``tier`` defaults to the quality tier the controller currently selects;
+    the whole upload is analyzed at that one tier.
+    """
+    tier = tier or quality.current()
+    pool, input_size = model_for(test, tier)
+    decision = create_decision(test, early_stop)
+    rgb_buffer = RgbFrameBuffer(input_size)
+    frame_points = []
+    frame_visibility = []
+    symmetry_scores = []
+    frames_used = 0
+    source = iter(frames)
+    
+    def received():
+        for contents in source:
+            FRAMES_RECEIVED_BY_TEST[test].inc()
+            yield contents
+    
+    with pool.checkout(timeout=MODEL_CHECKOUT_TIMEOUT) as model:
+        tracker = create_tracker(test, model)
+        # Later frames decode on the preprocessing threads while this one runs inference
+        decoded = iter_decoded_frames(received(), max_side=input_size)
+        try:
+            for _, img in decoded:
+                frames_used += 1
+                try:
+                    if img is None:
+                        continue
+                    
+                    extracted = analyzer.extract_points(test, rgb_buffer.convert(img), model, tracker)
+                except Exception as e:
+                    logger.warning(f"Error processing frame: {e}")
+                    continue
                 
-                if img is None:
+                if extracted is None:
                     continue
-                    
-                score = analyzer.calculate_enhanced_face_symmetry(img)
-                if score is not None:
-                    symmetry_scores.append(score)
-                    processed_frames += 1
-            except Exception as e:
-                logger.warning(f"Error processing frame: {e}")
-                continue
+                if decision is None:
+                    frame_points.append(extracted[0])
+                    frame_visibility.append(extracted[1])
+                    continue
+                
+                scores = analyzer.score_batch(test, [extracted[0]], [extracted[1]])
+                symmetry_scores.extend(scores)
+                if scores and decision.update(scores[0]):
+                    break
+        finally:
+            # Cancels decodes queued for frames that will no longer be used
+            decoded.close()
+        # A streaming sender is still waiting to hand over the rest of the upload
+        for _ in source:
+            FRAMES_RECEIVED_BY_TEST[test].inc()
+    
+    if decision is None:
+        # Score the whole upload in one vectorized call
+        symmetry_scores = analyzer.score_batch(test, frame_points, frame_visibility)
+    
+    aggregator = ScoreAggregator()
+    aggregator.extend(symmetry_scores)
+    summary = aggregator.finalize()
+    if summary is not None:
+        summary["frames_used"] = frames_used
+        summary["early_stopped"] = decision is not None and decision.settled
+        summary["quality_tier"] = tier.name
+    return summary
+
+def busy_response(e: ExecutorBusy):
+    """Fast rejection used when the analysis queue is full"""
+    logger.warning(f"Rejecting analysis request: {e}")
+    return JSONResponse(
+        content={
+            "error": "Server is busy, please retry",
+            "queue_depth": e.queue_depth,
+            "retry_after": e.retry_after
+        },
+        status_code=503,
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+async def put_frame(channel, contents, job):
+    """Queue a frame for the running ``job``; False if the job ended first and will take no more.
+    
+    A worker that raised stops reading its channel, so waiting for a free
+    slot alone would block the sender forever once the channel is full.
+    """
+    if job.done():
+        return False
+    put = asyncio.ensure_future(channel.put(contents))
+    try:
+        await asyncio.wait({put, job}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        if not put.done():
+            put.cancel()
+    return put.done() and not put.cancelled()
+
+def abandon_job(channel, job):
+    """Stop feeding a streaming job; the worker stops after its current frame and its result is discarded"""
+    channel.abort()
+    job.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+async def analyze_uploaded_frames(test, request, early_stop):
+    """Score a multipart upload while it is still arriving.
+    
+    Each ``frames`` part is handed to the analysis worker as soon as it is
+    complete, and the sender waits once UPLOAD_MAX_INFLIGHT frames are queued,
+    so a request never holds more than a few frames in memory. The job is
+    admitted before the body is read, so a busy server rejects it without
+    receiving the upload. Raises UploadError for malformed, oversized or
+    stalled bodies, and the worker's error if the analysis fails mid-upload.
+    
+    A retry that repeats the Idempotency-Key header of an earlier upload is
+    answered from the request cache before admission, without reading the
+    body or running a model. Without the header, a repeat is recognized by
+    its frame contents, which are only known once every frame has arrived;
+    by then a streamed upload has been analyzed almost entirely, so its job
+    is abandoned and the earlier verdict returned for consistency.
+    
+    Returns ``(summary, frames_received, queue_wait_seconds, cached)``.
+    """
+    retry_key = None
+    idempotency_key = request.headers.get("idempotency-key")
+    if idempotency_key is not None:
+        if not 0 < len(idempotency_key) <= MAX_IDEMPOTENCY_KEY:
+            raise UploadError(400, f"Idempotency-Key must be 1 to {MAX_IDEMPOTENCY_KEY} characters")
+        # Not tied to the quality tier: a retry gets the verdict of the first attempt
+        retry_key = content_key(test, "idempotency", early_stop, idempotency_key)
+        cached = request_cache.get(retry_key)
+        if cached is not None:
+            summary, frames_received = cached
+            return summary, frames_received, 0.0, True
+    
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_UPLOAD_BYTES:
+        raise UploadError(413, f"Request body exceeds {MAX_UPLOAD_BYTES} bytes")
+    parts = iter_multipart_files(
+        request.stream(), request.headers.get("content-type", ""), "frames",
+        MAX_FRAME_BYTES, MAX_UPLOAD_BYTES, MAX_UPLOAD_FRAMES
+    )
+    tier = quality.current()
+    frame_digests = []
+    
+    def request_key():
+        return content_key(*cache_namespace(test, tier), "request", early_stop, *frame_digests)
+    
+    def remember(summary, frames_received):
+        if summary is None:
+            return
+        request_cache.put(request_key(), summary)
+        if retry_key is not None:
+            request_cache.put(retry_key, (summary, frames_received))
+    
+    if inference_executor.kind == "process":
+        # Worker processes cannot read from a channel on this loop; collect the parts first
+        frames = [contents async for contents in parts]
+        if not frames:
+            raise UploadError(400, "No frames provided")
+        frame_digests.extend(content_digest(contents) for contents in frames)
+        summary = request_cache.get(request_key())
+        if summary is not None:
+            remember(summary, len(frames))
+            return summary, len(frames), 0.0, True
+        summary, queue_wait = await inference_executor.run(score_uploaded_frames, test, frames, early_stop, tier)
+        remember(summary, len(frames))
+        return summary, len(frames), queue_wait, False
+    
+    channel = FrameChannel(UPLOAD_MAX_INFLIGHT)
+    job = inference_executor.submit(score_uploaded_frames, test, channel, early_stop, tier)
+    frames_received = 0
+    try:
+        async for contents in with_part_timeout(parts, UPLOAD_PART_TIMEOUT):
+            if not await put_frame(channel, contents, job):
+                # The worker failed; its error is raised below without reading the rest of the body
+                break
+            frame_digests.append(content_digest(contents))
+            frames_received += 1
+    except BaseException:
+        abandon_job(channel, job)
+        raise
+    
+    summary = request_cache.get(request_key()) if frames_received else None
+    if summary is not None:
+        abandon_job(channel, job)
+        remember(summary, frames_received)
+        return summary, frames_received, 0.0, True
+    channel.close()
+    
+    summary, queue_wait = await job
+    if frames_received == 0:
+        raise UploadError(400, "No frames provided")
+    remember(summary, frames_received)
+    return summary, frames_received, queue_wait, False
+
+def upload_error_response(e: UploadError):
+    logger.warning(f"Rejecting upload: {e.detail}")
+    return JSONResponse(content={"error": e.detail}, status_code=e.status_code)
+
+def build_upload_result(test, summary, frames_received, queue_wait, cached=False):
+    """Response for an analyzed frame upload, or None when nothing was detected"""
+    if summary is None:
+        return None
+    # Temporal smoothing (5-frame median) is applied by the aggregator
+    build_result = build_face_result if test == "face" else build_arm_result
+    result = build_result(summary["smoothed_mean"], summary["count"])
+    result.update({
+        "frames_received": frames_received,
+        "frames_used": summary["frames_used"],
+        "early_stopped": summary["early_stopped"],
+        "quality_tier": summary["quality_tier"],
+        "cached": cached,
+        "queue_wait_ms": queue_wait * 1000
+    })
+    return result
+
+def no_detection_message(test):
+    return f"No valid {'face' if test == 'face' else 'pose'} detections in provided frames"
+
+@app.post("/analyze-face/")
+async def analyze_face_from_frames(request: Request, early_stop: bool = EARLY_STOP_DEFAULT):
+    """Analyze face symmetry from uploaded frames (multipart field ``frames``)"""
+    try:
+        result = build_upload_result("face", *await analyze_uploaded_frames("face", request, early_stop))
         
-        if not symmetry_scores:
+        if result is None:
             return JSONResponse(content={
                 "stroke_detected": False,
-                "message": "No valid face detections in provided frames"
+                "message": no_detection_message("face")
             }, status_code=400)
         
-        # Apply temporal smoothing
-        if len(symmetry_scores) > 5:
-            smoothed_scores = []
-            for i in range(len(symmetry_scores)):
-                window = symmetry_scores[max(0, i-2):min(len(symmetry_scores), i+3)]
-                smoothed_scores.append(np.median(window))
-            symmetry_scores = smoothed_scores
-        
-        avg_symmetry = float(np.mean(symmetry_scores))
-        stroke_detected = avg_symmetry < 0.75  # Threshold
-        
-        return JSONResponse(content={
-            "stroke_detected": stroke_detected,
-            "avg_symmetry": avg_symmetry,
-            "frames_processed": processed_frames,
-            "threshold_used": 0.75
-        })
+        return JSONResponse(content=result)
         
+    except ExecutorBusy as e:
+        return busy_response(e)
+    except UploadError as e:
+        return upload_error_response(e)
     except Exception as e:
         logger.error(f"Face analysis error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/analyze-arm/")
-async def analyze_arm_from_frames(frames: List[UploadFile] = File(...)):
-    """Analyze arm symmetry from uploaded frames"""
+async def analyze_arm_from_frames(request: Request, early_stop: bool = EARLY_STOP_DEFAULT):
+    """Analyze arm symmetry from uploaded frames (multipart field ``frames``)"""
     try:
-        if not frames:
-            raise HTTPException(status_code=400, detail="No frames provided")
+        result = build_upload_result("arm", *await analyze_uploaded_frames("arm", request, early_stop))
         
-        symmetry_scores = []
-        processed_frames = 0
-        
-        for frame in frames:
-            try:
-                contents = await frame.read()
-                nparr = np.frombuffer(contents, np.uint8)
-                img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                
-                if img is None:
-                    continue
-                    
-                img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-                results = pose.process(img_rgb)
-                
-                if results.pose_landmarks:
-                    score = analyzer.calculate_enhanced_arm_symmetry(
-                        results.pose_landmarks.landmark, 
-                        img.shape
-                    )
-                    if score is not None:
-                        symmetry_scores.append(score)
-                        processed_frames += 1
-            except Exception as e:
-                logger.warning(f"Error processing frame: {e}")
-                continue
-        
-        if not symmetry_scores:
+        if result is None:
             return JSONResponse(content={
                 "stroke_detected": False,
-                "message": "No valid pose detections in provided frames"
+                "message": no_detection_message("arm")
             }, status_code=400)
         
-        # Apply temporal smoothing
-        if len(symmetry_scores) > 5:
-            smoothed_scores = []
-            for i in range(len(symmetry_scores)):
-                window = symmetry_scores[max(0, i-2):min(len(symmetry_scores), i+3)]
-                smoothed_scores.append(np.median(window))
-            symmetry_scores = smoothed_scores
-        
-        avg_symmetry = float(np.mean(symmetry_scores))
-        stroke_detected = avg_symmetry < 0.7  # Threshold
-        
-        return JSONResponse(content={
-            "stroke_detected": stroke_detected,
-            "symmetry_percentage": avg_symmetry * 100,
-            "frames_processed": processed_frames,
-            "threshold_used": 70.0
-        })
+        return JSONResponse(content=result)
         
+    except ExecutorBusy as e:
+        return busy_response(e)
+    except UploadError as e:
+        return upload_error_response(e)
     except Exception as e:
         logger.error(f"Arm analysis error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-# Initialize analyzer
-analyzer = SymmetryAnalyzer()
+# Landmarks computed on the device, normalized like MediaPipe output: FaceMesh with refined
+# landmarks gives 478 points per frame and Pose gives 33
+LANDMARK_COUNTS = {"face": 478, "arm": 33}
+MIN_LANDMARKS = {"face": max(max(pair) for pair in FACIAL_SYMMETRY_PAIRS) + 1, "arm": RIGHT_WRIST + 1}
+LANDMARK_MAX_FRAMES = int(os.getenv('LANDMARK_MAX_FRAMES', '3600'))
 
-def analyze_speech(audio_path: str):
-    """Placeholder for speech analysis - would need speech processing library"""
-    # This would require implementation with speech recognition and analysis
-    # For now, returning default values
-    return {"stroke_detected": False, "confidence": 0.0}
+@app.post("/analyze-landmarks/{test}")
+async def analyze_landmarks(test: str, request: Request, landmarks: Optional[int] = None):
+    """Score landmarks computed on the client, skipping decode and inference.
+    
+    The body is either raw little-endian float32 shaped (frames, landmarks, 4)
+    as x, y, z, visibility, or a .npy array shaped (frames, landmarks, 3 or 4).
+    ``landmarks`` overrides the per-frame point count (478 for face, 33 for arm).
+    """
+    if test not in LANDMARK_COUNTS:
+        raise HTTPException(status_code=404, detail=f"Unknown test '{test}', expected 'face' or 'arm'")
+    landmarks = landmarks or LANDMARK_COUNTS[test]
+    if landmarks < MIN_LANDMARKS[test]:
+        raise HTTPException(status_code=400, detail=f"{test} scoring needs at least {MIN_LANDMARKS[test]} landmarks")
+    
+    # The largest valid body: LANDMARK_MAX_FRAMES frames of 4 float64 values per landmark, plus a .npy header
+    max_body = LANDMARK_MAX_FRAMES * landmarks * 4 * 8 + NPY_HEADER_LIMIT
+    try:
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > max_body:
+            raise UploadError(413, f"Request body exceeds {max_body} bytes")
+        body = await read_body(request.stream(), max_body)
+    except UploadError as e:
+        return upload_error_response(e)
+    try:
+        points, visibility = decode_landmark_tensor(body, landmarks, max_frames=LANDMARK_MAX_FRAMES)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    FRAMES_RECEIVED_BY_TEST[test].inc(len(points))
+    # Scoring is a few vectorized passes over the array, cheap enough to run on the event loop
+    aggregator = ScoreAggregator()
+    aggregator.extend(analyzer.score_batch(test, points, visibility))
+    summary = aggregator.finalize()
+    if summary is None:
+        return JSONResponse(content={
+            "stroke_detected": False,
+            "message": "No frames passed the landmark visibility check"
+        }, status_code=400)
+    
+    build_result = build_face_result if test == "face" else build_arm_result
+    result = build_result(summary["smoothed_mean"], summary["count"])
+    result["frames_received"] = len(points)
+    return JSONResponse(content=result)
+
+# Frames a streaming client may have queued before the server stops reading from its socket
+STREAM_MAX_INFLIGHT = int(os.getenv('STREAM_MAX_INFLIGHT', '4'))
+
+def stream_result(test, summary, processed_frames):
+    """Final WebSocket message for a streamed session"""
+    if summary is None:
+        return {
+            "type": "result",
+            "stroke_detected": False,
+            "message": f"No valid {'face' if test == 'face' else 'pose'} detections in streamed frames"
+        }
+    
+    build_result = build_face_result if test == "face" else build_arm_result
+    return {"type": "result", **build_result(summary["smoothed_mean"], processed_frames)}
 
-def send_sms(to_number: str, message: str):
-    """Send SMS notification"""
-    if not twilio_client:
+def stream_session(test, channel, emit, early_stop=False):
+    """Score frames from a WebSocket as they arrive (runs on the executor).
+    
+    Each session has its own SymmetryAnalyzer so the rolling history is never
+    shared, and holds one pooled model for the whole capture. With early
+    stopping the result is emitted as soon as the verdict is settled; later
+    frames are still drained from the channel but no longer run inference.
+    Returns the result message, or None if it was already emitted.
+    """
+    session = SymmetryAnalyzer()
+    tier = quality.current()
+    pool, input_size = model_for(test, tier)
+    decision = create_decision(test, early_stop)
+    rgb_buffer = RgbFrameBuffer(input_size)
+    processed_frames = 0
+    
+    with pool.checkout(timeout=MODEL_CHECKOUT_TIMEOUT) as model:
+        tracker = create_tracker(test, model)
+        for index, img in iter_decoded_frames(channel, max_side=input_size):
+            FRAMES_RECEIVED_BY_TEST[test].inc()
+            if decision is not None and decision.settled:
+                emit({"type": "frame", "index": index, "score": None, "skipped": True})
+                continue
+            
+            score = None
+            try:
+                if img is not None:
+                    img_rgb = rgb_buffer.convert(img)
+                    if test == "face":
+                        score = session.calculate_enhanced_face_symmetry(img_rgb, model, tracker)
+                    else:
+                        score = session.calculate_image_arm_symmetry(img_rgb, model, tracker)
+            except Exception as e:
+                logger.warning(f"Error processing streamed frame: {e}")
+            
+            if score is not None:
+                session.push_score(test, score)
+                processed_frames += 1
+            emit({"type": "frame", "index": index, "score": score})
+            
+            if score is not None and decision is not None and decision.update(score):
+                result = stream_result(test, session.summarize(test), processed_frames)
+                result["early_stopped"] = True
+                result["quality_tier"] = tier.name
+                emit(result)
+    
+    if decision is not None and decision.settled:
+        return None
+    result = stream_result(test, session.summarize(test), processed_frames)
+    result["quality_tier"] = tier.name
+    if decision is not None:
+        result["early_stopped"] = False
+    return result
+
+@app.websocket("/ws/analyze/{test}")
+async def analyze_stream(websocket: WebSocket, test: str, early_stop: bool = EARLY_STOP_DEFAULT):
+    """Streaming analysis: send JPEG frames as binary messages, then the text message "end".
+    
+    The server answers every frame with {"type": "frame", "index", "score"} and,
+    after "end", with {"type": "result", ...} in the same shape as the upload endpoints.
+    With ?early_stop=true the result is sent as soon as the verdict is settled and
+    the client may stop sending frames (it should still send "end").
+    
+    If the analysis fails, or no message arrives for UPLOAD_PART_TIMEOUT seconds,
+    the server sends {"type": "error", ...} and closes the connection.
+    """
+    await websocket.accept()
+    if test not in ("face", "arm"):
+        await websocket.send_json({"type": "error", "error": f"Unknown test '{test}', expected 'face' or 'arm'"})
+        await websocket.close(code=1008)
+        return
+    if inference_executor.kind == "process":
+        await websocket.send_json({"type": "error", "error": "Streaming analysis requires EXECUTOR_KIND=thread"})
+        await websocket.close(code=1011)
+        return
+    
+    loop = asyncio.get_running_loop()
+    channel = FrameChannel(STREAM_MAX_INFLIGHT)
+    outbox = asyncio.Queue()
+    
+    def emit(message):
+        loop.call_soon_threadsafe(outbox.put_nowait, message)
+    
+    async def forward():
+        while True:
+            message = await outbox.get()
+            if message is None:
+                return
+            await websocket.send_json(message)
+    
+    try:
+        job = inference_executor.submit(stream_session, test, channel, emit, early_stop)
+    except ExecutorBusy as e:
+        await websocket.send_json({"type": "error", "error": "Server is busy, please retry", "retry_after": e.retry_after})
+        await websocket.close(code=1013)
+        return
+    
+    forwarder = asyncio.create_task(forward())
+    disconnected = False
+    timed_out = False
+    try:
+        while True:
+            try:
+                # A silent client would otherwise hold a worker and a pooled model indefinitely
+                message = await asyncio.wait_for(
+                    websocket.receive(), UPLOAD_PART_TIMEOUT if UPLOAD_PART_TIMEOUT > 0 else None
+                )
+            except asyncio.TimeoutError:
+                timed_out = True
+                break
+            if message["type"] == "websocket.disconnect":
+                disconnected = True
+                break
+            if message.get("bytes") is not None:
+                # A failed job reads no more frames; stop and report its error
+                if not await put_frame(channel, message["bytes"], job):
+                    break
+            elif (message.get("text") or "").strip().lower() == "end":
+                break
+    finally:
+        if timed_out:
+            channel.abort()
+        else:
+            channel.close()
+    
+    try:
+        result, _ = await job
+    except Exception as e:
+        logger.error(f"Streaming {test} analysis error: {e}")
+        result = {"type": "error", "error": str(e)}
+    if timed_out:
+        logger.warning(f"Streaming {test} session idle for {UPLOAD_PART_TIMEOUT:g}s, closing")
+        result = {"type": "error", "error": f"No message received for {UPLOAD_PART_TIMEOUT:g} seconds"}
+    
+    if disconnected:
+        forwarder.cancel()
+        return
+    if result is not None:
+        emit(result)
+    emit(None)
+    try:
+        await forwarder
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
+# Speech test: acoustic features of one recording (WAV, or raw 16-bit PCM with ?sample_rate=).
+# Other formats, such as the AAC/m4a the Flutter record package produces by default, are
+# converted with ffmpeg when it is installed and rejected with 415 otherwise
+SPEECH_THRESHOLD = float(os.getenv('SPEECH_THRESHOLD', '0.5'))
+MAX_SPEECH_BYTES = int(os.getenv('MAX_SPEECH_BYTES', 32 * 1024 * 1024))
+SPEECH_FFMPEG = os.getenv('SPEECH_FFMPEG', 'ffmpeg')
+SPEECH_DECODE_TIMEOUT = float(os.getenv('SPEECH_DECODE_TIMEOUT', '30'))
+SPEECH_SCORING = SCORING_SECONDS.labels("speech")
+
+def analyze_speech(audio, sample_rate=None):
+    """Score a recording held in memory for dysarthria-like speech (runs on the executor).
+    
+    ``audio`` is a WAV file, or raw little-endian 16-bit mono PCM when
+    ``sample_rate`` is given; anything else goes through ffmpeg first.
+    Samples are converted a chunk at a time, so memory beyond the upload
+    itself stays small for long recordings. Returns None when the recording
+    holds too little speech.
+    """
+    if audio[:4] == b"RIFF":
+        samples, sample_rate = read_wav(audio)
+    elif sample_rate is not None:
+        samples, sample_rate = pcm_view(audio, sample_rate)
+    else:
+        samples, sample_rate = read_wav(transcode_to_wav(audio, SPEECH_FFMPEG, SPEECH_DECODE_TIMEOUT))
+    
+    start = time.perf_counter()
+    with SPEECH_SCORING.time():
+        analysis = analyze_samples(samples, sample_rate)
+    elapsed = time.perf_counter() - start
+    if analysis is None:
+        return None
+    
+    summary, score, components = analysis
+    return {
+        "stroke_detected": score >= SPEECH_THRESHOLD,
+        "dysarthria_score": score,
+        "confidence": abs(score - SPEECH_THRESHOLD) / max(SPEECH_THRESHOLD, 1 - SPEECH_THRESHOLD),
+        "threshold_used": SPEECH_THRESHOLD,
+        "components": components,
+        "features": summary,
+        "realtime_factor": elapsed / summary["duration_s"] if summary["duration_s"] else None
+    }
+
+# Emergency SMS go through a background dispatcher with a durable outbox; SMS_PROVIDER=fake records messages in memory instead
+SMS_PROVIDER = os.getenv('SMS_PROVIDER', 'twilio')
+NOTIFY_CONCURRENCY = int(os.getenv('NOTIFY_CONCURRENCY', '8'))
+NOTIFY_MAX_ATTEMPTS = int(os.getenv('NOTIFY_MAX_ATTEMPTS', '4'))
+# Runtime state lives outside the source tree; the outbox database is created when the dispatcher starts
+STATE_DIR = os.getenv('STATE_DIR', os.path.join(BASE_DIR, 'data', 'state'))
+NOTIFY_OUTBOX_PATH = os.getenv('NOTIFY_OUTBOX_PATH', os.path.join(STATE_DIR, 'notifications.db'))
+# A delivery whose sender has not reported back after this long (e.g. it crashed) is sent again
+NOTIFY_LEASE_SECONDS = float(os.getenv('NOTIFY_LEASE_SECONDS', '60'))
+
+def create_sms_provider():
+    """SMS provider selected by SMS_PROVIDER, or None when Twilio is not configured"""
+    if SMS_PROVIDER == 'fake':
+        return FakeSmsProvider()
+    if not TWILIO_SID:
         logger.warning("Twilio client not configured")
         return None
-        
+    return TwilioSmsProvider(TWILIO_SID, TWILIO_AUTH_TOKEN, TWILIO_PHONE)
+
+notifier = NotificationDispatcher(
+    create_sms_provider(),
+    Outbox(NOTIFY_OUTBOX_PATH, lease=NOTIFY_LEASE_SECONDS),
+    concurrency=NOTIFY_CONCURRENCY,
+    max_attempts=NOTIFY_MAX_ATTEMPTS
+)
+
+@app.on_event("startup")
+def start_notifier():
+    # Also resumes deliveries left in the outbox by a previous run
+    notifier.start()
+
+@app.on_event("shutdown")
+def stop_notifier():
+    notifier.stop()
+
+# Nearest stroke centers come from an offline index (python -m utils.nearby_services build <csv> <dir>)
+STROKE_CENTER_INDEX = os.getenv('STROKE_CENTER_INDEX', os.path.join(BASE_DIR, 'data', 'stroke_centers'))
+NEAREST_CENTERS = int(os.getenv('NEAREST_CENTERS', '3'))
+NEAREST_CENTERS_MAX_KM = float(os.getenv('NEAREST_CENTERS_MAX_KM', '300'))
+
+stroke_centers = None
+
+@app.on_event("startup")
+def load_stroke_centers():
+    # Memory-mapped, so this takes milliseconds; without an index, responses just omit the centers
+    global stroke_centers
+    if not os.path.exists(os.path.join(STROKE_CENTER_INDEX, "manifest.json")):
+        logger.warning(f"No stroke-center index at {STROKE_CENTER_INDEX}; nearest centers disabled")
+        return
     try:
-        message = twilio_client.messages.create(
-            body=message,
-            from_=TWILIO_PHONE,
-            to=to_number
+        start = time.perf_counter()
+        stroke_centers = StrokeCenterIndex.load(STROKE_CENTER_INDEX)
+        logger.info(
+            f"Loaded {len(stroke_centers)} stroke centers in {(time.perf_counter() - start) * 1000:.1f} ms"
         )
-        return message.sid
     except Exception as e:
-        logger.error(f"Failed to send SMS: {e}")
+        logger.error(f"Could not load stroke-center index: {e}")
+
+def nearest_stroke_centers(latitude, longitude):
+    """Closest stroke centers to a location, or None without an index or a valid location"""
+    if stroke_centers is None or latitude is None or longitude is None:
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        logger.warning(f"Ignoring invalid location {latitude}, {longitude}")
         return None
+    return stroke_centers.nearest(latitude, longitude, NEAREST_CENTERS, NEAREST_CENTERS_MAX_KM)
 
-# Modified backend endpoints with proper timing synchronization
+# Build every pooled model and run one dummy inference before reporting ready, so the first
+# real request does not pay for graph construction and TFLite initialization
+WARM_UP_ON_STARTUP = os.getenv('WARM_UP_ON_STARTUP', '1') != '0'
 
-@app.post("/analyze-face/")
-async def analyze_face_live():
-    """Live face symmetry analysis with improved timing"""
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
-        return JSONResponse(content={"error": "Could not open camera"}, status_code=500)
-
-    # Optimize camera settings
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-    cap.set(cv2.CAP_PROP_FPS, 15)
-    
-    # ADD: Camera warm-up period
-    logger.info("Warming up camera...")
-    for _ in range(10):  # Skip first 10 frames for camera stabilization
-        ret, frame = cap.read()
-        if not ret:
-            break
-    
-    # ADD: Wait for frontend signal or use consistent timing
-    duration = 5  # Match frontend duration EXACTLY
-    logger.info(f"Starting face analysis for {duration} seconds...")
-    
-    start_time = time.time()
-    symmetry_scores = []
-    frame_count = 0
+warm_up_state = {"status": "pending", "models": 0, "seconds": None, "error": None, "tiers": []}
+
+def warm_up_models():
+    """Create and exercise the pooled FaceMesh and Pose instances of every tier the controller may use.
     
-    # ADD: More frequent sampling for better accuracy
-    try:
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-                
-            current_time = time.time() - start_time
-            
-            # Only analyze frames after 1 second to allow positioning
-            if current_time >= 1.0:
-                frame_count += 1
-                
-                # Process EVERY frame during active period for maximum accuracy
-                score = analyzer.calculate_enhanced_face_symmetry(frame)
-                if score is not None:
-                    symmetry_scores.append(score)
-                    logger.debug(f"Frame {frame_count}: Symmetry score = {score:.3f}")
+    The starting tier is warmed first and the server reports ready as soon
+    as it is; cheaper tiers follow, and the controller may only step down to
+    a tier once its models are loaded.
+    """
+    warm_up_state["status"] = "warming"
+    start = time.perf_counter()
+    for index, tier in enumerate(QUALITY_TIERS):
+        if tier not in quality.reachable:
+            continue
+        try:
+            models = warm_up_tier(tier)
+        except Exception as e:
+            logger.error(f"Model warm-up failed at quality tier {tier.name}: {e}")
+            warm_up_state["error"] = str(e)
+            if warm_up_state["status"] != "ready":
+                warm_up_state["status"] = "failed"
+            return
+        quality.limit_to(index)
+        warm_up_state["models"] += models
+        warm_up_state["tiers"].append(tier.name)
+        if warm_up_state["status"] != "ready":
+            warm_up_state.update(status="ready", seconds=time.perf_counter() - start)
+        logger.info(f"Warmed up quality tier {tier.name} ({models} model instances) after {time.perf_counter() - start:.2f}s")
 
-            if current_time > duration:
-                break
+def warm_up_tier(tier):
+    """Create and exercise the pooled models of one tier; returns the number of instances created"""
+    blank = np.zeros((256, 256, 3), dtype=np.uint8)
+    # Calls process() directly: slow first inferences must not count against the latency SLO
+    models = face_mesh_models.warm_up([tier], lambda face_mesh: face_mesh.process(blank))
+    models += pose_models.warm_up([tier], lambda pose: pose.process(blank))
+    # Decoding needs OpenCV; load it here rather than on the first upload
+    cv2.load()
+    return models
 
-    finally:
-        cap.release()
-        cv2.destroyAllWindows()
+lazy_tier_loads = set()
 
-    logger.info(f"Face analysis completed. Processed {len(symmetry_scores)} frames")
+def load_tier_on_demand(index):
+    """With warm-up skipped, load the cheaper tier the controller asks for in the background, then allow it"""
+    if index in lazy_tier_loads:
+        return
+    lazy_tier_loads.add(index)
+    tier = QUALITY_TIERS[index]
     
-    if not symmetry_scores:
-        return JSONResponse(content={
+    def load():
+        try:
+            models = warm_up_tier(tier)
+        except Exception as e:
+            # Stays in lazy_tier_loads: a tier that cannot load is not retried on every evaluation
+            logger.error(f"Loading quality tier {tier.name} failed: {e}")
+            return
+        quality.limit_to(max(index, quality.available))
+        warm_up_state["models"] += models
+        warm_up_state["tiers"].append(tier.name)
+        logger.info(f"Loaded quality tier {tier.name} on demand ({models} model instances)")
+    
+    threading.Thread(target=load, name=f"load-tier-{tier.name}", daemon=True).start()
+
+def worker_warm_up_state():
+    """Warm-up outcome of the analysis process this runs in"""
+    return dict(warm_up_state)
+
+async def warm_up_workers():
+    """Start the analysis processes, which warm their own models, and adopt the tiers all of them loaded"""
+    warm_up_state["status"] = "warming"
+    start = time.perf_counter()
+    try:
+        states = await inference_executor.start_workers(worker_warm_up_state)
+    except Exception as e:
+        logger.error(f"Analysis worker start-up failed: {e}")
+        warm_up_state.update(status="failed", error=str(e))
+        return
+    # Every process warms the tiers in the same order, so the shortest list is the common prefix
+    tiers = min((state["tiers"] for state in states), key=len)
+    warm_up_state.update(
+        models=sum(state["models"] for state in states),
+        tiers=tiers,
+        error=next((state["error"] for state in states if state["error"]), None),
+        seconds=time.perf_counter() - start
+    )
+    if not tiers:
+        warm_up_state["status"] = "failed"
+        return
+    quality.limit_to(tier_names.index(tiers[-1]))
+    warm_up_state["status"] = "ready"
+    logger.info(f"Analysis workers warmed up quality tiers {', '.join(tiers)} after {warm_up_state['seconds']:.2f}s")
+
+@app.on_event("startup")
+async def start_warm_up():
+    # Until a tier's models are loaded the controller must not step down to it
+    quality.limit_to(quality.best)
+    if not WARM_UP_ON_STARTUP:
+        warm_up_state["status"] = "skipped"
+        if inference_executor.kind == "thread":
+            # The best tier loads on the first request; cheaper ones when load first calls for them.
+            # Worker processes build their own models, so in process mode the best tier is kept
+            quality.on_limited = load_tier_on_demand
+        return
+    if inference_executor.kind == "process":
+        # Models built here would be of no use to the worker processes
+        asyncio.ensure_future(warm_up_workers())
+        return
+    # Off the event loop, so /health/live answers while the models load
+    asyncio.get_running_loop().run_in_executor(None, warm_up_models)
+
+# Live-camera analysis runs as background capture jobs; CAPTURE_SOURCE may be a device index,
+# a video file or a directory of images (the latter two stand in for a camera in tests)
+CAPTURE_SOURCE = os.getenv('CAPTURE_SOURCE', '0')
+CAPTURE_FPS = float(os.getenv('CAPTURE_FPS', '15'))
+CAPTURE_JOB_TTL = int(os.getenv('CAPTURE_JOB_TTL', '600'))
+
+# Duration (s) and settle time before scoring starts, matching the frontend test timings
+CAPTURE_TIMINGS = {
+    "face": {"duration": 5, "settle": 1.0},
+    "arm": {"duration": 15, "settle": 2.0},
+}
+
+capture_jobs = CaptureJobManager(ttl=CAPTURE_JOB_TTL)
+
+def build_face_live_result(summary):
+    """Face verdict for a live capture, from trimmed statistics"""
+    if summary is None:
+        return {
             "stroke_detected": False, 
             "stroke_ratio": 0.0, 
             "message": "No face detected during test."
-        })
-
-    # Enhanced analysis with outlier removal
-    if len(symmetry_scores) > 10:
-        # Remove outliers (top and bottom 10%)
-        sorted_scores = sorted(symmetry_scores)
-        trim_count = len(sorted_scores) // 10
-        if trim_count > 0:
-            symmetry_scores = sorted_scores[trim_count:-trim_count]
+        }
     
-    avg_symmetry = float(np.mean(symmetry_scores))
-    std_symmetry = float(np.std(symmetry_scores))
-    median_symmetry = float(np.median(symmetry_scores))
+    # Enhanced analysis with outlier removal (top and bottom 10%, done by the aggregator)
+    avg_symmetry = summary["trimmed_mean"]
+    std_symmetry = summary["trimmed_std"]
+    median_symmetry = summary["median"]
     
     # More conservative threshold for better accuracy
-    base_threshold = 0.75  # Lowered threshold
+    base_threshold = FACE_THRESHOLD
     stroke_detected = avg_symmetry < base_threshold
     stroke_ratio = max(0, 1 - avg_symmetry)
     
@@ -386,101 +1141,34 @@ async def analyze_face_live():
     logger.info(f"  - Median Symmetry: {median_symmetry:.3f}")
     logger.info(f"  - Std Deviation: {std_symmetry:.3f}")
     logger.info(f"  - Stroke Detected: {stroke_detected}")
-
-    return JSONResponse(content={
+    
+    return {
         "stroke_detected": stroke_detected, 
         "stroke_ratio": stroke_ratio,
         "avg_symmetry": avg_symmetry,
         "median_symmetry": median_symmetry,
-        "frames_processed": len(symmetry_scores),
+        "frames_processed": summary["trimmed_count"],
         "symmetry_variability": std_symmetry,
         "threshold_used": base_threshold
-    })
-
-@app.post("/analyze-arm/")
-async def analyze_arm_live():
-    """Live arm symmetry analysis with enhanced detection"""
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
-        return JSONResponse(content={"error": "Could not open camera"}, status_code=500)
-        
-    # Optimize camera settings
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-    cap.set(cv2.CAP_PROP_FPS, 15)
-    
-    # Camera warm-up
-    logger.info("Warming up camera for arm test...")
-    for _ in range(10):
-        ret, frame = cap.read()
-        if not ret:
-            break
-    
-    duration = 15  # Match frontend duration EXACTLY
-    logger.info(f"Starting arm analysis for {duration} seconds...")
-    
-    start_time = time.time()
-    symmetry_scores = []
-    frame_count = 0
-    pose_detected_frames = 0
-
-    try:
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            current_time = time.time() - start_time
-            
-            # Start analyzing after 2 seconds for arm positioning
-            if current_time >= 2.0:
-                frame_count += 1
-                
-                # Process every frame for maximum accuracy
-                image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                results = pose.process(image)
-
-                if results.pose_landmarks:
-                    pose_detected_frames += 1
-                    score = analyzer.calculate_enhanced_arm_symmetry(
-                        results.pose_landmarks.landmark, 
-                        frame.shape
-                    )
-                    if score is not None:
-                        symmetry_scores.append(score)
-                        logger.debug(f"Frame {frame_count}: Arm symmetry = {score:.3f}")
-
-            if current_time > duration:
-                break
-
-    finally:
-        cap.release()
-        cv2.destroyAllWindows()
-
-    logger.info(f"Arm analysis completed. Processed {len(symmetry_scores)} frames, pose detected in {pose_detected_frames} frames")
+    }
 
-    if not symmetry_scores:
-        return JSONResponse(content={
+def build_arm_live_result(summary, pose_detected_frames):
+    """Arm verdict for a live capture, from trimmed statistics"""
+    if summary is None:
+        return {
             "stroke_detected": False, 
             "symmetry_percentage": 0,
             "message": "No pose detected during test."
-        })
-
-    # Enhanced analysis
-    if len(symmetry_scores) > 10:
-        # Remove outliers
-        sorted_scores = sorted(symmetry_scores)
-        trim_count = len(sorted_scores) // 10
-        if trim_count > 0:
-            symmetry_scores = sorted_scores[trim_count:-trim_count]
-
-    avg_symmetry = float(np.mean(symmetry_scores))
+        }
+    
+    # Enhanced analysis, outliers already trimmed by the aggregator
+    avg_symmetry = summary["trimmed_mean"]
     symmetry_percentage = avg_symmetry * 100
-    std_symmetry = float(np.std(symmetry_scores))
-    median_symmetry = float(np.median(symmetry_scores))
+    std_symmetry = summary["trimmed_std"]
+    median_symmetry = summary["median"]
     
     # More conservative threshold
-    base_threshold = 70.0  # Raised threshold for better detection
+    base_threshold = ARM_THRESHOLD * 100
     stroke_detected = symmetry_percentage < base_threshold
     
     logger.info(f"Arm Analysis Results:")
@@ -488,28 +1176,238 @@ async def analyze_arm_live():
     logger.info(f"  - Median Symmetry: {median_symmetry * 100:.1f}%")
     logger.info(f"  - Std Deviation: {std_symmetry * 100:.1f}%")
     logger.info(f"  - Stroke Detected: {stroke_detected}")
-
-    return JSONResponse(content={
+    
+    return {
         "stroke_detected": stroke_detected, 
         "symmetry_percentage": symmetry_percentage,
         "median_symmetry": median_symmetry * 100,
-        "frames_processed": len(symmetry_scores),
+        "frames_processed": summary["trimmed_count"],
         "pose_detected_frames": pose_detected_frames,
         "symmetry_variability": std_symmetry * 100,
         "threshold_used": base_threshold
-    })
+    }
+
+def run_capture_job(job, early_stop=False):
+    """Capture from the camera and score frames on a pooled model (runs on the executor)"""
+    aggregator = ScoreAggregator()
+    decision = create_decision(job.test, early_stop)
+    pose_detected_frames = 0
+    tier = quality.current()
+    pool, _ = model_for(job.test, tier)
+    
+    with pool.checkout(timeout=MODEL_CHECKOUT_TIMEOUT) as model:
+        tracker = create_tracker(job.test, model)
+        
+        def score_frame(frame):
+            nonlocal pose_detected_frames
+            FRAMES_RECEIVED_BY_TEST[job.test].inc()
+            image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            if job.test == "face":
+                score = analyzer.calculate_enhanced_face_symmetry(image, model, tracker)
+            else:
+                extracted = analyzer.extract_pose_points(image, model, tracker)
+                score = None
+                if extracted is not None:
+                    pose_detected_frames += 1
+                    score = analyzer.score_arm_batch([extracted[0]], [extracted[1]])
+                    score = score[0] if score else None
+            if score is not None:
+                aggregator.push(score)
+                logger.debug(f"Capture {job.id} frame {job.frames_scored}: symmetry = {score:.3f}")
+                if decision is not None and decision.update(score):
+                    # The verdict cannot realistically change, so release the camera early
+                    job.cancel()
+        
+        logger.info(f"Starting {job.test} capture {job.id} for {job.duration} seconds...")
+        job.capture(score_frame)
+    
+    logger.info(f"Capture {job.id} completed. Scored {aggregator.count} frames, dropped {job.frames_dropped} stale frames")
+    summary = aggregator.finalize()
+    if job.test == "face":
+        result = build_face_live_result(summary)
+    else:
+        result = build_arm_live_result(summary, pose_detected_frames)
+    result["quality_tier"] = tier.name
+    if decision is not None:
+        result["early_stopped"] = decision.settled
+    return result
+
+@app.post("/capture/{test}")
+async def start_capture(test: str, fps: float = CAPTURE_FPS, early_stop: bool = EARLY_STOP_DEFAULT):
+    """Start a live-camera capture job; poll /capture/jobs/{job_id} or subscribe on /ws/capture/{job_id}"""
+    if test not in CAPTURE_TIMINGS:
+        raise HTTPException(status_code=404, detail=f"Unknown test '{test}', expected 'face' or 'arm'")
+    if fps <= 0 or fps > 60:
+        raise HTTPException(status_code=400, detail="fps must be between 0 and 60")
+    
+    try:
+        job = capture_jobs.create(test, CAPTURE_SOURCE, fps=fps, **CAPTURE_TIMINGS[test])
+    except CameraBusy as e:
+        return JSONResponse(content={"error": str(e)}, status_code=409)
+    
+    try:
+        future = inference_executor.submit(run_capture_job, job, early_stop)
+    except ExecutorBusy as e:
+        capture_jobs.discard(job)
+        return busy_response(e)
+    
+    def on_done(f):
+        if f.cancelled():
+            capture_jobs.finish(job, error="Capture cancelled")
+        elif f.exception() is not None:
+            logger.error(f"Capture job {job.id} failed: {f.exception()}")
+            capture_jobs.finish(job, error=str(f.exception()))
+        else:
+            result, queue_wait = f.result()
+            capture_jobs.finish(job, result=result)
+    
+    future.add_done_callback(on_done)
+    return JSONResponse(content=job.snapshot(), status_code=202)
+
+async def wait_for_job(job, timeout):
+    """Wait without blocking the event loop until the job finishes or the timeout passes"""
+    deadline = time.monotonic() + timeout
+    while not job.finished and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+
+@app.get("/capture/jobs/{job_id}")
+async def get_capture_job(job_id: str, wait: float = 0):
+    """Capture job status; with ``wait`` (max 30 s) the call long-polls until the job finishes"""
+    job = capture_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown capture job")
+    if wait > 0:
+        await wait_for_job(job, min(wait, 30.0))
+    return JSONResponse(content=job.snapshot())
+
+@app.websocket("/ws/capture/{job_id}")
+async def subscribe_capture_job(websocket: WebSocket, job_id: str):
+    """Push capture job progress as it changes and the final snapshot when it finishes"""
+    await websocket.accept()
+    job = capture_jobs.get(job_id)
+    if job is None:
+        await websocket.send_json({"error": "Unknown capture job"})
+        await websocket.close(code=1008)
+        return
+    
+    last_sent = None
+    try:
+        while True:
+            snapshot = job.snapshot()
+            progress = (snapshot["status"], snapshot["frames_scored"])
+            if progress != last_sent:
+                await websocket.send_json(snapshot)
+                last_sent = progress
+            if job.finished:
+                break
+            await wait_for_job(job, 0.5)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
 @app.post("/analyze-speech/")
-async def analyze_speech_endpoint(file: UploadFile = File(...)):
-    """Speech analysis endpoint"""
-    file_path = os.path.join(UPLOAD_FOLDER, file.filename)
+async def analyze_speech_endpoint(request: Request, sample_rate: Optional[int] = None):
+    """Speech analysis from an uploaded recording (multipart field ``file``)"""
     try:
-        with open(file_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
-        result = analyze_speech(file_path)
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > MAX_SPEECH_BYTES + 64 * 1024:
+            raise UploadError(413, f"Recording exceeds {MAX_SPEECH_BYTES} bytes")
+        parts = iter_multipart_files(
+            request.stream(), request.headers.get("content-type", ""), "file",
+            MAX_SPEECH_BYTES, MAX_SPEECH_BYTES + 64 * 1024, 1
+        )
+        audio = None
+        async for contents in parts:
+            audio = contents
+        if not audio:
+            raise UploadError(400, "No recording provided")
+        if sample_rate is not None and not 2 * PITCH_MAX_HZ <= sample_rate <= 192000:
+            raise UploadError(400, f"Unsupported sample rate {sample_rate}")
+        
+        result, queue_wait = await inference_executor.run(analyze_speech, audio, sample_rate)
+        if result is None:
+            return JSONResponse(content={
+                "stroke_detected": False,
+                "message": "Not enough speech in the recording"
+            }, status_code=400)
+        
+        result["queue_wait_ms"] = queue_wait * 1000
         return JSONResponse(content=result)
-    finally:
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        
+    except ExecutorBusy as e:
+        return busy_response(e)
+    except UploadError as e:
+        return upload_error_response(e)
+    except ValueError as e:
+        return JSONResponse(content={"error": f"Unreadable recording: {e}"}, status_code=415)
+    except Exception as e:
+        logger.error(f"Speech analysis error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def combine_test_results(face_bool, arm_bool, speech_bool):
+    """Overall verdict from the three test outcomes: any positive test flags a stroke"""
+    stroke_detected = face_bool or arm_bool or speech_bool
+    positive_tests = sum([face_bool, arm_bool, speech_bool])
+    combined_score = positive_tests / 3.0
+    
+    return {
+        "stroke_detected": stroke_detected,
+        "face_positive": face_bool,
+        "arm_positive": arm_bool,
+        "speech_positive": speech_bool,
+        "positive_tests": positive_tests,
+        "combined_score": combined_score,
+        "analysis_summary": {
+            "face_test": "POSITIVE" if face_bool else "NEGATIVE",
+            "arm_test": "POSITIVE" if arm_bool else "NEGATIVE", 
+            "speech_test": "POSITIVE" if speech_bool else "NEGATIVE"
+        }
+    }
+
+def attach_stroke_centers(result, latitude, longitude):
+    """Add the nearest stroke centers to a positive verdict when the client sent its location"""
+    if not result["stroke_detected"]:
+        return
+    centers = nearest_stroke_centers(latitude, longitude)
+    if centers is not None:
+        result["nearest_stroke_centers"] = centers
+
+def format_stroke_centers(centers):
+    """SMS lines for the nearest stroke centers"""
+    lines = ["Nearest Stroke Centers:"]
+    for center in centers:
+        phone = f", {center['phone']}" if center["phone"] else ""
+        lines.append(f"• {center['name']} ({center['distance_km']:.1f} km{phone})")
+    return "\n".join(lines) + "\n\n"
+
+def queue_stroke_alert(result, emergency_contacts):
+    """Queue the emergency SMS for a positive verdict and record the dispatch in ``result``"""
+    if not (result["stroke_detected"] and emergency_contacts):
+        return
+    centers = result.get("nearest_stroke_centers")
+    face_bool, arm_bool, speech_bool = result["face_positive"], result["arm_positive"], result["speech_positive"]
+    alert_message = (
+        f"🚨 STROKE ALERT: Potential stroke symptoms detected!\n\n"
+        f"Test Results:\n"
+        f"• Face Symmetry: {'ASYMMETRICAL' if face_bool else 'NORMAL'}\n"
+        f"• Arm Movement: {'IMPAIRED' if arm_bool else 'NORMAL'}\n"
+        f"• Speech: {'IMPAIRED' if speech_bool else 'NORMAL'}\n\n"
+        f"Positive Tests: {result['positive_tests']}/3\n\n"
+        f"{format_stroke_centers(centers) if centers else ''}"
+        f"⚠️ SEEK IMMEDIATE MEDICAL ATTENTION ⚠️\n"
+        f"Call 911 or go to nearest emergency room!"
+    )
+    
+    # Delivery happens in the background; poll /notifications/{dispatch_id} for the outcome
+    dispatch_id = notifier.dispatch(emergency_contacts, alert_message)
+    
+    result.update({
+        "dispatch_id": dispatch_id,
+        "total_contacts": len([c for c in emergency_contacts if c.strip()]),
+        "alert_message": alert_message
+    })
+    
+    logger.info(f"Emergency notifications queued as dispatch {dispatch_id}")
 
 # Alternative endpoint that takes boolean results directly
 @app.post("/detect-stroke/")
@@ -517,7 +1415,9 @@ async def detect_stroke_simple(
     face_stroke_detected: str = Form("false"),
     arm_stroke_detected: str = Form("false"),
     speech_stroke_detected: str = Form("false"),
-    emergency_contacts: List[str] = Form(default=[])
+    emergency_contacts: List[str] = Form(default=[]),
+    latitude: Optional[float] = Form(None),
+    longitude: Optional[float] = Form(None)
 ):
     """Enhanced stroke detection endpoint with proper boolean handling"""
     
@@ -536,73 +1436,210 @@ async def detect_stroke_simple(
     logger.info(f"Speech: {speech_stroke_detected} -> {speech_bool}")
     logger.info(f"Emergency contacts: {emergency_contacts}")
     
-    # Determine overall stroke detection
-    stroke_detected = face_bool or arm_bool or speech_bool
-    positive_tests = sum([face_bool, arm_bool, speech_bool])
-    combined_score = positive_tests / 3.0
+    result = combine_test_results(face_bool, arm_bool, speech_bool)
+    attach_stroke_centers(result, latitude, longitude)
+    queue_stroke_alert(result, emergency_contacts)
     
-    # Create detailed results
-    result = {
-        "stroke_detected": stroke_detected,
-        "face_positive": face_bool,
-        "arm_positive": arm_bool,
-        "speech_positive": speech_bool,
-        "positive_tests": positive_tests,
-        "combined_score": combined_score,
-        "analysis_summary": {
-            "face_test": "POSITIVE" if face_bool else "NEGATIVE",
-            "arm_test": "POSITIVE" if arm_bool else "NEGATIVE", 
-            "speech_test": "POSITIVE" if speech_bool else "NEGATIVE"
-        }
-    }
+    # Log final result
+    logger.info(f"Final stroke detection result: {result}")
     
-    # Send emergency notifications if stroke detected
-    if stroke_detected and emergency_contacts:
-        alert_message = (
-            f"🚨 STROKE ALERT: Potential stroke symptoms detected!\n\n"
-            f"Test Results:\n"
-            f"• Face Symmetry: {'ASYMMETRICAL' if face_bool else 'NORMAL'}\n"
-            f"• Arm Movement: {'IMPAIRED' if arm_bool else 'NORMAL'}\n"
-            f"• Speech: {'IMPAIRED' if speech_bool else 'NORMAL'}\n\n"
-            f"Positive Tests: {positive_tests}/3\n\n"
-            f"⚠️ SEEK IMMEDIATE MEDICAL ATTENTION ⚠️\n"
-            f"Call 911 or go to nearest emergency room!"
-        )
-        
-        successful_notifications = 0
-        failed_notifications = []
-        
-        for contact in emergency_contacts:
-            try:
-                if contact.strip():  # Only send to non-empty contacts
-                    sms_result = send_sms(contact.strip(), alert_message)
-                    if sms_result:
-                        successful_notifications += 1
-                        logger.info(f"Emergency alert sent successfully to {contact}")
-                    else:
-                        failed_notifications.append(contact)
-                        logger.warning(f"Failed to send alert to {contact}")
-            except Exception as e:
-                failed_notifications.append(contact)
-                logger.error(f"Exception sending SMS to {contact}: {e}")
-        
-        result.update({
-            "notifications_sent": successful_notifications,
-            "total_contacts": len([c for c in emergency_contacts if c.strip()]),
-            "failed_contacts": len(failed_notifications),
-            "alert_message": alert_message
-        })
+    return JSONResponse(content=result)
+
+# Single-request screening: every modality in one multipart body, analyzed concurrently
+TRIAGE_FIELDS = {"face_frames": "face", "arm_frames": "arm", "audio": "speech"}
+MAX_CONTACTS = int(os.getenv('MAX_CONTACTS', '20'))
+
+async def timed_job(job, started):
+    """Await an executor job; returns ``(result, queue_wait_seconds, elapsed_seconds)``"""
+    result, queue_wait = await job
+    return result, queue_wait, time.perf_counter() - started
+
+def triage_modality_result(test, outcome, received):
+    """Per-modality entry of a triage response, and whether that test was positive"""
+    if test not in received:
+        return {"status": "not_provided"}, False
+    if isinstance(outcome, BaseException):
+        logger.error(f"Triage {test} analysis error: {outcome}")
+        return {"status": "error", "error": str(outcome)}, False
+    
+    result, queue_wait, elapsed = outcome
+    if test == "speech":
+        if result is not None:
+            result["queue_wait_ms"] = queue_wait * 1000
+        message = "Not enough speech in the recording"
+    else:
+        result = build_upload_result(test, result, received[test], queue_wait)
+        message = no_detection_message(test)
+    timing = {"elapsed_ms": elapsed * 1000, "queue_wait_ms": queue_wait * 1000}
+    if result is None:
+        return {"status": "no_detection", "message": message, "timing": timing}, False
+    return {"status": "ok", "result": result, "timing": timing}, result["stroke_detected"]
+
+@app.post("/triage/")
+async def triage(request: Request, early_stop: bool = EARLY_STOP_DEFAULT, sample_rate: Optional[int] = None):
+    """Face, arm and speech tests plus the combined verdict and alerting, in one request.
+    
+    Multipart fields: ``face_frames`` and ``arm_frames`` (JPEG frames, each
+    modality's parts sent together), ``audio`` (one recording, as for
+    /analyze-speech/), ``emergency_contacts`` (repeatable) and optionally
+    ``latitude``/``longitude`` for the nearest stroke centers. Every modality
+    starts on its own executor worker as soon as its first part arrives, so
+    face inference runs while arm frames are still uploading and the speech
+    analysis runs alongside both. A missing modality counts as negative.
+    """
+    started = time.perf_counter()
+    streaming = inference_executor.kind != "process"
+    tier = quality.current()
+    channels = {}
+    jobs = {}
+    received = {}
+    contacts = []
+    location = {}
+    current = None
+    
+    def start(test, fn, *args):
+        jobs[test] = asyncio.ensure_future(timed_job(inference_executor.submit(fn, *args), time.perf_counter()))
+    
+    try:
+        content_length = request.headers.get("content-length")
+        max_body = 2 * MAX_UPLOAD_BYTES + MAX_SPEECH_BYTES
+        if content_length and content_length.isdigit() and int(content_length) > max_body:
+            raise UploadError(413, f"Request body exceeds {max_body} bytes")
+        if sample_rate is not None and not 2 * PITCH_MAX_HZ <= sample_rate <= 192000:
+            raise UploadError(400, f"Unsupported sample rate {sample_rate}")
+        parts = iter_multipart_parts(request.stream(), request.headers.get("content-type", ""), {
+            "face_frames": (MAX_FRAME_BYTES, MAX_UPLOAD_FRAMES),
+            "arm_frames": (MAX_FRAME_BYTES, MAX_UPLOAD_FRAMES),
+            "audio": (MAX_SPEECH_BYTES, 1),
+            "emergency_contacts": (256, MAX_CONTACTS),
+            "latitude": (32, 1),
+            "longitude": (32, 1)
+        }, max_body)
+        if streaming:
+            parts = with_part_timeout(parts, UPLOAD_PART_TIMEOUT)
         
-        logger.info(f"Emergency notifications: {successful_notifications} sent, {len(failed_notifications)} failed")
+        async for field, contents in parts:
+            test = TRIAGE_FIELDS.get(field)
+            if current in channels and test != current:
+                # A modality's frames are complete once another field starts
+                if streaming:
+                    channels[current].close()
+            if field in ("latitude", "longitude"):
+                try:
+                    location[field] = float(contents)
+                except ValueError:
+                    raise UploadError(400, f"Invalid {field}")
+            elif test is None:
+                contacts.append(contents.decode("utf-8", errors="replace"))
+            elif test == "speech":
+                received[test] = 1
+                start(test, analyze_speech, contents, sample_rate)
+            else:
+                if test in channels and test != current:
+                    raise UploadError(400, f"Parts of '{field}' must be sent together")
+                if test not in channels:
+                    channels[test] = FrameChannel(UPLOAD_MAX_INFLIGHT) if streaming else []
+                    received[test] = 0
+                    if streaming:
+                        start(test, score_uploaded_frames, test, channels[test], early_stop, tier)
+                if streaming:
+                    # Frames for a job that already failed are dropped; its error is reported per modality
+                    await put_frame(channels[test], contents, jobs[test])
+                else:
+                    channels[test].append(contents)
+                received[test] += 1
+            current = test
+    except BaseException as e:
+        for test, channel in channels.items():
+            if streaming:
+                channel.abort()
+        # Jobs already running finish on their own; their results are discarded
+        for job in jobs.values():
+            job.add_done_callback(lambda f: f.cancelled() or f.exception())
+        if isinstance(e, ExecutorBusy):
+            return busy_response(e)
+        if isinstance(e, UploadError):
+            return upload_error_response(e)
+        raise
     
-    # Log final result
-    logger.info(f"Final stroke detection result: {result}")
+    if streaming:
+        for channel in channels.values():
+            channel.close()
+    else:
+        # Worker processes cannot read from a channel on this loop; the frames were collected instead
+        try:
+            for test, frames in channels.items():
+                start(test, score_uploaded_frames, test, frames, early_stop, tier)
+        except ExecutorBusy as e:
+            for job in jobs.values():
+                job.add_done_callback(lambda f: f.cancelled() or f.exception())
+            return busy_response(e)
+    if not received:
+        return upload_error_response(UploadError(400, "No face frames, arm frames or audio provided"))
     
+    tests = list(jobs)
+    outcomes = dict(zip(tests, await asyncio.gather(*jobs.values(), return_exceptions=True)))
+    modalities = {}
+    positives = {}
+    for test in ("face", "arm", "speech"):
+        modalities[test], positives[test] = triage_modality_result(test, outcomes.get(test), received)
+    
+    result = combine_test_results(positives["face"], positives["arm"], positives["speech"])
+    attach_stroke_centers(result, location.get("latitude"), location.get("longitude"))
+    queue_stroke_alert(result, contacts)
+    result["modalities"] = modalities
+    result["total_ms"] = (time.perf_counter() - started) * 1000
+    logger.info(
+        f"Triage verdict {result['stroke_detected']} in {result['total_ms']:.0f} ms "
+        f"({result['positive_tests']}/3 positive)"
+    )
     return JSONResponse(content=result)
+
+@app.get("/notifications/{dispatch_id}")
+async def notification_status(dispatch_id: str):
+    """Delivery status of an emergency alert dispatch"""
+    status = notifier.status(dispatch_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown dispatch id")
+    return JSONResponse(content=status)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics for the analysis pipeline"""
+    return Response(content=REGISTRY.render(), media_type=REGISTRY.content_type)
+
+@app.get("/health/live")
+async def liveness():
+    """Liveness probe: the process is up and serving the event loop"""
+    return JSONResponse(content={"status": "alive"})
+
+@app.get("/health/ready")
+async def readiness():
+    """Readiness probe: models are warm and the analysis queue can take another job"""
+    ready = warm_up_state["status"] in ("ready", "skipped")
+    saturated = inference_executor.in_flight >= inference_executor.workers + inference_executor.max_queue
+    return JSONResponse(
+        content={
+            "status": "ready" if ready and not saturated else "not_ready",
+            "warm_up": warm_up_state,
+            "executor_saturated": saturated
+        },
+        status_code=200 if ready and not saturated else 503
+    )
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return JSONResponse(content={"status": "healthy", "timestamp": time.time()})
+    return JSONResponse(content={
+        "status": "healthy",
+        "timestamp": time.time(),
+        "executor": inference_executor.stats(),
+        "cache": {
+            "requests": request_cache.stats()
+        },
+        "quality": quality.stats(),
+        "stroke_centers": len(stroke_centers) if stroke_centers is not None else None
+    })
 
 @app.get("/")
 async def root():
@@ -613,9 +1650,19 @@ async def root():
         "endpoints": [
             "/analyze-face/",
             "/analyze-arm/",
+            "/analyze-landmarks/{test}",
             "/analyze-speech/",
             "/detect-stroke/",
-            "/health"
+            "/triage/",
+            "/notifications/{dispatch_id}",
+            "/ws/analyze/{test}",
+            "/capture/{test}",
+            "/capture/jobs/{job_id}",
+            "/ws/capture/{job_id}",
+            "/health",
+            "/health/live",
+            "/health/ready",
+            "/metrics"
         ]
     })
 
@@ -0,0 +1,42 @@
+# tests/conftest.py - Shared fixtures; run the suite from backend/ with ``python -m pytest``
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+# The backend modules import each other as top-level packages (utils, calibration)
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# Importing main must neither send SMS nor load models before a test asks for them
+os.environ.setdefault('SMS_PROVIDER', 'fake')
+os.environ.setdefault('NOTIFY_OUTBOX_PATH', ':memory:')
+os.environ.setdefault('WARM_UP_ON_STARTUP', '0')
+
+IMAGES_DIR = os.path.join(os.path.dirname(BACKEND_DIR), "frontend", "flutter_app", "assets", "images")
+
+
+@pytest.fixture
+def sample_image():
+    """``path(name)``: one of the sample images bundled with the Flutter app"""
+    return lambda name: os.path.join(IMAGES_DIR, name)
+
+
+@pytest.fixture
+def recorded_landmarks():
+    """``load(name)``: MediaPipe output (landmarks, 4) as x, y, z, visibility for a bundled test image"""
+    def load(name):
+        return np.load(os.path.join(DATA_DIR, f"{name}_landmarks.npy"))
+    return load
+
+
+@pytest.fixture(scope="session")
+def main_module():
+    """The server module, imported once; its models load lazily on first use"""
+    import main
+    return main
@@ -0,0 +1,136 @@
+# tests/test_aggregation.py - Frame score aggregation, smoothed scores and the sequential early-stopping decision
+
+import numpy as np
+import pytest
+
+from utils.aggregation import ScoreAggregator, SequentialDecision, effective_sample_size, smoothed_scores
+
+
+def feed(decision, scores):
+    """Frame count at which ``decision`` settled, or None if it never did"""
+    for i, score in enumerate(scores, 1):
+        if decision.update(score):
+            return i
+    return None
+
+
+def wobble(mean, frames, amplitude=0.02, period=9):
+    """Deterministic, autocorrelated frame scores around ``mean``, like a subject moving slightly"""
+    return mean + amplitude * np.sin(2 * np.pi * np.arange(frames) / period)
+
+
+@pytest.mark.parametrize("frames", [6, 7, 12, 50, 301])
+def test_smoothed_scores_average_to_the_aggregator_smoothed_mean(frames):
+    scores = np.random.default_rng(frames).uniform(0, 1, frames)
+    aggregator = ScoreAggregator()
+    aggregator.extend(scores)
+    assert smoothed_scores(scores).mean() == pytest.approx(aggregator.finalize()["smoothed_mean"], abs=1e-12)
+
+
+@pytest.mark.parametrize("push_one_by_one", [False, True])
+def test_long_sessions_fall_back_to_the_histogram(push_one_by_one):
+    rng = np.random.default_rng(8)
+    scores = np.clip(rng.beta(5, 2, 10000), 0, 1)
+    aggregator = ScoreAggregator()
+    if push_one_by_one:
+        for score in scores:
+            aggregator.push(score)
+    else:
+        # Crosses exact_limit in the middle of a batch
+        aggregator.extend(scores[:3000])
+        aggregator.extend(scores[3000:])
+    summary = aggregator.finalize()
+    assert aggregator._values is None
+
+    trim = 1000
+    middle = np.sort(scores)[trim:-trim]
+    bin_width = 1 / aggregator.bins
+    assert summary["trimmed_count"] == len(middle)
+    assert summary["trimmed_mean"] == pytest.approx(middle.mean(), abs=bin_width)
+    assert summary["trimmed_std"] == pytest.approx(middle.std(), abs=bin_width)
+    assert summary["median"] == pytest.approx(np.median(scores), abs=bin_width)
+    # Running statistics stay exact
+    assert summary["mean"] == pytest.approx(scores.mean(), abs=1e-12)
+    assert summary["std"] == pytest.approx(scores.std(), abs=1e-12)
+    assert summary["smoothed_mean"] == pytest.approx(smoothed_scores(scores).mean(), abs=1e-12)
+
+
+def test_effective_sample_size_shrinks_with_correlation():
+    rng = np.random.default_rng(0)
+    independent = rng.normal(size=400)
+    correlated = np.repeat(rng.normal(size=40), 10)
+    assert effective_sample_size(independent) > 200
+    assert effective_sample_size(correlated) < 80
+    assert effective_sample_size(np.full(50, 0.5)) == 50
+
+
+def test_clear_positive_stops_at_the_first_look():
+    decision = SequentialDecision(0.75, looks=(32, 64, 128))
+    assert feed(decision, wobble(0.3, 200)) == 32
+    assert decision.settled and decision.below_threshold is True
+    assert decision.frames_used == 32
+
+
+def test_clear_negative_stops_at_the_first_look():
+    decision = SequentialDecision(0.75, looks=(32, 64, 128))
+    assert feed(decision, wobble(0.95, 200)) == 32
+    assert decision.below_threshold is False
+
+
+def test_decision_is_only_checked_at_looks():
+    decision = SequentialDecision(0.75, looks=(32, 64))
+    # Far below the threshold, yet nothing is decided before the first look
+    assert feed(decision, np.full(31, 0.1)) is None
+    assert decision.update(0.1)
+
+
+def test_scores_near_the_threshold_never_stop():
+    decision = SequentialDecision(0.75, looks=(32, 64, 128, 256))
+    assert feed(decision, wobble(0.75, 300, amplitude=0.05)) is None
+    assert not decision.settled and decision.below_threshold is None
+
+
+def test_borderline_mean_needs_more_frames():
+    scores = wobble(0.70, 300, amplitude=0.1, period=25)
+    borderline = feed(SequentialDecision(0.75, looks=(32, 64, 128, 256)), scores)
+    clear = feed(SequentialDecision(0.75, looks=(32, 64, 128, 256)), scores - 0.3)
+    assert borderline == 256
+    assert clear < borderline
+
+
+def test_interval_is_on_the_smoothed_mean():
+    # Rare dips pull the raw mean down but not the rolling median the verdict is based on
+    scores = np.full(64, 0.80)
+    scores[::8] = 0.0
+    assert scores.mean() < 0.75 < smoothed_scores(scores).mean()
+    decision = SequentialDecision(0.75, looks=(64,))
+    assert feed(decision, scores) == 64
+    assert decision.below_threshold is False
+
+
+def test_settled_decision_ignores_later_frames():
+    decision = SequentialDecision(0.75, looks=(32, 64))
+    feed(decision, wobble(0.3, 32))
+    assert decision.update(1.0)
+    assert decision.frames_used == 32 and decision.below_threshold is True
+
+
+def test_looks_must_leave_room_for_smoothing():
+    with pytest.raises(ValueError):
+        SequentialDecision(0.75, looks=(3, 5))
+
+
+@pytest.mark.parametrize("mean, below", [(0.10, True), (0.95, False)])
+def test_clear_short_face_session_stops_early(mean, below):
+    # About as many frames as the app's face test sends, with frame-to-frame noise
+    scores = np.clip(mean + np.random.default_rng(3).normal(0, 0.03, 25), 0, 1)
+    decision = SequentialDecision(0.75)
+    assert feed(decision, scores) in (16, 24)
+    assert decision.below_threshold is below
+
+
+def test_no_stop_before_enough_effective_samples():
+    decision = SequentialDecision(0.75, looks=(8, 16), min_dof=2)
+    # 8 frames are under two smoothing windows: far too few, however clear
+    assert feed(decision, np.full(15, 0.0)) is None
+    assert decision.update(0.0)
@@ -0,0 +1,97 @@
+# tests/test_cache.py - Byte-bounded LRU result cache and the request cache of the upload endpoints
+
+import cv2
+import pytest
+from fastapi.testclient import TestClient
+
+from utils import cache
+from utils.cache import ResultCache, content_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controls ``time.monotonic`` as seen by the cache"""
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_hits_and_misses_are_counted():
+    results = ResultCache(1024)
+    assert results.get("a", "missing") == "missing"
+    results.put("a", None, size=10)
+    # None is a cached value, told apart from a miss by the default
+    assert results.get("a", "missing") is None
+    stats = results.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"], stats["bytes"]) == (1, 1, 1, 10)
+
+
+def test_least_recently_used_entries_are_evicted_by_size():
+    results = ResultCache(100)
+    results.put("a", 1, size=40)
+    results.put("b", 2, size=40)
+    results.get("a")
+    results.put("c", 3, size=40)
+    assert results.get("b") is None
+    assert (results.get("a"), results.get("c")) == (1, 3)
+    assert results.bytes == 80 and results.evictions == 1
+    # Larger than the whole cache: not stored, and nothing else is evicted
+    results.put("d", 4, size=101)
+    assert results.get("d") is None and results.stats()["entries"] == 2
+
+
+def test_replacing_a_key_releases_its_old_size():
+    results = ResultCache(100)
+    results.put("a", 1, size=60)
+    results.put("a", 2, size=30)
+    assert results.bytes == 30 and results.get("a") == 2
+
+
+def test_entries_expire_after_the_ttl(clock):
+    results = ResultCache(100, ttl=10)
+    results.put("a", 1, size=10)
+    clock[0] += 9.9
+    assert results.get("a") == 1
+    clock[0] += 0.2
+    assert results.get("a") is None
+    assert results.bytes == 0 and results.stats()["entries"] == 0
+
+
+def test_disabled_cache_stores_nothing():
+    results = ResultCache(0)
+    results.put("a", 1, size=1)
+    assert results.get("a") is None and results.stats()["misses"] == 0
+
+
+def test_content_key_separates_parts():
+    assert content_key("ab", "c") != content_key("a", "bc")
+    assert content_key(b"\x01", 1) == content_key(b"\x01", 1)
+
+
+def test_idempotent_retry_runs_no_analysis(main_module, monkeypatch, sample_image):
+    ok, encoded = cv2.imencode(".jpg", cv2.imread(sample_image("normal_face.png")))
+    files = [("frames", ("frame.jpg", encoded.tobytes(), "image/jpeg"))] * 3
+    runs = []
+    score = main_module.score_uploaded_frames
+
+    def counted(*args):
+        runs.append(args[0])
+        return score(*args)
+
+    monkeypatch.setattr(main_module, "score_uploaded_frames", counted)
+    main_module.request_cache.clear()
+    headers = {"Idempotency-Key": "capture-1"}
+    with TestClient(main_module.app) as client:
+        first = client.post("/analyze-face/", files=files, headers=headers).json()
+        # The retry's body is never read, so it does not even need the frames
+        retry = client.post("/analyze-face/", files=files[:1], headers=headers).json()
+        other = client.post("/analyze-face/", files=files, headers={"Idempotency-Key": "capture-2"}).json()
+        too_long = client.post("/analyze-face/", files=files, headers={"Idempotency-Key": "x" * 256})
+
+    assert runs == ["face", "face"]
+    assert retry["cached"] is True and not first["cached"]
+    assert retry["avg_symmetry"] == first["avg_symmetry"]
+    assert retry["frames_received"] == 3
+    # Same frames under a new key: the content-keyed entry answers it, after the body was read
+    assert other["cached"] is True
+    assert too_long.status_code == 400
@@ -0,0 +1,97 @@
+# tests/test_capture.py - Capture jobs replaying a directory of images through FileCamera
+
+import shutil
+
+import cv2
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from utils.capture import CameraBusy, CaptureJob, CaptureJobManager, FileCamera
+
+
+@pytest.fixture
+def image_dir(tmp_path):
+    """Three solid-colour frames; each frame's blue value is its position in the directory"""
+    for i in range(3):
+        cv2.imwrite(str(tmp_path / f"frame_{i}.png"), np.full((48, 64, 3), (i, 0, 0), dtype=np.uint8))
+    return str(tmp_path)
+
+
+def test_file_camera_replays_images_in_order_and_loops(image_dir):
+    camera = FileCamera(image_dir, realtime=False)
+    assert camera.isOpened()
+    frames = [camera.read() for _ in range(5)]
+    assert all(ret for ret, _ in frames)
+    assert [int(frame[0, 0, 0]) for _, frame in frames] == [0, 1, 2, 0, 1]
+    camera.release()
+
+
+def test_file_camera_without_loop_ends(image_dir):
+    camera = FileCamera(image_dir, loop=False, realtime=False)
+    assert [camera.read()[0] for _ in range(4)] == [True, True, True, False]
+
+
+def test_empty_directory_is_not_opened(tmp_path):
+    assert not FileCamera(str(tmp_path)).isOpened()
+
+
+def test_capture_job_scores_frames_after_settling(image_dir):
+    job = CaptureJob("face", image_dir, fps=20, duration=0.6, settle=0.2, warmup_frames=3)
+    scored = []
+    job.capture(scored.append)
+
+    assert job.status == "running"
+    assert job.frames_scored == len(scored)
+    # About (duration - settle) * fps frames, allowing for scheduling jitter
+    assert 3 <= len(scored) <= 10
+    assert all(frame.shape == (48, 64, 3) for frame in scored)
+    assert {int(frame[0, 0, 0]) for frame in scored} <= {0, 1, 2}
+
+
+def test_cancelled_capture_stops_early(image_dir):
+    job = CaptureJob("face", image_dir, fps=20, duration=5, settle=0, warmup_frames=1)
+
+    def score_frame(frame):
+        if job.frames_scored == 1:
+            job.cancel()
+
+    job.capture(score_frame)
+    assert job.frames_scored == 2
+
+
+def test_unreadable_source_fails(tmp_path):
+    job = CaptureJob("face", str(tmp_path), duration=0.1)
+    with pytest.raises(RuntimeError):
+        job.capture(lambda frame: None)
+
+
+def test_manager_gives_each_camera_to_one_job(image_dir):
+    jobs = CaptureJobManager()
+    job = jobs.create("face", image_dir, duration=0.1)
+    with pytest.raises(CameraBusy):
+        jobs.create("arm", image_dir)
+
+    jobs.finish(job, result={"stroke_detected": False})
+    assert jobs.get(job.id).snapshot()["status"] == "completed"
+    assert jobs.create("arm", image_dir).test == "arm"
+
+
+def test_capture_endpoint_runs_a_job_from_an_image_directory(main_module, sample_image, tmp_path, monkeypatch):
+    shutil.copy(sample_image("normal_face.png"), tmp_path / "normal_face.png")
+    monkeypatch.setattr(main_module, "CAPTURE_SOURCE", str(tmp_path))
+    monkeypatch.setitem(main_module.CAPTURE_TIMINGS, "face", {"duration": 1.0, "settle": 0.2})
+
+    with TestClient(main_module.app) as client:
+        response = client.post("/capture/face?fps=10")
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+        # The camera stays with this job until it finishes
+        assert client.post("/capture/face").status_code == 409
+
+        snapshot = client.get(f"/capture/jobs/{job_id}?wait=20").json()
+
+    assert snapshot["status"] == "completed", snapshot
+    assert snapshot["frames_scored"] > 0
+    result = snapshot["result"]
+    assert result["stroke_detected"] is (result["avg_symmetry"] < main_module.FACE_THRESHOLD)
@@ -0,0 +1,45 @@
+# tests/test_executor.py - Admission control of the bounded analysis executor
+
+import asyncio
+import threading
+
+import pytest
+
+from utils.executor import BoundedExecutor, ExecutorBusy
+
+
+def test_full_queue_is_rejected():
+    executor = BoundedExecutor(1, 1)
+    release = threading.Event()
+
+    async def run():
+        first = executor.submit(release.wait)
+        second = executor.submit(release.wait)
+        with pytest.raises(ExecutorBusy):
+            executor.submit(release.wait)
+        release.set()
+        return await asyncio.gather(first, second)
+
+    assert [result for result, _ in asyncio.run(run())] == [True, True]
+    assert executor.stats()["completed"] == 2 and executor.stats()["rejected"] == 1
+    executor.shutdown()
+
+
+def test_slot_is_returned_after_the_callers_loop_has_stopped():
+    executor = BoundedExecutor(1, 0)
+    release = threading.Event()
+    finished = threading.Event()
+
+    def job():
+        release.wait()
+        finished.set()
+
+    async def abandon():
+        executor.submit(job)
+
+    # The job outlives the loop that submitted it, as an abandoned upload does at shutdown
+    asyncio.run(abandon())
+    release.set()
+    assert finished.wait(5)
+    executor.shutdown()
+    assert executor.in_flight == 0 and executor.stats()["completed"] == 1
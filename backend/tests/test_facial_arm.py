@@ -0,0 +1,109 @@
+# tests/test_facial_arm.py - Video uploads of the Flask arm-symmetry service
+
+import io
+import threading
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+import facial_arm
+
+
+@pytest.fixture
+def arm_clip(sample_image, tmp_path):
+    """A 95-frame, 30 fps clip of a jittering arm pose, long enough for several 1 s segments"""
+    image = cv2.resize(cv2.imread(sample_image("asymmetrical_arms.png")), (320, 240))
+    path = str(tmp_path / "clip.mp4")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 30, (320, 240))
+    for i in range(95):
+        writer.write(np.roll(image, i % 7, axis=1))
+    writer.release()
+    return path
+
+
+@pytest.fixture
+def video_pool(monkeypatch):
+    """A fresh two-worker video pool, shut down after the test"""
+    monkeypatch.setattr(facial_arm, "VIDEO_WORKERS", 2)
+    monkeypatch.setattr(facial_arm, "_video_pool", None)
+    yield
+    if facial_arm._video_pool is not None:
+        facial_arm._video_pool.shutdown()
+
+
+def test_upload_is_parsed_into_the_spool_folder(monkeypatch, tmp_path):
+    spool = tmp_path / "spool"
+    spool.mkdir()
+    monkeypatch.setitem(facial_arm.app.config, "SPOOL_FOLDER", str(spool))
+    seen = []
+
+    def analyze(path, target_fps):
+        # The file werkzeug parsed the upload into, not a copy of it
+        assert getattr(facial_arm.request.files["file"].stream, "name", None) == path
+        with open(path, "rb") as f:
+            seen.append((path, f.read(), target_fps))
+        return {"symmetry_percentage": 100.0}
+
+    monkeypatch.setattr(facial_arm, "analyze_arm_symmetry", analyze)
+    # Above werkzeug's 500 KB in-memory limit, where it would otherwise roll over to /tmp
+    video = bytes(range(256)) * 4096
+    with facial_arm.app.test_client() as client:
+        response = client.post(
+            "/analyze-arm-symmetry?fps=5",
+            data={"file": (io.BytesIO(video), "clip.mp4")},
+            content_type="multipart/form-data",
+        )
+    assert response.status_code == 200
+    [(path, contents, fps)] = seen
+    assert path.startswith(str(spool)) and path.endswith(".mp4")
+    assert contents == video and fps == 5.0
+    # Removed with the request
+    assert list(spool.iterdir()) == []
+
+
+def test_rejected_upload_leaves_no_spool_file(monkeypatch, tmp_path):
+    monkeypatch.setitem(facial_arm.app.config, "SPOOL_FOLDER", str(tmp_path))
+    with facial_arm.app.test_client() as client:
+        response = client.post(
+            "/analyze-arm-symmetry",
+            data={"file": (io.BytesIO(b"GIF89a"), "clip.gif")},
+            content_type="multipart/form-data",
+        )
+    assert response.status_code == 400
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_sharded_counts_equal_sequential_counts(arm_clip, video_pool, monkeypatch):
+    monkeypatch.setattr(facial_arm, "SEGMENT_SECONDS", 1)
+    sequential = facial_arm.analyze_arm_symmetry(arm_clip, target_fps=15, workers=1)
+
+    def no_fallback(*args):
+        raise AssertionError("a segment could not seek exactly")
+
+    monkeypatch.setattr(facial_arm, "analyze_sequential", no_fallback)
+    sharded = facial_arm.analyze_arm_symmetry(arm_clip, target_fps=15, workers=2)
+    assert sequential["segments"] == 4 and sequential["total_frames"] == 48
+    assert sharded == sequential
+
+
+def test_concurrent_first_requests_share_one_pool(video_pool, monkeypatch):
+    created = []
+
+    class SlowPool:
+        def __init__(self, **kwargs):
+            time.sleep(0.05)
+            created.append(self)
+
+        def shutdown(self):
+            pass
+
+    monkeypatch.setattr(facial_arm, "ProcessPoolExecutor", SlowPool)
+    pools = []
+    threads = [threading.Thread(target=lambda: pools.append(facial_arm.get_video_pool())) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 1 and all(pool is created[0] for pool in pools)
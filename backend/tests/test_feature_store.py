@@ -0,0 +1,74 @@
+# tests/test_feature_store.py - Resumable shard writing and the batch scorer that fills it
+
+import os
+import shutil
+
+import cv2
+import numpy as np
+import pytest
+
+from calibration import batch_score
+from calibration.feature_store import SHARDS_DIR, FeatureStore, ShardWriter
+
+SETTINGS = {"tests": ["arm"], "fps": 15.0}
+
+
+def arm_columns(frames, score=0.5):
+    return {
+        "frame_index": np.arange(frames, dtype=np.int32),
+        "frame_size": np.full((frames, 2), 64, dtype=np.int32),
+        "arm_found": np.ones(frames, dtype=bool),
+        "arm_points": np.zeros((frames, 33, 3), dtype=np.float32),
+        "arm_visibility": np.ones((frames, 33), dtype=np.float32),
+        "arm_score": np.full(frames, score, dtype=np.float32),
+    }
+
+
+def test_resume_keeps_committed_files_and_drops_the_rest(tmp_path):
+    store = str(tmp_path / "store")
+    writer = ShardWriter(store, SETTINGS, shard_rows=5)
+    writer.add_file({"path": "a.mp4", "label": "normal"}, arm_columns(3))
+    writer.add_file({"path": "b.mp4", "label": "stroke"}, arm_columns(3, score=0.1))
+    # Past shard_rows: a and b are committed together. c is still buffered when the run dies
+    writer.add_file({"path": "c.mp4", "label": "normal"}, arm_columns(2))
+    # A shard renamed into place by a run that died before its manifest was written
+    shutil.copytree(os.path.join(store, SHARDS_DIR, "00000"), os.path.join(store, SHARDS_DIR, "00001"))
+
+    resumed = ShardWriter(store, SETTINGS, shard_rows=5)
+    assert resumed.completed == {"a.mp4", "b.mp4"}
+    assert sorted(os.listdir(os.path.join(store, SHARDS_DIR))) == ["00000"]
+    resumed.add_file({"path": "c.mp4", "label": "normal"}, arm_columns(2))
+    resumed.add_file({"path": "d.jpg", "label": "normal", "error": "unreadable image"})
+    resumed.flush()
+
+    features = FeatureStore(store)
+    assert [entry["path"] for entry in features.files] == ["a.mp4", "b.mp4", "c.mp4", "d.jpg"]
+    assert len(features) == 8
+    np.testing.assert_array_equal(features.column("file_id"), [0, 0, 0, 1, 1, 1, 2, 2])
+    assert list(features.labels) == ["normal", "stroke", "normal", "normal"]
+
+
+def test_resume_with_other_settings_is_refused(tmp_path):
+    store = str(tmp_path / "store")
+    writer = ShardWriter(store, SETTINGS)
+    writer.add_file({"path": "a.mp4", "label": "normal"}, arm_columns(1))
+    writer.flush()
+    with pytest.raises(ValueError, match="different settings"):
+        ShardWriter(store, dict(SETTINGS, fps=30.0))
+
+
+def test_files_without_a_face_stack_at_a_non_refined_tier(main_module, monkeypatch, sample_image, tmp_path):
+    monkeypatch.setenv("QUALITY_BEST_TIER", "reduced")
+    monkeypatch.setattr(main_module, "QUALITY_BEST_TIER", "reduced")
+    images = tmp_path / "normal"
+    images.mkdir()
+    shutil.copy(sample_image("normal_face.png"), images / "face.png")
+    cv2.imwrite(str(images / "blank.png"), np.zeros((120, 160, 3), dtype=np.uint8))
+
+    output = str(tmp_path / "store")
+    assert batch_score.run([str(images)], output, workers=1, tests=["face"]) == (2, 2)
+    features = FeatureStore(output)
+    found = features.column("face_found")
+    assert found.tolist() == [False, True]
+    # FaceMesh without refinement: 468 landmarks, whether or not a face was found
+    assert features.shard(0, ["face_points"])["face_points"].shape == (2, 468, 3)
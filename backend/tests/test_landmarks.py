@@ -0,0 +1,63 @@
+# tests/test_landmarks.py - Client-computed landmark uploads: parsing, validation and body limits
+
+import io
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from utils.preprocessing import decode_landmark_tensor
+
+
+def npy_bytes(array):
+    buffer = io.BytesIO()
+    np.save(buffer, array)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def client(main_module):
+    with TestClient(main_module.app) as client:
+        yield client
+
+
+def test_raw_and_npy_payloads_decode_alike(recorded_landmarks):
+    frames = np.repeat(recorded_landmarks("asymmetrical_arms")[None], 3, axis=0).astype(np.float32)
+    raw = decode_landmark_tensor(frames.tobytes(), 33)
+    npy = decode_landmark_tensor(npy_bytes(frames), 33)
+    for a, b in zip(raw, npy):
+        np.testing.assert_array_equal(a, b)
+
+
+@pytest.mark.parametrize("channel", [0, 3])
+def test_non_finite_values_are_rejected(recorded_landmarks, channel):
+    frames = np.repeat(recorded_landmarks("asymmetrical_arms")[None], 2, axis=0).astype(np.float32)
+    frames[1, 12, channel] = np.nan
+    with pytest.raises(ValueError, match="finite"):
+        decode_landmark_tensor(frames.tobytes(), 33)
+
+
+def test_arm_landmarks_are_scored(client, recorded_landmarks):
+    frames = np.repeat(recorded_landmarks("asymmetrical_arms")[None], 8, axis=0).astype(np.float32)
+    response = client.post("/analyze-landmarks/arm", content=npy_bytes(frames))
+    assert response.status_code == 200, response.text
+    assert response.json()["frames_received"] == 8
+
+
+def test_oversized_content_length_is_rejected_before_reading(client, main_module, monkeypatch):
+    monkeypatch.setattr(main_module, "LANDMARK_MAX_FRAMES", 2)
+    body = np.zeros((200, 33, 4), dtype=np.float32).tobytes()
+    assert client.post("/analyze-landmarks/arm", content=body).status_code == 413
+
+
+def test_oversized_chunked_body_is_cut_off(client, main_module, monkeypatch):
+    monkeypatch.setattr(main_module, "LANDMARK_MAX_FRAMES", 2)
+
+    def chunks():
+        # No Content-Length: only the running count can stop this body
+        for _ in range(64):
+            yield bytes(4096)
+
+    response = client.post("/analyze-landmarks/arm", content=chunks())
+    assert response.status_code == 413
+    assert "exceeds" in response.json()["error"]
@@ -0,0 +1,73 @@
+# tests/test_nearby_services.py - KD-tree stroke-center lookup against the brute-force reference
+
+import os
+
+import numpy as np
+import pytest
+
+from utils import nearby_services
+from utils.nearby_services import StrokeCenterIndex, build_index, read_facilities
+
+
+def write_facilities(path, count, seed=0):
+    rng = np.random.default_rng(seed)
+    lines = ["name,latitude,longitude"]
+    for i in range(count):
+        lines.append(f"Center {i},{rng.uniform(-60, 60):.5f},{rng.uniform(-180, 180):.5f}")
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+@pytest.fixture
+def index_dir(tmp_path):
+    directory = str(tmp_path / "centers")
+    build_index(write_facilities(tmp_path / "facilities.csv", 500), directory, leaf_size=8)
+    return directory
+
+
+def test_nearest_matches_brute_force(index_dir):
+    index = StrokeCenterIndex.load(index_dir)
+    rng = np.random.default_rng(1)
+    for lat, lon in zip(rng.uniform(-70, 70, 50), rng.uniform(-180, 180, 50)):
+        ids, distances = index.nearest_ids(lat, lon, k=5)
+        expected_ids, expected_distances = index.brute_force_ids(lat, lon, k=5)
+        np.testing.assert_array_equal(ids, expected_ids)
+        np.testing.assert_allclose(distances, expected_distances, rtol=1e-6)
+
+
+@pytest.mark.parametrize("k", [0, -1])
+def test_no_results_for_non_positive_k(index_dir, k):
+    index = StrokeCenterIndex.load(index_dir)
+    ids, distances = index.nearest_ids(10.0, 20.0, k=k)
+    assert len(ids) == 0 and len(distances) == 0
+    assert index.nearest(10.0, 20.0, k=k) == []
+
+
+def test_rebuild_replaces_the_index(index_dir, tmp_path):
+    build_index(write_facilities(tmp_path / "smaller.csv", 20, seed=2), index_dir)
+    assert len(StrokeCenterIndex.load(index_dir)) == 20
+    # Nothing of the build is left next to the index
+    assert sorted(os.listdir(tmp_path)) == ["centers", "facilities.csv", "smaller.csv"]
+
+
+def test_failed_build_keeps_the_existing_index(index_dir, tmp_path, monkeypatch):
+    def fail(*args):
+        raise OSError("disk full")
+
+    # Fails after the arrays are written, before the manifest
+    monkeypatch.setattr(nearby_services, "_save_strings", fail)
+    with pytest.raises(OSError):
+        build_index(write_facilities(tmp_path / "smaller.csv", 20, seed=2), index_dir)
+    assert len(StrokeCenterIndex.load(index_dir)) == 500
+    assert sorted(os.listdir(tmp_path)) == ["centers", "facilities.csv", "smaller.csv"]
+
+
+def test_file_without_valid_coordinates_is_refused(tmp_path):
+    path = tmp_path / "facilities.csv"
+    path.write_text("name,latitude,longitude\nA,,10\nB,91,10\nC,nan,nan\n")
+    with pytest.raises(ValueError, match="3 rows skipped"):
+        read_facilities(str(path))
+    # One valid row is enough
+    path.write_text("name,latitude,longitude\nA,,10\nB,45.5,-73.6\n")
+    facilities = read_facilities(str(path))
+    assert facilities["latitude"] == [45.5] and facilities["skipped"] == 1
@@ -0,0 +1,125 @@
+# tests/test_notifications.py - Outbox claim/send/retry/recover cycle with the fake SMS provider
+
+import time
+
+import pytest
+
+from utils.notifications import FakeSmsProvider, NotificationDispatcher, Outbox
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    outbox = Outbox(str(tmp_path / "state" / "outbox.db"), lease=0.2)
+    yield outbox
+    outbox.close()
+
+
+def wait_until_complete(dispatcher, dispatch_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = dispatcher.status(dispatch_id)
+        if status["complete"]:
+            return status
+        time.sleep(0.02)
+    raise AssertionError(f"Dispatch not complete: {dispatcher.status(dispatch_id)}")
+
+
+def test_database_is_created_on_first_use(tmp_path):
+    path = tmp_path / "state" / "outbox.db"
+    outbox = Outbox(str(path))
+    assert not path.parent.exists()
+    outbox.add("alert", ["+1555"])
+    assert path.exists()
+    outbox.close()
+
+
+def test_claim_leases_each_delivery_once(outbox):
+    outbox.add("alert", ["+1555", "+1666"])
+    rows = outbox.claim_due(10)
+    assert sorted(row[1] for row in rows) == ["+1555", "+1666"]
+    assert outbox.claim_due(10) == []
+
+    dispatch_id, contact, attempts, message, claim = rows[0]
+    assert (attempts, message) == (0, "alert")
+    assert outbox.update(dispatch_id, contact, claim, "sent", 1, sid="SM1")
+    statuses = {d["contact"]: d["status"] for d in outbox.status(dispatch_id)["deliveries"]}
+    assert statuses == {contact: "sent", rows[1][1]: "sending"}
+
+
+def test_recover_only_requeues_expired_leases(outbox):
+    dispatch_id = outbox.add("alert", ["+1555"])
+    (row,) = outbox.claim_due(1)
+    # Another sender still holds the lease
+    assert outbox.recover() == 0
+    assert outbox.status(dispatch_id)["deliveries"][0]["status"] == "sending"
+
+    time.sleep(0.25)
+    assert outbox.recover() == 1
+    assert outbox.status(dispatch_id)["deliveries"][0]["status"] == "pending"
+    # The sender that lost its lease can no longer record an outcome
+    assert not outbox.update(row[0], row[1], row[4], "sent", 1, sid="SM-late")
+
+
+def test_expired_lease_is_claimed_again(outbox):
+    outbox.add("alert", ["+1555"])
+    (first,) = outbox.claim_due(1)
+    assert outbox.claim_due(1) == []
+    time.sleep(0.25)
+    (second,) = outbox.claim_due(1)
+    assert second[1] == first[1] and second[4] != first[4]
+    assert not outbox.update(first[0], first[1], first[4], "failed", 1, error="late")
+    assert outbox.update(second[0], second[1], second[4], "sent", 1, sid="SM2")
+
+
+def test_dispatcher_retries_and_gives_up_on_permanent_failures(outbox):
+    provider = FakeSmsProvider(fail_first=1, reject={"+1bad"})
+    dispatcher = NotificationDispatcher(provider, outbox, concurrency=2, max_attempts=3, backoff_base=0.01)
+    dispatcher.start()
+    try:
+        dispatch_id = dispatcher.dispatch(["+1555", " +1666 ", "+1555", "", "+1bad"], "Stroke alert")
+        status = wait_until_complete(dispatcher, dispatch_id)
+    finally:
+        dispatcher.stop()
+
+    deliveries = {d["contact"]: d for d in status["deliveries"]}
+    assert status["total_contacts"] == 3
+    assert status["notifications_sent"] == 2
+    assert status["failed_contacts"] == 1
+    # The first attempt to every number fails with a retryable error
+    assert deliveries["+1555"]["attempts"] == deliveries["+1666"]["attempts"] == 2
+    assert deliveries["+1bad"]["attempts"] == 1
+    assert "Invalid number" in deliveries["+1bad"]["error"]
+    assert sorted(message["to"] for message in provider.sent) == ["+1555", "+1666"]
+
+
+def test_dispatcher_stops_after_max_attempts(outbox):
+    provider = FakeSmsProvider(fail_first=10)
+    dispatcher = NotificationDispatcher(provider, outbox, max_attempts=3, backoff_base=0.01)
+    dispatcher.start()
+    try:
+        status = wait_until_complete(dispatcher, dispatcher.dispatch(["+1555"], "Stroke alert"))
+    finally:
+        dispatcher.stop()
+    assert status["deliveries"][0]["status"] == "failed"
+    assert status["deliveries"][0]["attempts"] == 3
+
+
+def test_restart_resumes_deliveries_left_mid_send(tmp_path):
+    path = str(tmp_path / "outbox.db")
+    crashed = Outbox(path, lease=0.1)
+    dispatch_id = crashed.add("Stroke alert", ["+1555", "+1666"])
+    crashed.claim_due(1)
+    # The process dies here: one delivery is leased and never reported, the other still pending
+    crashed.close()
+
+    time.sleep(0.15)
+    provider = FakeSmsProvider()
+    dispatcher = NotificationDispatcher(provider, Outbox(path, lease=0.1))
+    dispatcher.start()
+    try:
+        status = wait_until_complete(dispatcher, dispatch_id)
+    finally:
+        dispatcher.stop()
+        dispatcher.outbox.close()
+    assert status["notifications_sent"] == 2
+    assert sorted(message["to"] for message in provider.sent) == ["+1555", "+1666"]
@@ -0,0 +1,127 @@
+# tests/test_quality.py - Tier stepping of the load-adaptive quality controller, on a controlled clock
+
+import pytest
+
+from utils import quality
+from utils.quality import QualityController, QualityTier
+
+TIERS = [
+    QualityTier("full", True, 1, 256),
+    QualityTier("reduced", False, 1, 192),
+    QualityTier("fast", False, 0, 128),
+]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controls ``time.monotonic`` as seen by the controller"""
+    now = [1000.0]
+    monkeypatch.setattr(quality.time, "monotonic", lambda: now[0])
+    return now
+
+
+def controller(**kwargs):
+    # SLOs of 100 ms queue wait and 200 ms inference
+    return QualityController(TIERS, 0.1, 0.2, window=10.0, cooldown=5.0, recover_ratio=0.5, min_samples=5, **kwargs)
+
+
+def observe(control, queue_wait=None, latency=None, count=5):
+    for _ in range(count):
+        if queue_wait is not None:
+            control.observe_queue_wait(queue_wait)
+        if latency is not None:
+            control.observe_latency(latency)
+
+
+def test_breaking_either_slo_steps_down_one_tier(clock):
+    control = controller()
+    clock[0] += 6
+    observe(control, queue_wait=0.3)
+    assert control.current().name == "reduced"
+
+    # Judged only on traffic served since the change
+    clock[0] += 6
+    observe(control, queue_wait=0.05, latency=0.5)
+    assert control.current().name == "fast"
+    assert control.changes == 2
+
+    # Already at the cheapest tier
+    clock[0] += 6
+    observe(control, latency=0.5)
+    assert control.current().name == "fast" and control.changes == 2
+
+
+def test_no_change_during_the_cooldown(clock):
+    control = controller()
+    clock[0] += 4.9
+    observe(control, queue_wait=0.3)
+    assert control.current().name == "full"
+    clock[0] += 0.2
+    assert control.current().name == "reduced"
+
+
+def test_too_few_samples_hold_the_tier(clock):
+    control = controller(start=1)
+    clock[0] += 6
+    observe(control, queue_wait=0.3, count=4)
+    assert control.current().name == "reduced"
+    # Not idle either: a few fast samples do not step up
+    observe(control, latency=0.01, count=4)
+    assert control.current().name == "reduced"
+    # Each signal with any samples needs min_samples of them
+    observe(control, queue_wait=0.3, count=1)
+    assert control.current().name == "reduced"
+    observe(control, latency=0.01, count=1)
+    assert control.current().name == "fast"
+
+
+def test_recovery_needs_a_margin_below_the_slo(clock):
+    control = controller(start=2)
+    clock[0] += 6
+    # Between recover_ratio and the SLO: the tier holds
+    observe(control, queue_wait=0.07, latency=0.15)
+    assert control.current().name == "fast"
+
+    # Samples older than the window no longer count
+    clock[0] += 11
+    observe(control, queue_wait=0.04, latency=0.09)
+    assert control.current().name == "reduced"
+
+
+def test_idle_server_steps_back_up(clock):
+    control = controller(start=2)
+    clock[0] += 6
+    assert control.current().name == "reduced"
+    clock[0] += 6
+    assert control.current().name == "full"
+    clock[0] += 6
+    assert control.current().name == "full" and control.changes == 2
+
+
+def test_limit_keeps_the_controller_on_loaded_tiers(clock):
+    limited = []
+    control = controller(on_limited=limited.append)
+    control.limit_to(1)
+    clock[0] += 6
+    observe(control, queue_wait=0.3)
+    assert control.current().name == "reduced"
+    clock[0] += 6
+    observe(control, queue_wait=0.3)
+    # "fast" is wanted but not loaded: the controller stays and asks for it
+    assert control.current().name == "reduced"
+    assert limited == [2]
+    assert control.stats()["available_tiers"] == ["full", "reduced"]
+
+    control.limit_to(2)
+    observe(control, queue_wait=0.3)
+    assert control.current().name == "fast"
+    # Clamped to the configured range
+    control.limit_to(10)
+    assert control.available == 2
+
+
+def test_disabled_controller_never_changes(clock):
+    control = controller(enabled=False)
+    clock[0] += 6
+    observe(control, queue_wait=1.0, latency=1.0)
+    assert control.current().name == "full" and control.changes == 0
@@ -0,0 +1,170 @@
+# tests/test_scoring.py - The vectorized scores must equal the original per-landmark formulas
+
+import math
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from utils.scoring import (
+    FACIAL_SYMMETRY_PAIRS, angles, arm_symmetry_scores, distances, face_symmetry_scores
+)
+
+
+# Reference implementations: the per-landmark loops the analyzer used before scoring was vectorized
+
+def as_landmarks(frame):
+    """Landmark objects like MediaPipe's, with Python float fields"""
+    return [
+        SimpleNamespace(x=float(row[0]), y=float(row[1]), z=float(row[2]),
+                        visibility=float(row[3]) if len(row) > 3 else 0.0)
+        for row in frame
+    ]
+
+
+def reference_face_symmetry(landmarks):
+    distance_diffs = []
+    for left_idx, right_idx in FACIAL_SYMMETRY_PAIRS:
+        left_point = landmarks[left_idx]
+        right_point = landmarks[right_idx]
+
+        left_dist = abs(left_point.x - 0.5)
+        right_dist = abs(right_point.x - 0.5)
+        y_factor = 1 + abs(left_point.y - 0.5) * 0.5
+        diff = abs(left_dist - right_dist) / y_factor
+        distance_diffs.append(diff)
+
+    face_width = abs(landmarks[234].x - landmarks[454].x) + 1e-6
+    avg_distance_diff = np.mean(distance_diffs)
+    distance_symmetry = max(0, 1 - (avg_distance_diff / (face_width * 0.5)))
+    return max(0, min(1, distance_symmetry))
+
+
+def reference_arm_symmetry(landmarks):
+    left_shoulder = landmarks[11]
+    right_shoulder = landmarks[12]
+    left_wrist = landmarks[15]
+    right_wrist = landmarks[16]
+
+    if any(lm.visibility < 0.5 for lm in [left_shoulder, right_shoulder, left_wrist, right_wrist]):
+        return None
+
+    shoulder_midpoint_y = (left_shoulder.y + right_shoulder.y) / 2
+    left_wrist_height = abs(left_wrist.y - shoulder_midpoint_y)
+    right_wrist_height = abs(right_wrist.y - shoulder_midpoint_y)
+    height_diff = abs(left_wrist_height - right_wrist_height)
+    height_symmetry = max(0, 1 - (height_diff * 4))
+
+    body_center_x = (left_shoulder.x + right_shoulder.x) / 2
+    left_wrist_dist = abs(left_wrist.x - body_center_x)
+    right_wrist_dist = abs(right_wrist.x - body_center_x)
+    dist_diff = abs(left_wrist_dist - right_wrist_dist)
+    distance_symmetry = max(0, 1 - (dist_diff * 3))
+
+    combined_symmetry = (height_symmetry * 0.5 + distance_symmetry * 0.5)
+    return max(0, min(1, combined_symmetry))
+
+
+def reference_angle(p1, p2, p3):
+    a = np.array([p1.x, p1.y])
+    b = np.array([p2.x, p2.y])
+    c = np.array([p3.x, p3.y])
+
+    ba = a - b
+    bc = c - b
+
+    cosine_angle = np.dot(ba, bc) / (np.linalg.norm(ba) * np.linalg.norm(bc) + 1e-8)
+    return np.degrees(np.arccos(np.clip(cosine_angle, -1.0, 1.0)))
+
+
+def reference_distance(p1, p2):
+    return math.sqrt((p1.x - p2.x)**2 + (p1.y - p2.y)**2)
+
+
+def assert_matches_reference(scores, frames, reference):
+    assert len(scores) == len(frames)
+    for score, frame in zip(scores, frames):
+        expected = reference(as_landmarks(frame))
+        if expected is None:
+            assert np.isnan(score)
+        else:
+            # Same operations in the same order, so the results are bit-identical
+            assert score == expected
+
+
+@pytest.fixture
+def random_frames():
+    """(frames, 478, 4) float32 landmarks: half spread over the image, half near-symmetric around the centre"""
+    rng = np.random.default_rng(7)
+    frames = rng.uniform(0, 1, (200, 478, 4)).astype(np.float32)
+    frames[:100, :, :3] = 0.5 + (frames[:100, :, :3] - 0.5) * 0.05
+    return frames
+
+
+def jittered(frame, count, scale, seed):
+    """``count`` copies of a recorded frame with small landmark noise, like consecutive video frames"""
+    rng = np.random.default_rng(seed)
+    frames = np.repeat(frame[np.newaxis], count, axis=0)
+    frames[..., :3] += rng.normal(0, scale, frames[..., :3].shape).astype(np.float32)
+    return frames
+
+
+def test_face_scores_match_reference_on_random_frames(random_frames):
+    scores = face_symmetry_scores(random_frames[..., :3])
+    assert_matches_reference(scores, random_frames, reference_face_symmetry)
+    # The near-symmetric half exercises the unclipped range
+    assert ((scores[:100] > 0) & (scores[:100] < 1)).sum() > 25
+
+
+@pytest.mark.parametrize("name", ["normal_face", "drooped_face"])
+def test_face_scores_match_reference_on_recorded_frames(recorded_landmarks, name):
+    frame = recorded_landmarks(name)
+    assert face_symmetry_scores(frame[:, :3]) == reference_face_symmetry(as_landmarks(frame))
+
+    frames = jittered(frame, 30, 0.002, seed=1)
+    assert_matches_reference(face_symmetry_scores(frames[..., :3]), frames, reference_face_symmetry)
+
+
+def test_recorded_faces_keep_their_order(recorded_landmarks):
+    normal = face_symmetry_scores(recorded_landmarks("normal_face")[:, :3])
+    drooped = face_symmetry_scores(recorded_landmarks("drooped_face")[:, :3])
+    assert drooped < normal
+
+
+def test_uniform_pair_weights_equal_the_plain_mean(random_frames):
+    points = random_frames[..., :3]
+    weighted = face_symmetry_scores(points, pair_weights=np.ones(len(FACIAL_SYMMETRY_PAIRS)))
+    np.testing.assert_allclose(weighted, face_symmetry_scores(points), rtol=0, atol=1e-12)
+
+
+def test_arm_scores_match_reference_on_random_frames(random_frames):
+    frames = random_frames[:, :33]
+    scores = arm_symmetry_scores(frames[..., :3], frames[..., 3])
+    assert_matches_reference(scores, frames, reference_arm_symmetry)
+    # Random visibility hides some key landmarks and not others
+    assert np.isnan(scores).any() and not np.isnan(scores).all()
+
+
+def test_arm_scores_match_reference_on_recorded_frames(recorded_landmarks):
+    frame = recorded_landmarks("asymmetrical_arms")
+    assert arm_symmetry_scores(frame[:, :3], frame[:, 3]) == reference_arm_symmetry(as_landmarks(frame))
+
+    frames = jittered(frame, 30, 0.002, seed=2)
+    scores = arm_symmetry_scores(frames[..., :3], frames[..., 3])
+    assert_matches_reference(scores, frames, reference_arm_symmetry)
+
+
+def test_arm_visibility_threshold_is_inclusive(recorded_landmarks):
+    frame = recorded_landmarks("asymmetrical_arms").copy()
+    frame[[11, 12, 15, 16], 3] = 0.5
+    assert not np.isnan(arm_symmetry_scores(frame[:, :3], frame[:, 3]))
+    frame[15, 3] = np.nextafter(np.float32(0.5), np.float32(0))
+    assert np.isnan(arm_symmetry_scores(frame[:, :3], frame[:, 3]))
+
+
+def test_angles_and_distances_match_reference(random_frames):
+    p1, p2, p3 = random_frames[:, 0], random_frames[:, 1], random_frames[:, 2]
+    expected_angles = [reference_angle(*as_landmarks(points)) for points in zip(p1, p2, p3)]
+    expected_distances = [reference_distance(*as_landmarks(points)) for points in zip(p1, p2)]
+    np.testing.assert_allclose(angles(p1, p2, p3), expected_angles, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(distances(p1, p2), expected_distances, rtol=0, atol=1e-12)
@@ -0,0 +1,214 @@
+# tests/test_speech.py - Recording formats accepted by the speech endpoint, and the acoustic measures behind its score
+
+import io
+import stat
+import wave
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from utils import speech
+from utils.speech import (
+    DYSARTHRIA_COMPONENTS, SpeechFeatureExtractor, analyze_samples, detect_speech, dysarthria_score,
+    needs_seekable_input, read_wav, summarize_features, transcode_to_wav
+)
+
+# Start of an MP4 'ftyp' box, as in the .m4a files the Flutter record package writes
+M4A_HEADER = b"\x00\x00\x00\x1cftypM4A \x00\x00\x00\x00M4A mp42isom"
+RATE = 16000
+
+
+def box(kind, payload=bytes(8)):
+    return (8 + len(payload)).to_bytes(4, "big") + kind + payload
+
+
+def syllables(seconds, f0=150.0, per_second=4):
+    """A voiced tone at ``f0`` whose loudness rises and falls ``per_second`` times a second"""
+    t = np.arange(int(seconds * RATE)) / RATE
+    return np.sin(2 * np.pi * f0 * t) * np.sin(np.pi * per_second * t) ** 2
+
+
+def utterance(per_second=4, pause=0.6):
+    """Two 1.5 s phrases separated by ``pause`` seconds of silence, over faint noise"""
+    silence = np.zeros(int(0.5 * RATE))
+    signal = np.concatenate([
+        silence, syllables(1.5, per_second=per_second), np.zeros(int(pause * RATE)),
+        syllables(1.5, per_second=per_second), silence
+    ])
+    noise = np.random.default_rng(0).normal(0, 1e-3, len(signal))
+    return (0.5 * signal + noise).astype(np.float32)
+
+
+def summarize(signal):
+    extractor = SpeechFeatureExtractor(RATE)
+    extractor.feed(signal)
+    return summarize_features(extractor.features(), extractor.frame_seconds)
+
+
+def tone_wav(seconds=2.0, rate=16000):
+    """A 150 Hz voiced tone pulsed four times a second, as 16-bit mono WAV bytes"""
+    t = np.arange(int(seconds * rate)) / rate
+    signal = np.sin(2 * np.pi * 150 * t) * (0.55 + 0.45 * np.sin(2 * np.pi * 4 * t))
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes((signal * 12000).astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path):
+    """An executable standing in for ffmpeg that always outputs the same WAV file"""
+    converted = tmp_path / "converted.wav"
+    converted.write_bytes(tone_wav())
+    script = tmp_path / "ffmpeg"
+    script.write_text(f"#!/bin/sh\ncat '{converted}'\n")
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    return str(script)
+
+
+def post_recording(client, data, filename):
+    return client.post("/analyze-speech/", files={"file": (filename, data, "application/octet-stream")})
+
+
+def test_compressed_recording_without_ffmpeg_is_unsupported(main_module, monkeypatch):
+    monkeypatch.setattr(main_module, "SPEECH_FFMPEG", "no-such-ffmpeg")
+    with TestClient(main_module.app) as client:
+        response = post_recording(client, M4A_HEADER + bytes(512), "speech.m4a")
+    assert response.status_code == 415
+    assert "WAV" in response.json()["error"]
+
+
+def test_compressed_recording_is_converted_with_ffmpeg(main_module, monkeypatch, fake_ffmpeg):
+    monkeypatch.setattr(main_module, "SPEECH_FFMPEG", fake_ffmpeg)
+    with TestClient(main_module.app) as client:
+        converted = post_recording(client, M4A_HEADER + bytes(512), "speech.m4a")
+        original = post_recording(client, tone_wav(), "speech.wav")
+    assert converted.status_code == original.status_code
+    assert converted.json().get("dysarthria_score") == original.json().get("dysarthria_score")
+
+
+def test_failed_conversion_is_a_value_error(tmp_path):
+    script = tmp_path / "ffmpeg"
+    script.write_text("#!/bin/sh\necho 'Invalid data found when processing input' >&2\nexit 1\n")
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    with pytest.raises(ValueError, match="Invalid data"):
+        transcode_to_wav(M4A_HEADER, str(script))
+
+
+def test_converted_wav_is_readable(fake_ffmpeg):
+    samples, rate = read_wav(transcode_to_wav(M4A_HEADER, fake_ffmpeg))
+    assert rate == 16000 and samples.shape == (32000, 1)
+
+
+@pytest.fixture
+def recording_ffmpeg(tmp_path):
+    """A stand-in ffmpeg that records its arguments and stdin, then outputs a WAV file"""
+    converted = tmp_path / "converted.wav"
+    converted.write_bytes(tone_wav())
+    script = tmp_path / "ffmpeg"
+    script.write_text(
+        f"#!/bin/sh\nprintf '%s\\n' \"$@\" > '{tmp_path}/args'\n"
+        f"cat > '{tmp_path}/stdin'\ncat '{converted}'\n"
+    )
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    return str(script)
+
+
+def test_streamable_recording_is_piped_to_ffmpeg(recording_ffmpeg, tmp_path):
+    faststart = M4A_HEADER + box(b"moov") + box(b"mdat")
+    for data in (faststart, b"OggS" + bytes(64)):
+        transcode_to_wav(data, recording_ffmpeg)
+        assert (tmp_path / "args").read_text().split("\n")[3] == "pipe:0"
+        assert (tmp_path / "stdin").read_bytes() == data
+
+
+def test_index_at_the_end_is_spooled_to_a_file(recording_ffmpeg, tmp_path, monkeypatch):
+    spool = tmp_path / "spool"
+    spool.mkdir()
+    monkeypatch.setattr(speech, "SPOOL_DIR", str(spool))
+    transcode_to_wav(M4A_HEADER + box(b"mdat") + box(b"moov"), recording_ffmpeg)
+    source = (tmp_path / "args").read_text().split("\n")[4]
+    assert source.startswith(str(spool))
+    assert (tmp_path / "stdin").read_bytes() == b""
+    assert list(spool.iterdir()) == []
+
+
+def test_seekable_input_is_needed_only_for_a_trailing_index():
+    assert needs_seekable_input(M4A_HEADER + box(b"mdat") + box(b"moov"))
+    assert needs_seekable_input(M4A_HEADER + box(b"free") + box(b"mdat"))
+    assert not needs_seekable_input(M4A_HEADER + box(b"moov") + box(b"mdat"))
+    assert not needs_seekable_input(tone_wav())
+    # Size 0: the box runs to the end of the file
+    assert not needs_seekable_input(M4A_HEADER + bytes(8))
+
+
+def test_pitch_of_a_pure_tone():
+    t = np.arange(RATE) / RATE
+    extractor = SpeechFeatureExtractor(RATE)
+    extractor.feed((0.5 * np.sin(2 * np.pi * 200 * t)).astype(np.float32))
+    features = extractor.features()
+    assert np.all(np.abs(features["f0_hz"] - 200) < 1)
+    assert np.all(features["periodicity"] > 0.9)
+    assert np.all(np.abs(features["centroid_hz"] - 200) < 25)
+
+
+def test_features_do_not_depend_on_the_chunk_size():
+    signal = utterance()
+    whole, chunked = SpeechFeatureExtractor(RATE), SpeechFeatureExtractor(RATE)
+    whole.feed(signal)
+    for start in range(0, len(signal), 777):
+        chunked.feed(signal[start:start + 777])
+    for name, values in whole.features().items():
+        np.testing.assert_allclose(chunked.features()[name], values, rtol=1e-4, atol=1e-4, err_msg=name)
+
+
+def test_vad_bridges_short_gaps_and_drops_clicks():
+    energy = np.full(400, -80.0)
+    energy[50:150] = -20
+    energy[155:250] = -20   # a 50 ms gap, shorter than the hangover
+    energy[300:302] = -20   # a 20 ms click
+    speech = detect_speech(energy, 0.01)
+    assert np.flatnonzero(speech).tolist() == list(range(50, 250))
+
+
+def test_rate_pauses_and_pitch_of_a_synthetic_utterance():
+    summary = summarize(utterance(per_second=4, pause=0.6))
+    assert summary["syllables"] == 12
+    assert summary["articulation_rate"] == pytest.approx(4.0, abs=0.2)
+    assert summary["pause_count"] == 1
+    assert summary["pause_max_s"] == pytest.approx(0.6, abs=0.05)
+    assert summary["mean_f0_hz"] == pytest.approx(150, abs=2)
+    assert summary["voiced_ratio"] > 0.9
+
+
+def test_slower_speech_with_longer_pauses_scores_higher():
+    normal, _ = dysarthria_score(summarize(utterance(per_second=4, pause=0.6)))
+    slow_summary = summarize(utterance(per_second=2, pause=1.5))
+    assert slow_summary["syllables"] == 6 and slow_summary["pause_max_s"] == pytest.approx(1.5, abs=0.05)
+    slow, components = dysarthria_score(slow_summary)
+    assert components["articulation_rate"] > 0.9 and components["pause_ratio"] > 0.3
+    assert slow > normal
+
+
+def test_score_is_the_weighted_sum_of_clipped_components():
+    normal = {name: normal for name, _, normal, _ in DYSARTHRIA_COMPONENTS}
+    impaired = {name: impaired for name, _, _, impaired in DYSARTHRIA_COMPONENTS}
+    assert dysarthria_score(normal)[0] == pytest.approx(0.0)
+    assert dysarthria_score(impaired)[0] == pytest.approx(1.0)
+    halfway = {name: (normal[name] + impaired[name]) / 2 for name in normal}
+    assert dysarthria_score(halfway)[0] == pytest.approx(0.5)
+    # Beyond either end a component is clipped
+    beyond = {name: 3 * impaired[name] - 2 * normal[name] for name in normal}
+    assert dysarthria_score(beyond)[1] == {name: 1.0 for name in normal}
+
+
+def test_stored_sample_formats_score_alike():
+    signal = utterance()
+    as_float = analyze_samples(signal.reshape(-1, 1), RATE)
+    as_int16 = analyze_samples((signal * 32767).astype("<i2").reshape(-1, 1), RATE)
+    assert as_float[1] == pytest.approx(as_int16[1], abs=1e-3)
+    assert analyze_samples(np.zeros((RATE, 1), dtype="<i2"), RATE) is None
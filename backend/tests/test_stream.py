@@ -0,0 +1,70 @@
+# tests/test_stream.py - WebSocket streaming sessions and the live frame channel behind them
+
+import asyncio
+import threading
+
+import cv2
+import pytest
+from fastapi.testclient import TestClient
+
+from utils.preprocessing import FrameChannel, iter_decoded_frames
+
+
+@pytest.fixture
+def face_jpeg(sample_image):
+    ok, encoded = cv2.imencode(".jpg", cv2.imread(sample_image("normal_face.png")))
+    return encoded.tobytes()
+
+
+def test_failed_session_reports_its_error(main_module, monkeypatch, face_jpeg):
+    def fail(*args):
+        raise TimeoutError("No model free")
+
+    monkeypatch.setattr(main_module, "stream_session", fail)
+    monkeypatch.setattr(main_module, "STREAM_MAX_INFLIGHT", 2)
+    with TestClient(main_module.app) as client:
+        with client.websocket_connect("/ws/analyze/face") as ws:
+            # More frames than the channel holds: nothing reads them once the job has failed
+            for _ in range(10):
+                ws.send_bytes(face_jpeg)
+            ws.send_text("end")
+            message = ws.receive_json()
+    assert message == {"type": "error", "error": "No model free"}
+
+
+def test_idle_session_is_closed(main_module, monkeypatch):
+    monkeypatch.setattr(main_module, "UPLOAD_PART_TIMEOUT", 0.3)
+    with TestClient(main_module.app) as client:
+        with client.websocket_connect("/ws/analyze/face") as ws:
+            message = ws.receive_json()
+    assert message["type"] == "error"
+    assert "No message received" in message["error"]
+
+
+def test_live_frames_are_yielded_before_the_next_arrives(face_jpeg):
+    async def run():
+        channel = FrameChannel(capacity=8)
+        yielded = []
+        consumed = threading.Event()
+
+        def consume():
+            for index, image in iter_decoded_frames(channel, lookahead=4):
+                yielded.append((index, image is not None))
+                consumed.set()
+
+        loop = asyncio.get_running_loop()
+        consumer = threading.Thread(target=consume, daemon=True)
+        consumer.start()
+        try:
+            for expected in range(3):
+                consumed.clear()
+                await channel.put(face_jpeg)
+                # Nothing else is sent until this frame has come out decoded
+                assert await loop.run_in_executor(None, consumed.wait, 5)
+                assert len(yielded) == expected + 1
+        finally:
+            channel.close()
+            await loop.run_in_executor(None, consumer.join, 5)
+        return yielded
+
+    assert asyncio.run(run()) == [(0, True), (1, True), (2, True)]
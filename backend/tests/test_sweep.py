@@ -0,0 +1,92 @@
+# tests/test_sweep.py - Offline rescoring and threshold sweeps, checked against the server's aggregation
+
+import numpy as np
+import pytest
+
+from calibration.feature_store import FeatureStore, ShardWriter
+from calibration.sweep import evaluate, file_scores, roc_curve, smoothed_frame_scores, sweep
+from utils.aggregation import ScoreAggregator
+
+# Three strokes among six recordings, one tie across the classes at 0.2
+SCORES = np.array([0.1, 0.2, 0.2, 0.4, 0.6, 0.8])
+POSITIVE = np.array([True, True, False, True, False, False])
+
+
+def test_file_scores_match_the_aggregator():
+    rng = np.random.default_rng(0)
+    # Short files use the plain mean, longer ones the smoothed mean; file 3 has no usable frame
+    counts = [1, 3, 5, 6, 0, 7, 40]
+    file_ids = np.repeat(np.arange(len(counts)), counts)
+    scores = rng.uniform(0, 1, len(file_ids))
+
+    means, frames = file_scores(file_ids, scores, len(counts))
+    np.testing.assert_array_equal(frames, counts)
+    assert np.isnan(means[4])
+    for file_id, count in enumerate(counts):
+        if count == 0:
+            continue
+        aggregator = ScoreAggregator()
+        aggregator.extend(scores[file_ids == file_id])
+        summary = aggregator.finalize()
+        assert means[file_id] == pytest.approx(summary["smoothed_mean"], abs=1e-12)
+        if count <= 5:
+            assert means[file_id] == pytest.approx(summary["mean"], abs=1e-12)
+
+
+def test_smoothing_windows_stop_at_file_boundaries():
+    file_ids = np.array([0, 0, 0, 1, 1, 1])
+    scores = np.array([0.0, 0.0, 0.0, 1.0, 1.0, 1.0])
+    np.testing.assert_array_equal(smoothed_frame_scores(file_ids, scores), scores)
+
+
+def test_roc_curve_has_one_point_per_distinct_score():
+    thresholds, tpr, fpr = roc_curve(SCORES, POSITIVE)
+    np.testing.assert_allclose(tpr, [0, 1 / 3, 2 / 3, 1, 1, 1])
+    np.testing.assert_allclose(fpr, [0, 0, 1 / 3, 1 / 3, 2 / 3, 1])
+    # Each point is what ``score < threshold`` calls at its threshold
+    for threshold, expected_tpr, expected_fpr in zip(thresholds, tpr, fpr):
+        called = SCORES < threshold
+        assert (called & POSITIVE).sum() / 3 == pytest.approx(expected_tpr)
+        assert (called & ~POSITIVE).sum() / 3 == pytest.approx(expected_fpr)
+
+
+def test_sweep_counts_positive_calls_below_each_threshold():
+    metrics = sweep(SCORES, POSITIVE, [0.0, 0.3, 1.0])
+    np.testing.assert_array_equal(metrics["true_positives"], [0, 2, 3])
+    np.testing.assert_array_equal(metrics["false_positives"], [0, 1, 3])
+    np.testing.assert_allclose(metrics["sensitivity"], [0, 2 / 3, 1])
+    np.testing.assert_allclose(metrics["specificity"], [1, 2 / 3, 0])
+    np.testing.assert_allclose(metrics["accuracy"], [0.5, 4 / 6, 0.5])
+    # No positive calls: precision is undefined
+    assert np.isnan(metrics["precision"][0])
+    assert metrics["precision"][1] == pytest.approx(2 / 3)
+
+
+def test_evaluate_separates_recorded_faces(recorded_landmarks, tmp_path):
+    rng = np.random.default_rng(0)
+    writer = ShardWriter(str(tmp_path / "store"), {"tests": ["face"]}, shard_rows=20)
+    for i, (name, label) in enumerate([("normal_face", "normal"), ("drooped_face", "stroke")] * 3):
+        points = recorded_landmarks(name)[:, :3].astype(np.float32)
+        frames = 8
+        writer.add_file({"path": f"{i}.mp4", "label": label}, {
+            "frame_index": np.arange(frames, dtype=np.int32),
+            "frame_size": np.full((frames, 2), 480, dtype=np.int32),
+            "face_found": np.ones(frames, dtype=bool),
+            "face_points": points + rng.normal(0, 1e-3, (frames,) + points.shape).astype(np.float32),
+            "face_score": np.zeros(frames, dtype=np.float32),
+        })
+    writer.add_file({"path": "blank.mp4", "label": "normal"}, {
+        "frame_index": np.arange(2, dtype=np.int32),
+        "frame_size": np.full((2, 2), 480, dtype=np.int32),
+        "face_found": np.zeros(2, dtype=bool),
+        "face_points": np.zeros((2, 478, 3), dtype=np.float32),
+        "face_score": np.zeros(2, dtype=np.float32),
+    })
+    writer.flush()
+
+    report = evaluate(FeatureStore(str(tmp_path / "store")), "face", ["stroke"])
+    # The file without a detected face has no score and is left out
+    assert (report["samples"], report["positives"], report["negatives"]) == (6, 3, 3)
+    assert report["auc"] == 1.0
+    assert report["best_youden"]["sensitivity"] == 1.0 and report["best_youden"]["specificity"] == 1.0
+    assert report["min_sensitivity"]["sensitivity"] >= 0.95
@@ -0,0 +1,112 @@
+# tests/test_triage.py - Single-request screening: per-modality statuses, verdict, location and alerting
+
+import time
+
+import cv2
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from utils.executor import ExecutorBusy
+from utils.nearby_services import build_index
+
+
+def jpeg(image):
+    ok, encoded = cv2.imencode(".jpg", image)
+    return encoded.tobytes()
+
+
+@pytest.fixture
+def drooped_face(sample_image):
+    return jpeg(cv2.imread(sample_image("drooped_face.png")))
+
+
+@pytest.fixture
+def blank_frame():
+    return jpeg(np.zeros((240, 320, 3), dtype=np.uint8))
+
+
+def frames(field, contents, count):
+    return [(field, ("frame.jpg", contents, "image/jpeg"))] * count
+
+
+def test_each_modality_reports_its_own_status(main_module, monkeypatch, drooped_face, blank_frame):
+    monkeypatch.setattr(main_module, "SPEECH_FFMPEG", "no-such-ffmpeg")
+    with TestClient(main_module.app) as client:
+        response = client.post("/triage/", files=frames("face_frames", drooped_face, 3) + frames("arm_frames", blank_frame, 2))
+        speech_only = client.post("/triage/", files=[("audio", ("speech.m4a", b"not audio", "audio/mp4"))])
+
+    assert response.status_code == 200
+    result = response.json()
+    face, arm, speech = (result["modalities"][test] for test in ("face", "arm", "speech"))
+    assert face["status"] == "ok" and face["result"]["frames_received"] == 3
+    assert arm["status"] == "no_detection" and "pose" in arm["message"]
+    assert speech == {"status": "not_provided"}
+    assert result["face_positive"] == face["result"]["stroke_detected"]
+    assert result["arm_positive"] is False and result["speech_positive"] is False
+
+    # A failed modality does not fail the request, and counts as negative
+    result = speech_only.json()
+    assert speech_only.status_code == 200
+    assert result["modalities"]["speech"]["status"] == "error"
+    assert "ffmpeg" in result["modalities"]["speech"]["error"]
+    assert result["modalities"]["face"] == {"status": "not_provided"}
+    assert result["stroke_detected"] is False
+
+
+def test_interleaved_or_missing_modalities_are_rejected(main_module, blank_frame):
+    files = frames("face_frames", blank_frame, 1) + frames("arm_frames", blank_frame, 1) + frames("face_frames", blank_frame, 1)
+    with TestClient(main_module.app) as client:
+        response = client.post("/triage/", files=files)
+        empty = client.post("/triage/", data={"emergency_contacts": "+15550100"}, files=[("unused", ("x", b"", "text/plain"))])
+    assert response.status_code == 400
+    assert response.json()["error"] == "Parts of 'face_frames' must be sent together"
+    assert empty.status_code == 400
+    assert empty.json()["error"] == "No face frames, arm frames or audio provided"
+
+
+def test_positive_verdict_lists_centers_and_alerts_contacts(main_module, monkeypatch, drooped_face, tmp_path):
+    facilities = tmp_path / "facilities.csv"
+    facilities.write_text(
+        "name,latitude,longitude,phone\n"
+        "Near Stroke Center,45.51,-73.57,+15145550100\n"
+        "Far Stroke Center,40.71,-74.00,\n"
+    )
+    index = str(tmp_path / "centers")
+    build_index(str(facilities), index)
+    # Loaded from the index at startup; restored once the test is over
+    monkeypatch.setattr(main_module, "STROKE_CENTER_INDEX", index)
+    monkeypatch.setattr(main_module, "stroke_centers", None)
+    monkeypatch.setattr(main_module, "FACE_THRESHOLD", 1.0)
+    provider = main_module.notifier.provider
+    contacts = ["+15550100", "+15550101"]
+
+    with TestClient(main_module.app) as client:
+        response = client.post(
+            "/triage/",
+            data={"latitude": "45.50", "longitude": "-73.56", "emergency_contacts": contacts},
+            files=frames("face_frames", drooped_face, 2),
+        )
+        result = response.json()
+        deadline = time.monotonic() + 5
+        while not main_module.notifier.status(result["dispatch_id"])["complete"] and time.monotonic() < deadline:
+            time.sleep(0.02)
+
+    assert result["stroke_detected"] is True and result["positive_tests"] == 1
+    assert [center["name"] for center in result["nearest_stroke_centers"]] == ["Near Stroke Center"]
+    assert result["total_contacts"] == 2
+    assert "Near Stroke Center (1.4 km, +15145550100)" in result["alert_message"]
+    sent = [message for message in provider.sent if message["body"] == result["alert_message"]]
+    assert sorted(message["to"] for message in sent) == contacts
+
+
+def test_busy_executor_rejects_the_request(main_module, monkeypatch, blank_frame):
+    def busy(*args):
+        raise ExecutorBusy(queue_depth=8, retry_after=2)
+
+    monkeypatch.setattr(main_module.inference_executor, "submit", busy)
+    with TestClient(main_module.app) as client:
+        response = client.post("/triage/", files=frames("face_frames", blank_frame, 2))
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "2"
+    assert response.json()["queue_depth"] == 8
@@ -0,0 +1,162 @@
+# tests/test_uploads.py - Streaming multipart frame uploads: limits, stalls, failures and cache hits
+
+import asyncio
+
+import cv2
+import pytest
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from utils.uploads import UploadError
+
+BOUNDARY = "frame-boundary"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+
+def frame_part(contents, field="frames"):
+    return (
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"{field}\"; filename=\"frame.jpg\"\r\n"
+        f"Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + contents + b"\r\n"
+
+
+def multipart(*parts):
+    return b"".join(parts) + f"--{BOUNDARY}--\r\n".encode()
+
+
+def streamed_request(chunks, pause=0.0):
+    """A request whose body arrives as ``chunks``, ``pause`` seconds apart, without a Content-Length"""
+    pending = list(chunks)
+
+    async def receive():
+        if not pending:
+            return {"type": "http.disconnect"}
+        chunk = pending.pop(0)
+        if chunk is not chunks[0]:
+            await asyncio.sleep(pause)
+        return {"type": "http.request", "body": chunk, "more_body": bool(pending)}
+
+    scope = {
+        "type": "http", "method": "POST", "path": "/analyze-face/", "query_string": b"",
+        "headers": [(b"content-type", CONTENT_TYPE.encode())],
+    }
+    return Request(scope, receive)
+
+
+@pytest.fixture
+def face_jpeg(sample_image):
+    ok, encoded = cv2.imencode(".jpg", cv2.imread(sample_image("normal_face.png")))
+    return encoded.tobytes()
+
+
+@pytest.fixture
+def frames_taken(main_module, monkeypatch):
+    """Replaces the scorer with one that only counts the frames it takes"""
+    taken = []
+
+    def count(test, frames, early_stop=False, tier=None):
+        for contents in frames:
+            taken.append(contents)
+        return None
+
+    monkeypatch.setattr(main_module, "score_uploaded_frames", count)
+    return taken
+
+
+def post_frames(main_module, body, content_type=CONTENT_TYPE):
+    with TestClient(main_module.app) as client:
+        return client.post("/analyze-face/", content=body, headers={"Content-Type": content_type})
+
+
+def test_oversized_part_is_rejected(main_module, monkeypatch, frames_taken):
+    monkeypatch.setattr(main_module, "MAX_FRAME_BYTES", 1000)
+    response = post_frames(main_module, multipart(frame_part(bytes(500)), frame_part(bytes(1001))))
+    assert response.status_code == 413
+    assert response.json()["error"] == "Part 2 of 'frames' exceeds 1000 bytes"
+
+
+def test_too_many_parts_are_rejected(main_module, monkeypatch, frames_taken):
+    monkeypatch.setattr(main_module, "MAX_UPLOAD_FRAMES", 2)
+    response = post_frames(main_module, multipart(*[frame_part(bytes(10))] * 3))
+    assert response.status_code == 413
+    assert "limit 2" in response.json()["error"]
+
+
+def test_oversized_body_is_rejected(main_module, monkeypatch, frames_taken):
+    monkeypatch.setattr(main_module, "MAX_UPLOAD_BYTES", 2000)
+    # Refused from Content-Length, before any of the body is read
+    response = post_frames(main_module, multipart(*[frame_part(bytes(800))] * 3))
+    assert response.status_code == 413
+    assert frames_taken == []
+
+    # Without a Content-Length, once the streamed body grows past the limit
+    body = multipart(*[frame_part(bytes(800))] * 3)
+    request = streamed_request([body[i:i + 500] for i in range(0, len(body), 500)])
+    with pytest.raises(UploadError) as error:
+        asyncio.run(main_module.analyze_uploaded_frames("face", request, False))
+    assert error.value.status_code == 413
+    assert len(frames_taken) <= 2
+
+
+@pytest.mark.parametrize("content_type, body", [
+    (CONTENT_TYPE, b"not a multipart body"),
+    ("application/octet-stream", multipart(frame_part(bytes(10)))),
+    (CONTENT_TYPE, multipart()),
+])
+def test_malformed_body_is_rejected(main_module, frames_taken, content_type, body):
+    response = post_frames(main_module, body, content_type)
+    assert response.status_code == 400
+    assert "error" in response.json()
+
+
+def test_stalled_upload_times_out(main_module, monkeypatch, frames_taken):
+    monkeypatch.setattr(main_module, "UPLOAD_PART_TIMEOUT", 0.2)
+    body = multipart(frame_part(b"first"), frame_part(b"second"))
+    # The first part is complete once the boundary after it has arrived
+    split = len(frame_part(b"first")) + len(f"--{BOUNDARY}\r\n")
+    request = streamed_request([body[:split], body[split:]], pause=2.0)
+
+    async def run():
+        return await asyncio.wait_for(main_module.analyze_uploaded_frames("face", request, False), 1.5)
+
+    with pytest.raises(UploadError) as error:
+        asyncio.run(run())
+    assert error.value.status_code == 408
+    assert frames_taken == [b"first"]
+
+
+def test_worker_failure_does_not_block_the_sender(main_module, monkeypatch):
+    def fail_after_one(test, frames, early_stop=False, tier=None):
+        next(iter(frames))
+        raise RuntimeError("model crashed")
+
+    monkeypatch.setattr(main_module, "score_uploaded_frames", fail_after_one)
+    monkeypatch.setattr(main_module, "UPLOAD_MAX_INFLIGHT", 2)
+    # Far more frames than the channel holds, none of them read after the failure
+    body = multipart(*[frame_part(bytes(100))] * 50)
+    request = streamed_request([body[i:i + 200] for i in range(0, len(body), 200)])
+
+    async def run():
+        return await asyncio.wait_for(main_module.analyze_uploaded_frames("face", request, False), 10)
+
+    with pytest.raises(RuntimeError, match="model crashed"):
+        asyncio.run(run())
+
+
+def test_repeated_upload_abandons_its_job(main_module, monkeypatch, face_jpeg):
+    abandoned = []
+    abandon = main_module.abandon_job
+
+    def spy(channel, job):
+        abandoned.append(job)
+        abandon(channel, job)
+
+    monkeypatch.setattr(main_module, "abandon_job", spy)
+    main_module.request_cache.clear()
+    body = multipart(*[frame_part(face_jpeg)] * 3)
+    first = post_frames(main_module, body).json()
+    assert abandoned == [] and first["cached"] is False
+
+    repeat = post_frames(main_module, body).json()
+    assert len(abandoned) == 1
+    assert repeat["cached"] is True and repeat["avg_symmetry"] == first["avg_symmetry"]
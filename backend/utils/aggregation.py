@@ -0,0 +1,337 @@
+# utils/aggregation.py - Incremental aggregation of per-frame symmetry scores
+
+import math
+from collections import deque
+from statistics import NormalDist
+
+import numpy as np
+
+
+class ScoreAggregator:
+    """Streaming summary of per-frame scores with push-one-frame and finalize usage.
+
+    Keeps, with O(1) work per frame:
+    - the centred rolling median used for temporal smoothing (window of 5,
+      applied once more than ``smoothing_min_frames`` frames arrived),
+    - running mean and variance (Welford),
+    - the data needed for a trimmed mean/std and the median.
+
+    Trimmed statistics and the median are exact for up to ``exact_limit``
+    frames, using selection (np.partition) rather than a full sort. Past that
+    the raw values are folded into a fixed histogram over [0, 1], so memory per
+    session stays constant and those statistics become accurate to one bin.
+    """
+
+    def __init__(self, window=5, smoothing_min_frames=5, trim_fraction=0.1,
+                 trim_min_frames=10, exact_limit=4096, bins=4096, history=None):
+        self.window = window
+        self.half_window = window // 2
+        self.smoothing_min_frames = smoothing_min_frames
+        self.trim_fraction = trim_fraction
+        self.trim_min_frames = trim_min_frames
+        self.exact_limit = exact_limit
+        self.bins = bins
+
+        # Callers may pass their own deque (e.g. SymmetryAnalyzer.face_history) to hold the rolling window
+        self.history = history if history is not None else deque(maxlen=window)
+        self.count = 0
+        self.raw_sum = 0.0
+        self.smoothed_sum = 0.0
+        self._mean = 0.0
+        self._m2 = 0.0
+
+        self._values = np.empty(min(exact_limit, 64), dtype=np.float64)
+        self._hist_count = None
+        self._hist_sum = None
+        self._hist_sumsq = None
+
+    def push(self, score):
+        """Add one frame score"""
+        score = float(score)
+        self.history.append(score)
+        self.count += 1
+        self.raw_sum += score
+
+        delta = score - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (score - self._mean)
+
+        # Once frame i + half_window has arrived the smoothed value for frame i is final
+        if self.count > self.half_window:
+            recent = list(self.history)[-min(self.window, self.count):]
+            self.smoothed_sum += float(np.median(recent))
+
+        self._store(score)
+
+    def extend(self, scores):
+        """Add many frame scores; same result as pushing them one by one, but vectorized"""
+        scores = np.asarray(scores, dtype=np.float64).ravel()
+        # The first frames use partial windows, so they take the one-by-one path
+        lead = min(len(scores), max(0, self.window - 1 - self.count))
+        for score in scores[:lead].tolist():
+            self.push(score)
+        scores = scores[lead:]
+        if len(scores) == 0:
+            return
+
+        # Every remaining push closes a full window: the previous window - 1 values plus itself
+        previous = list(self.history)[-(self.window - 1):] if self.window > 1 else []
+        windows = np.lib.stride_tricks.sliding_window_view(
+            np.concatenate([previous, scores]), self.window
+        )
+        medians = np.median(windows, axis=1)
+
+        # Running sums stay sequential Python adds so totals match push() exactly
+        for score, median in zip(scores.tolist(), medians.tolist()):
+            self.count += 1
+            self.raw_sum += score
+            delta = score - self._mean
+            self._mean += delta / self.count
+            self._m2 += delta * (score - self._mean)
+            self.smoothed_sum += median
+        self.history.extend(scores.tolist())
+        self._store_many(scores)
+
+    def _store_many(self, scores):
+        # self.count already includes ``scores``
+        start = self.count - len(scores)
+        if self._hist_count is None:
+            exact = max(0, min(len(scores), self.exact_limit - start))
+            if exact:
+                end = start + exact
+                if end > len(self._values):
+                    grown = np.empty(min(self.exact_limit, max(end, len(self._values) * 2)), dtype=np.float64)
+                    grown[:start] = self._values[:start]
+                    self._values = grown
+                self._values[start:end] = scores[:exact]
+            if exact == len(scores):
+                return
+            self._fold_into_histogram(self._values[:self.exact_limit])
+            self._values = None
+            scores = scores[exact:]
+        self._fold_into_histogram(scores)
+
+    def _store(self, score):
+        if self._hist_count is None:
+            index = self.count - 1
+            if index < self.exact_limit:
+                if index >= len(self._values):
+                    grown = np.empty(min(self.exact_limit, len(self._values) * 2), dtype=np.float64)
+                    grown[:index] = self._values[:index]
+                    self._values = grown
+                self._values[index] = score
+                return
+            self._fold_into_histogram(self._values)
+            self._values = None
+        self._fold_into_histogram(np.array([score]))
+
+    def _fold_into_histogram(self, values):
+        if self._hist_count is None:
+            self._hist_count = np.zeros(self.bins, dtype=np.int64)
+            self._hist_sum = np.zeros(self.bins, dtype=np.float64)
+            self._hist_sumsq = np.zeros(self.bins, dtype=np.float64)
+        index = np.clip((values * self.bins).astype(np.int64), 0, self.bins - 1)
+        np.add.at(self._hist_count, index, 1)
+        np.add.at(self._hist_sum, index, values)
+        np.add.at(self._hist_sumsq, index, values * values)
+
+    def _smoothed_mean(self):
+        if self.count <= self.smoothing_min_frames:
+            return self.raw_sum / self.count
+
+        # The last frames never saw their full look-ahead, so close them off here
+        recent = list(self.history)[-(self.window - 1):]
+        smoothed_sum = self.smoothed_sum
+        for missing in range(self.half_window, 0, -1):
+            tail = recent[-(self.half_window + missing):]
+            smoothed_sum += float(np.median(tail))
+        return smoothed_sum / self.count
+
+    def _exact_trimmed(self, trim):
+        values = self._values[:self.count]
+        lo, hi = trim, self.count - trim
+        middle = values
+        if trim > 0:
+            middle = np.partition(values, (lo, hi - 1))[lo:hi]
+        return float(np.mean(middle)), float(np.std(middle)), float(np.median(values))
+
+    def _histogram_trimmed(self, trim):
+        counts = self._hist_count.astype(np.float64)
+        sums = self._hist_sum.copy()
+        sumsq = self._hist_sumsq.copy()
+
+        # Remove ``trim`` values from each end, taking a partial bin at its average value
+        for order in (slice(None), slice(None, None, -1)):
+            remaining = trim
+            for i in np.nonzero(counts)[0][order]:
+                take = min(remaining, counts[i])
+                if take:
+                    share = take / counts[i]
+                    sums[i] -= sums[i] * share
+                    sumsq[i] -= sumsq[i] * share
+                    counts[i] -= take
+                    remaining -= take
+                if remaining == 0:
+                    break
+
+        kept = counts.sum()
+        mean = sums.sum() / kept
+        variance = max(0.0, sumsq.sum() / kept - mean * mean)
+
+        cumulative = np.cumsum(self._hist_count)
+        median_bin = int(np.searchsorted(cumulative, (self.count + 1) / 2))
+        median = self._hist_sum[median_bin] / max(1, self._hist_count[median_bin])
+        return float(mean), float(np.sqrt(variance)), float(median)
+
+    def finalize(self):
+        """Summary over every frame pushed so far, or None if there were none"""
+        if self.count == 0:
+            return None
+
+        trim = 0
+        if self.count > self.trim_min_frames:
+            # Guard against n * 0.1 landing just under an integer
+            trim = int(self.count * self.trim_fraction + 1e-9)
+
+        if self._hist_count is None:
+            trimmed_mean, trimmed_std, median = self._exact_trimmed(trim)
+        else:
+            trimmed_mean, trimmed_std, median = self._histogram_trimmed(trim)
+
+        return {
+            "count": self.count,
+            "mean": self.raw_sum / self.count,
+            "std": float(np.sqrt(self._m2 / self.count)),
+            "smoothed_mean": self._smoothed_mean(),
+            "trimmed_count": self.count - 2 * trim,
+            "trimmed_mean": trimmed_mean,
+            "trimmed_std": trimmed_std,
+            "median": median,
+        }
+
+
+def student_t_quantile(p, dof):
+    """Approximate Student-t quantile (Cornish-Fisher expansion; good to ~1e-3 for dof >= 5)"""
+    z = NormalDist().inv_cdf(p)
+    return (
+        z
+        + (z ** 3 + z) / (4 * dof)
+        + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * dof ** 2)
+        + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * dof ** 3)
+    )
+
+
+def smoothed_scores(scores, window=5):
+    """Centred rolling median of ``scores``, the window truncated at both ends.
+
+    These are the per-frame values ScoreAggregator averages into
+    ``smoothed_mean`` (for more than ``window`` frames).
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    half = window // 2
+    padded = np.concatenate([np.full(half, np.nan), scores, np.full(half, np.nan)])
+    windows = np.lib.stride_tricks.sliding_window_view(padded, window)
+    return np.nanmedian(windows, axis=1)
+
+
+def effective_sample_size(values):
+    """``n`` divided by the integrated autocorrelation time (Geyer's initial positive sequence).
+
+    Neighbouring frame scores, and rolling medians of them even more so, are
+    strongly correlated; treating them as independent overstates how much
+    each frame tells about the mean. Never more than ``n``.
+    """
+    n = len(values)
+    if n < 4 or np.ptp(values) == 0:
+        return float(n)
+    centred = values - values.mean()
+    autocovariance = np.correlate(centred, centred, mode="full")[n - 1:] / n
+    rho = autocovariance / autocovariance[0]
+    # Sum autocorrelations in adjacent pairs while the pair sums stay positive
+    tau = -1.0
+    for lag in range(0, n - 1, 2):
+        pair = rho[lag] + rho[lag + 1]
+        if pair <= 0:
+            break
+        tau += 2 * pair
+    return n / max(tau, 1.0)
+
+
+class SequentialDecision:
+    """Early stopping for a threshold test on the smoothed mean score, checked at fixed looks.
+
+    The verdict compares ``smoothed_mean`` (the mean of the 5-frame rolling
+    median) with ``threshold``, so the interval is built around that same
+    statistic. Its standard error uses the effective sample size of the
+    smoothed series, which accounts for the correlation between frames, and
+    is never taken above one sample per smoothing window.
+
+    The decision is only evaluated once the frame count reaches one of
+    ``looks``. The error budget ``1 - confidence`` is spent across the looks in
+    proportion to the frames each adds (linear alpha spending up to the last
+    look), so repeated checks do not inflate the chance of a wrong early stop.
+    A look also needs at least ``min_dof`` + 1 effective samples. Once the
+    Student-t interval at a look lies entirely on one side of
+    ``threshold``, widened by ``margin``, the verdict is settled.
+
+    With one effective sample per window, a look needs ``window`` *
+    (``min_dof`` + 1) frames: with the defaults, a session can stop after 16
+    frames at the earliest. The few degrees of freedom there give a wide
+    interval, so only clear-cut sessions (such as a 25-frame face test well
+    away from the threshold) settle that early.
+    """
+
+    def __init__(self, threshold, confidence=0.99, looks=(16, 24, 32, 64, 128, 256), margin=0.0,
+                 window=5, min_dof=2):
+        self.threshold = threshold
+        self.confidence = confidence
+        self.looks = sorted({int(look) for look in looks if look > window})
+        if not self.looks:
+            raise ValueError(f"Need at least one look after more than {window} frames")
+        self.margin = margin
+        self.window = window
+        self.min_dof = min_dof
+        self.scores = []
+        self.settled = False
+        self.below_threshold = None
+
+        alpha = 1 - confidence
+        horizon = self.looks[-1]
+        previous = 0
+        self._alpha_at = {}
+        for look in self.looks:
+            self._alpha_at[look] = alpha * (look - previous) / horizon
+            previous = look
+
+    @property
+    def count(self):
+        return len(self.scores)
+
+    def update(self, score):
+        """Add a frame score; returns True once the decision is settled"""
+        if self.settled:
+            return True
+
+        self.scores.append(float(score))
+        alpha = self._alpha_at.get(self.count)
+        if alpha is None:
+            return False
+
+        smoothed = smoothed_scores(self.scores, self.window)
+        # The rolling median alone correlates each value with its window - 1 neighbours
+        n_eff = min(effective_sample_size(smoothed), len(smoothed) / self.window)
+        dof = n_eff - 1
+        if dof < self.min_dof:
+            return False
+        mean = float(smoothed.mean())
+        std_error = float(np.std(smoothed, ddof=1)) / math.sqrt(n_eff)
+        half_width = student_t_quantile(1 - alpha / 2, dof) * std_error
+        if mean + half_width < self.threshold - self.margin:
+            self.settled, self.below_threshold = True, True
+        elif mean - half_width > self.threshold + self.margin:
+            self.settled, self.below_threshold = True, False
+        return self.settled
+
+    @property
+    def frames_used(self):
+        return self.count
@@ -0,0 +1,116 @@
+# utils/cache.py - Content-addressed result cache for upload requests
+
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+NOT_CACHED = object()
+
+
+def content_digest(data):
+    """Fast 128-bit content hash of raw upload bytes"""
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def content_key(*parts):
+    """Cache key over strings, numbers and digests, in order"""
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = repr(part).encode()
+        # Length prefix keeps ("ab", "c") and ("a", "bc") apart
+        h.update(len(part).to_bytes(4, "little"))
+        h.update(part)
+    return h.digest()
+
+
+def estimate_size(value):
+    """Approximate memory held by a cached value, counting array buffers exactly"""
+    if isinstance(value, np.ndarray):
+        return value.nbytes + 112
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """Thread-safe LRU cache bounded by total byte size, with a per-entry TTL.
+
+    ``None`` is a valid cached value (e.g. "no face in this frame"), so
+    ``get`` takes an explicit default for misses. A ``max_bytes`` of 0
+    disables the cache.
+    """
+
+    def __init__(self, max_bytes, ttl=600, name="cache"):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.name = name
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def get(self, key, default=None):
+        if not self.enabled:
+            return default
+        with self._lock:
+            entry = self._entries.get(key, NOT_CACHED)
+            if entry is not NOT_CACHED:
+                value, size, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._remove(key)
+            self.misses += 1
+            return default
+
+    def put(self, key, value, size=None):
+        if not self.enabled:
+            return
+        size = estimate_size(value) if size is None else size
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic() + self.ttl)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,279 @@
+# utils/capture.py - Background camera capture jobs for the live analysis mode
+
+import logging
+import os
+import threading
+import time
+import uuid
+
+from utils.lazy import LazyModule
+
+cv2 = LazyModule("cv2")
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp'}
+
+
+class FileCamera:
+    """Camera stand-in that replays a video file or a directory of images.
+
+    It mimics the parts of cv2.VideoCapture the capture jobs use. Frames are
+    paced at ``fps`` like a real device and the source loops, so tests and
+    demos can run the live mode without hardware.
+    """
+
+    def __init__(self, path, fps=15, loop=True, realtime=True):
+        self.path = path
+        self.fps = fps
+        self.loop = loop
+        self.realtime = realtime
+        self._images = None
+        self._video = None
+        self._index = 0
+        self._next_at = None
+
+        if os.path.isdir(path):
+            self._images = sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+            )
+        else:
+            self._video = cv2.VideoCapture(path)
+
+    def isOpened(self):
+        if self._images is not None:
+            return bool(self._images)
+        return self._video is not None and self._video.isOpened()
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_FPS and value > 0:
+            self.fps = value
+        return True
+
+    def _next_frame(self):
+        if self._images is not None:
+            if self._index >= len(self._images):
+                if not self.loop:
+                    return False, None
+                self._index = 0
+            frame = cv2.imread(self._images[self._index])
+            self._index += 1
+            return frame is not None, frame
+
+        ret, frame = self._video.read()
+        if not ret and self.loop:
+            self._video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self._video.read()
+        return ret, frame
+
+    def read(self):
+        if self.realtime:
+            now = time.monotonic()
+            if self._next_at is not None and now < self._next_at:
+                time.sleep(self._next_at - now)
+            self._next_at = max(now, self._next_at or now) + 1.0 / self.fps
+        return self._next_frame()
+
+    def release(self):
+        if self._video is not None:
+            self._video.release()
+        self._images = []
+
+
+def open_camera(source):
+    """Open a device index ("0"), a video file or an image directory"""
+    if isinstance(source, int) or str(source).isdigit():
+        return cv2.VideoCapture(int(source))
+    return FileCamera(source)
+
+
+class FrameGrabber(threading.Thread):
+    """Owns a camera in a dedicated thread and keeps only its newest frame.
+
+    Reading continuously keeps the driver buffer drained, so consumers always
+    see a current frame instead of one that queued up while they were busy.
+    """
+
+    def __init__(self, camera):
+        super().__init__(daemon=True, name="capture-grabber")
+        self.camera = camera
+        self.frame = None
+        self.sequence = 0
+        self.failed = False
+        self._stopped = False
+        self._cond = threading.Condition()
+
+    def run(self):
+        try:
+            while not self._stopped:
+                ret, frame = self.camera.read()
+                if not ret:
+                    self.failed = True
+                    break
+                with self._cond:
+                    self.frame = frame
+                    self.sequence += 1
+                    self._cond.notify_all()
+        finally:
+            with self._cond:
+                self._cond.notify_all()
+
+    def latest(self, after, timeout=1.0):
+        """Wait for a frame newer than sequence ``after``; returns ``(sequence, frame)``"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.sequence > after or self.failed or self._stopped, timeout)
+            if self.sequence > after:
+                return self.sequence, self.frame
+            return after, None
+
+    def stop(self):
+        self._stopped = True
+        self.join(timeout=2.0)
+        self.camera.release()
+
+
+class CameraBusy(Exception):
+    """Raised when another capture job already owns the camera"""
+
+
+class CaptureJob:
+    """One timed capture: warm up the camera, wait for the subject to settle, then score frames"""
+
+    def __init__(self, test, source, fps=15, duration=5, settle=1.0, warmup_frames=10):
+        self.id = uuid.uuid4().hex
+        self.test = test
+        self.source = source
+        self.fps = fps
+        self.duration = duration
+        self.settle = settle
+        self.warmup_frames = warmup_frames
+
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.frames_scored = 0
+        self.frames_dropped = 0
+        self.created_at = time.time()
+        self.finished_at = None
+        self._cancelled = False
+
+    def capture(self, score_frame):
+        """Run the capture loop, calling ``score_frame(bgr_frame)`` at most ``fps`` times a second"""
+        camera = open_camera(self.source)
+        if not camera.isOpened():
+            raise RuntimeError("Could not open camera")
+
+        # Optimize camera settings
+        camera.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+        camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+        camera.set(cv2.CAP_PROP_FPS, self.fps)
+
+        grabber = FrameGrabber(camera)
+        grabber.start()
+        self.status = "running"
+        try:
+            # Skip the first frames for camera stabilization
+            sequence = 0
+            while sequence < self.warmup_frames and not grabber.failed:
+                sequence, _ = grabber.latest(sequence)
+
+            interval = 1.0 / self.fps
+            start = time.monotonic()
+            next_due = start
+            while not self._cancelled:
+                elapsed = time.monotonic() - start
+                if elapsed > self.duration:
+                    break
+
+                newest, frame = grabber.latest(sequence)
+                if frame is None:
+                    if grabber.failed:
+                        break
+                    continue
+                self.frames_dropped += max(0, newest - sequence - 1)
+                sequence = newest
+
+                # Only analyze frames once the subject had time to get into position
+                if elapsed >= self.settle:
+                    score_frame(frame)
+                    self.frames_scored += 1
+
+                next_due += interval
+                delay = next_due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_due = time.monotonic()
+        finally:
+            grabber.stop()
+
+    def cancel(self):
+        self._cancelled = True
+
+    @property
+    def finished(self):
+        return self.status in ("completed", "failed")
+
+    def snapshot(self):
+        data = {
+            "job_id": self.id,
+            "test": self.test,
+            "status": self.status,
+            "frames_scored": self.frames_scored,
+            "frames_dropped": self.frames_dropped,
+            "created_at": self.created_at,
+        }
+        if self.finished_at is not None:
+            data["finished_at"] = self.finished_at
+        if self.result is not None:
+            data["result"] = self.result
+        if self.error is not None:
+            data["error"] = self.error
+        return data
+
+
+class CaptureJobManager:
+    """Tracks capture jobs by id and gives each camera source to one job at a time"""
+
+    def __init__(self, ttl=600):
+        self.ttl = ttl
+        self._jobs = {}
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def create(self, test, source, **options):
+        self.prune()
+        with self._lock:
+            if source in self._active:
+                raise CameraBusy(f"Camera {source} is in use by job {self._active[source]}")
+            job = CaptureJob(test, source, **options)
+            self._jobs[job.id] = job
+            self._active[source] = job.id
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def finish(self, job, result=None, error=None):
+        with self._lock:
+            job.result = result
+            job.error = error
+            job.status = "failed" if error is not None else "completed"
+            job.finished_at = time.time()
+            if self._active.get(job.source) == job.id:
+                del self._active[job.source]
+
+    def discard(self, job):
+        with self._lock:
+            self._jobs.pop(job.id, None)
+            if self._active.get(job.source) == job.id:
+                del self._active[job.source]
+
+    def prune(self):
+        """Forget finished jobs older than the TTL"""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            for job_id, job in list(self._jobs.items()):
+                if job.finished and job.finished_at < cutoff:
+                    del self._jobs[job_id]
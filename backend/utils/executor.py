@@ -0,0 +1,169 @@
+# utils/executor.py - Bounded execution layer for blocking analysis work
+
+import asyncio
+import logging
+import math
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from utils.metrics import EXECUTOR_REJECTED, EXECUTOR_RUN_SECONDS, QUEUE_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutorBusy(Exception):
+    """Raised when a job is submitted while the queue is already full"""
+
+    def __init__(self, queue_depth, retry_after):
+        super().__init__(f"Executor queue full ({queue_depth} waiting)")
+        self.queue_depth = queue_depth
+        self.retry_after = retry_after
+
+
+def _timed_call(fn, submitted_at, args):
+    # Module-level so it can be pickled into a process pool; CLOCK_MONOTONIC is system-wide on Linux
+    started_at = time.monotonic()
+    result = fn(*args)
+    return result, started_at - submitted_at, time.monotonic() - started_at
+
+
+class BoundedExecutor:
+    """Thread or process pool with a bounded queue in front of it.
+
+    At most ``workers`` jobs run at once and at most ``max_queue`` more may
+    wait. Anything beyond that is rejected immediately with ExecutorBusy so
+    the caller can answer with 503 instead of letting latency grow.
+
+    Worker processes are spawned, not forked: a fork would copy MediaPipe
+    graphs and threads already started in the parent, which hangs the
+    child. ``initializer(*initargs)`` runs once in each new process.
+    """
+
+    def __init__(self, workers, max_queue, kind="thread", initializer=None, initargs=()):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.kind = kind
+        if kind == "process":
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=initializer,
+                initargs=initargs
+            )
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="analysis")
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_queue)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.total_run = 0.0
+        self.last_wait = 0.0
+        self._listeners = []
+
+    @property
+    def queue_depth(self):
+        return max(0, self.in_flight - self.workers)
+
+    def retry_after(self):
+        """Seconds a rejected client should wait, estimated from recent service times"""
+        with self._lock:
+            avg_run = self.total_run / self.completed if self.completed else 1.0
+        waves = (self.queue_depth + self.workers) / self.workers
+        return max(1, math.ceil(avg_run * waves))
+
+    def add_listener(self, listener):
+        """Call ``listener(queue_wait_seconds, run_seconds)`` after every completed job"""
+        self._listeners.append(listener)
+
+    def submit(self, fn, *args):
+        """Admit ``fn(*args)`` or raise ExecutorBusy immediately.
+
+        Returns an asyncio future resolving to ``(result, queue_wait_seconds)``.
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            EXECUTOR_REJECTED.inc()
+            raise ExecutorBusy(self.queue_depth, self.retry_after())
+
+        with self._lock:
+            self.in_flight += 1
+        loop = asyncio.get_running_loop()
+        try:
+            job = self._pool.submit(_timed_call, fn, time.monotonic(), args)
+        except Exception:
+            self._finish(None)
+            raise
+        # Settled as soon as the job ends, not on the event loop: a job whose caller's loop
+        # stopped first (an abandoned upload at shutdown) still gives its slot back
+        job.add_done_callback(self._finish)
+        inner = asyncio.wrap_future(job, loop=loop)
+
+        outer = loop.create_future()
+
+        def done(future):
+            if outer.cancelled():
+                return
+            if future.cancelled():
+                outer.cancel()
+            elif future.exception() is not None:
+                outer.set_exception(future.exception())
+            else:
+                result, wait, _ = future.result()
+                outer.set_result((result, wait))
+
+        inner.add_done_callback(done)
+        return outer
+
+    def start_workers(self, fn, *args):
+        """Run ``fn(*args)`` once per worker slot, bypassing admission control and the statistics.
+
+        Called at startup so every worker process (and its initializer) is
+        started before the first request instead of on it. Returns an asyncio
+        future resolving to the list of results.
+        """
+        loop = asyncio.get_running_loop()
+        return asyncio.gather(*(loop.run_in_executor(self._pool, fn, *args) for _ in range(self.workers)))
+
+    async def run(self, fn, *args):
+        """Run ``fn(*args)`` on the pool and return ``(result, queue_wait_seconds)``"""
+        return await self.submit(fn, *args)
+
+    def _finish(self, future):
+        succeeded = future is not None and not future.cancelled() and future.exception() is None
+        with self._lock:
+            self.in_flight -= 1
+            if succeeded:
+                _, wait, run_time = future.result()
+                self.completed += 1
+                self.total_wait += wait
+                self.total_run += run_time
+                self.last_wait = wait
+                QUEUE_WAIT_SECONDS.observe(wait)
+                EXECUTOR_RUN_SECONDS.observe(run_time)
+        self._slots.release()
+        if succeeded:
+            for listener in self._listeners:
+                listener(wait, run_time)
+
+    def stats(self):
+        with self._lock:
+            avg_wait = self.total_wait / self.completed if self.completed else 0.0
+            return {
+                "kind": self.kind,
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": self.in_flight,
+                "queue_depth": max(0, self.in_flight - self.workers),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_queue_wait_ms": avg_wait * 1000,
+                "last_queue_wait_ms": self.last_wait * 1000,
+            }
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
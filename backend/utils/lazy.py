@@ -0,0 +1,37 @@
+# utils/lazy.py - Deferred imports for heavy optional-at-startup dependencies
+
+import importlib
+import threading
+
+
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access.
+
+    ``cv2 = LazyModule("cv2")`` keeps ``cv2.imdecode(...)`` call sites
+    unchanged while moving the import cost from process start to first use
+    (or to an explicit ``load()`` during warm-up).
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Import the module now and return it"""
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
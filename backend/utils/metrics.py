@@ -0,0 +1,232 @@
+# utils/metrics.py - Lightweight Prometheus metrics for the analysis hot paths
+
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; spans sub-millisecond scoring up to multi-second uploads
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._unlabelled = self._child(())
+
+    def labels(self, *values):
+        """Child for one combination of label values; look it up once and keep it on hot paths"""
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._child(values)
+        return child
+
+    def _child(self, values):
+        with self._lock:
+            return self._children.setdefault(values, self._new_child())
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(child.samples(self.name, self.labelnames, values))
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self, name, labelnames, values):
+        return [f"{name}{_label_text(labelnames, values)} {_format_value(self.value)}"]
+
+
+class Counter(_Metric):
+    """Monotonic count, e.g. frames received"""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._unlabelled.inc(amount)
+
+
+class _GaugeChild:
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, function):
+        """Read the value from ``function()`` at scrape time instead of storing it"""
+        self.function = function
+
+    def samples(self, name, labelnames, values):
+        value = self.function() if self.function is not None else self.value
+        return [f"{name}{_label_text(labelnames, values)} {_format_value(value)}"]
+
+
+class Gauge(_Metric):
+    """Point-in-time value such as queue depth"""
+
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._unlabelled.set(value)
+
+    def set_function(self, function):
+        self._unlabelled.set_function(function)
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self, name, labelnames, values):
+        with self._lock:
+            counts = list(self.counts)
+            total = self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            labels = _label_text(labelnames, values, [("le", _format_value(bound))])
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+        labels = _label_text(labelnames, values)
+        lines.append(f"{name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{name}_count{labels} {cumulative}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Distribution of durations in fixed cumulative buckets"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._unlabelled.observe(value)
+
+    def time(self):
+        return self._unlabelled.time()
+
+
+class MetricsRegistry:
+    """Holds every metric and renders them in the Prometheus text format"""
+
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_LATENCY = REGISTRY.histogram(
+    "stroke_http_request_duration_seconds", "HTTP request latency", ("method", "route", "status")
+)
+DECODE_SECONDS = REGISTRY.histogram("stroke_decode_seconds", "JPEG decode time per frame")
+INFERENCE_SECONDS = REGISTRY.histogram("stroke_inference_seconds", "FaceMesh/Pose inference time per call", ("test",))
+SCORING_SECONDS = REGISTRY.histogram("stroke_scoring_seconds", "Symmetry scoring time per call", ("test",))
+QUEUE_WAIT_SECONDS = REGISTRY.histogram("stroke_executor_queue_wait_seconds", "Time a job waited for an executor worker")
+EXECUTOR_RUN_SECONDS = REGISTRY.histogram("stroke_executor_run_seconds", "Time a job ran on an executor worker")
+EXECUTOR_IN_FLIGHT = REGISTRY.gauge("stroke_executor_in_flight", "Jobs running or waiting on the executor")
+EXECUTOR_REJECTED = REGISTRY.counter("stroke_executor_rejected_total", "Jobs rejected because the queue was full")
+FRAMES_RECEIVED = REGISTRY.counter("stroke_frames_received_total", "Frames received for analysis", ("test",))
+FRAMES_NO_DETECTION = REGISTRY.counter(
+    "stroke_frames_no_detection_total", "Frames in which no face or pose was detected", ("test",)
+)
+FRAMES_LOW_VISIBILITY = REGISTRY.counter(
+    "stroke_frames_low_visibility_total", "Pose frames rejected because a key landmark was not visible"
+)
+SMS_SENDS = REGISTRY.counter("stroke_sms_sends_total", "SMS delivery attempts by outcome", ("provider", "outcome"))
+QUALITY_TIER = REGISTRY.gauge("stroke_quality_tier", "Index of the model quality tier in use (0 is the best)")
+QUALITY_TIER_CHANGES = REGISTRY.counter("stroke_quality_tier_changes_total", "Quality tier switches", ("direction",))
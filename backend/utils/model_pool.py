@@ -0,0 +1,118 @@
+# utils/model_pool.py - Bounded pools of MediaPipe model instances
+
+import logging
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class ModelPool:
+    """Bounded pool of model instances with checkout/return semantics.
+
+    Instances are created lazily up to ``size``. A checked-out instance is
+    owned by a single caller for the whole frame sequence and is reset before
+    it goes back to the pool, so tracking state never leaks between requests.
+    """
+
+    def __init__(self, factory, size=None, name="model"):
+        self.factory = factory
+        self.size = max(1, size or os.cpu_count() or 1)
+        self.name = name
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    @property
+    def created(self):
+        return self._created
+
+    @property
+    def available(self):
+        return self._idle.qsize() + (self.size - self._created)
+
+    def _create(self):
+        with self._lock:
+            if self._created >= self.size:
+                return None
+            self._created += 1
+        try:
+            logger.info(f"Creating {self.name} instance {self._created}/{self.size}")
+            return self.factory()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def _discard(self, model):
+        with self._lock:
+            self._created -= 1
+        try:
+            model.close()
+        except Exception as e:
+            logger.warning(f"Error closing {self.name} instance: {e}")
+
+    def acquire(self, timeout=None):
+        """Take an instance, creating one if the pool is not yet full"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        model = self._create()
+        if model is not None:
+            return model
+
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No {self.name} instance available after {timeout}s")
+
+    def warm_up(self, run=None):
+        """Create every instance not yet built and pass each through ``run`` (e.g. a dummy inference).
+
+        Returns the number of instances created.
+        """
+        models = []
+        try:
+            while True:
+                model = self._create()
+                if model is None:
+                    break
+                models.append(model)
+            if run is not None:
+                for model in models:
+                    run(model)
+        finally:
+            for model in models:
+                self.release(model)
+        return len(models)
+
+    def release(self, model):
+        """Return an instance to the pool after clearing its tracking state"""
+        try:
+            model.reset()
+        except Exception as e:
+            logger.warning(f"Discarding {self.name} instance that failed to reset: {e}")
+            self._discard(model)
+            return
+        self._idle.put(model)
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        model = self.acquire(timeout)
+        try:
+            yield model
+        finally:
+            self.release(model)
+
+    def close(self):
+        """Close every idle instance"""
+        while True:
+            try:
+                model = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(model)
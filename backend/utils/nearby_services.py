@@ -0,0 +1,337 @@
+# utils/nearby_services.py - Offline nearest stroke-center lookup over a memory-mapped KD-tree
+"""Nearest stroke centers without calling a maps API.
+
+Facilities are read once from a CSV (or Parquet, with pyarrow) file and
+written as an index directory of .npy arrays that ``StrokeCenterIndex.load``
+memory-maps, so loading costs milliseconds whatever the dataset size:
+
+    python -m utils.nearby_services build facilities.csv data/stroke_centers
+
+The CSV needs ``name``, ``latitude`` and ``longitude`` columns (``lat``,
+``lon``/``lng`` also work); ``address``, ``phone`` and ``certification``
+are kept when present.
+"""
+
+import argparse
+import csv
+import heapq
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+INDEX_VERSION = 1
+METADATA_FIELDS = ("name", "address", "phone", "certification")
+COLUMN_ALIASES = {
+    "latitude": ("latitude", "lat"),
+    "longitude": ("longitude", "lon", "lng", "long"),
+}
+# KD-tree node columns in nodes.npy; leaves have left == -1
+DIM, LEFT, RIGHT, START, END = range(5)
+
+
+def to_unit_vectors(lat, lon):
+    """Latitude/longitude in degrees to points on the unit sphere, shape (..., 3)"""
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def chord_to_km(chord):
+    """Straight-line distance between unit vectors to great-circle (haversine) distance"""
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(np.asarray(chord) / 2, 1.0))
+
+
+def km_to_chord(km):
+    return 2 * math.sin(min(km / EARTH_RADIUS_KM, math.pi) / 2)
+
+
+def _column(columns, canonical):
+    for alias in COLUMN_ALIASES.get(canonical, (canonical,)):
+        if alias in columns:
+            return alias
+    return None
+
+
+def read_facilities(path):
+    """Columns of a CSV or Parquet facility file as a dict of lists, rows without coordinates dropped"""
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Reading Parquet needs pyarrow; install it or convert the file to CSV")
+        table = pq.read_table(path).to_pydict()
+        rows = [dict(zip(table, values)) for values in zip(*table.values())]
+    else:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            rows = list(csv.DictReader(f))
+    if not rows:
+        raise ValueError(f"No facilities in {path}")
+
+    columns = {key.strip().lower(): key for key in rows[0]}
+    source = {}
+    for canonical in ("latitude", "longitude") + METADATA_FIELDS:
+        alias = _column(columns, canonical)
+        source[canonical] = columns[alias] if alias else None
+    if source["name"] is None or source["latitude"] is None or source["longitude"] is None:
+        raise ValueError(f"{path} needs name, latitude and longitude columns")
+
+    facilities = {field: [] for field in ("latitude", "longitude") + METADATA_FIELDS}
+    skipped = 0
+    for row in rows:
+        try:
+            lat = float(row[source["latitude"]])
+            lon = float(row[source["longitude"]])
+        except (TypeError, ValueError):
+            skipped += 1
+            continue
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            skipped += 1
+            continue
+        facilities["latitude"].append(lat)
+        facilities["longitude"].append(lon)
+        for field in METADATA_FIELDS:
+            value = row.get(source[field]) if source[field] else None
+            facilities[field].append("" if value is None else str(value).strip())
+    if not facilities["latitude"]:
+        raise ValueError(f"No facility in {path} has valid coordinates ({skipped} rows skipped)")
+    facilities["skipped"] = skipped
+    return facilities
+
+
+def build_kdtree(points, leaf_size=16):
+    """Static KD-tree over ``points``; returns ``(order, nodes, boxes)``.
+
+    ``order`` permutes the points so every node covers the contiguous slice
+    ``[start, end)``; inner nodes split on the widest dimension at the median.
+    ``boxes`` holds each node's bounding box as ``(min_x, min_y, min_z, max_x,
+    max_y, max_z)``, which bounds the distance to anything below it.
+    """
+    order = np.arange(len(points))
+    nodes = []
+    boxes = []
+    stack = [(None, 0, 0, len(points))]
+    while stack:
+        parent, side, start, end = stack.pop()
+        index = len(nodes)
+        if parent is not None:
+            nodes[parent][side] = index
+        block = points[order[start:end]]
+        low, high = block.min(axis=0), block.max(axis=0)
+        boxes.append(np.concatenate([low, high]))
+        if end - start <= leaf_size:
+            nodes.append([0, -1, -1, start, end])
+            continue
+        dim = int(np.argmax(high - low))
+        mid = (end - start) // 2
+        order[start:end] = order[start:end][np.argpartition(block[:, dim], mid)]
+        nodes.append([dim, -1, -1, start, end])
+        stack.append((index, RIGHT, start + mid, end))
+        stack.append((index, LEFT, start, start + mid))
+    return order, np.array(nodes, dtype=np.int32).reshape(-1, 5), np.array(boxes, dtype=np.float64).reshape(-1, 6)
+
+
+def _save_strings(directory, field, values):
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    np.save(os.path.join(directory, f"meta_{field}.npy"), np.frombuffer(b"".join(encoded), dtype=np.uint8))
+    np.save(os.path.join(directory, f"meta_{field}_offsets.npy"), offsets)
+
+
+def build_index(source_path, directory, leaf_size=16):
+    """Build the index directory from a facility file; returns the manifest"""
+    facilities = read_facilities(source_path)
+    latlon = np.column_stack([facilities["latitude"], facilities["longitude"]])
+    points = to_unit_vectors(latlon[:, 0], latlon[:, 1])
+    order, nodes, boxes = build_kdtree(points, leaf_size)
+
+    # Written into a sibling directory and renamed into place, so a failed build leaves any existing index intact
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=f".{os.path.basename(os.path.abspath(directory))}.", dir=parent)
+    try:
+        os.chmod(tmp, 0o755)
+        np.save(os.path.join(tmp, "points.npy"), points[order])
+        np.save(os.path.join(tmp, "latlon.npy"), latlon[order])
+        np.save(os.path.join(tmp, "nodes.npy"), nodes)
+        np.save(os.path.join(tmp, "boxes.npy"), boxes)
+        for field in METADATA_FIELDS:
+            _save_strings(tmp, field, [facilities[field][i] for i in order])
+
+        manifest = {
+            "version": INDEX_VERSION,
+            "count": int(len(points)),
+            "skipped_rows": facilities["skipped"],
+            "leaf_size": leaf_size,
+            "fields": list(METADATA_FIELDS),
+            "source": os.path.basename(source_path),
+            "built_at": time.time(),
+        }
+        # Written last, so a directory with a manifest is always complete
+        with open(os.path.join(tmp, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        if os.path.exists(directory):
+            # A directory cannot be renamed over a non-empty one: move the old index aside first.
+            # Servers that already mapped its files keep reading them until they reload
+            old = f"{tmp}.old"
+            os.replace(directory, old)
+            os.replace(tmp, directory)
+            shutil.rmtree(old, ignore_errors=True)
+        else:
+            os.replace(tmp, directory)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return manifest
+
+
+class StrokeCenterIndex:
+    """k-nearest facility queries on a memory-mapped KD-tree.
+
+    Points are unit vectors, so the Euclidean (chord) distance ranks
+    facilities exactly like the great-circle distance, which is only
+    computed for the results.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported stroke-center index version {self.manifest.get('version')}")
+
+        def load(name):
+            # Plain ndarray views of the mapping: slicing a np.memmap costs more than the arithmetic
+            return np.asarray(np.load(os.path.join(directory, name), mmap_mode="r"))
+
+        self.points = load("points.npy")
+        self.latlon = load("latlon.npy")
+        self._strings = {
+            field: (load(f"meta_{field}.npy"), load(f"meta_{field}_offsets.npy"))
+            for field in self.manifest["fields"]
+        }
+        # The tree itself is small (two nodes per leaf) and is walked in Python, so keep it as lists
+        self._nodes = load("nodes.npy").tolist()
+        self._boxes = load("boxes.npy").tolist()
+
+    @classmethod
+    def load(cls, directory):
+        return cls(directory)
+
+    def __len__(self):
+        return len(self.points)
+
+    def nearest_ids(self, lat, lon, k=3, max_km=None):
+        """``(ids, distances_km)`` of the ``k`` facilities nearest to a point, closest first"""
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        lat, lon = math.radians(lat), math.radians(lon)
+        q = [math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat)]
+        query = np.array(q)
+        limit = km_to_chord(max_km) ** 2 if max_km is not None else math.inf
+        qx, qy, qz = q
+        # Max-heap of the best k as (-squared chord, id)
+        best = []
+        worst = limit
+        stack = [0]
+        nodes, boxes, points = self._nodes, self._boxes, self.points
+        while stack:
+            node = stack.pop()
+            x0, y0, z0, x1, y1, z1 = boxes[node]
+            dx = x0 - qx if qx < x0 else qx - x1 if qx > x1 else 0.0
+            dy = y0 - qy if qy < y0 else qy - y1 if qy > y1 else 0.0
+            dz = z0 - qz if qz < z0 else qz - z1 if qz > z1 else 0.0
+            if dx * dx + dy * dy + dz * dz >= worst:
+                continue
+            dim, left, right, start, end = nodes[node]
+            if left < 0:
+                d2 = np.square(points[start:end] - query).sum(axis=1)
+                for i in np.flatnonzero(d2 < worst).tolist():
+                    item = (-float(d2[i]), start + i)
+                    if len(best) < k:
+                        heapq.heappush(best, item)
+                    elif item > best[0]:
+                        heapq.heapreplace(best, item)
+                    if len(best) == k:
+                        worst = -best[0][0]
+                continue
+            # Descend first into the child on the query's side of the split
+            if q[dim] < boxes[right][dim]:
+                stack.append(right)
+                stack.append(left)
+            else:
+                stack.append(left)
+                stack.append(right)
+
+        best.sort(reverse=True)
+        ids = np.array([i for _, i in best], dtype=np.int64)
+        return ids, chord_to_km(np.sqrt([-d for d, _ in best]))
+
+    def brute_force_ids(self, lat, lon, k=3):
+        """Reference implementation: haversine distance to every facility"""
+        lat1, lon1 = math.radians(lat), math.radians(lon)
+        lat2 = np.radians(self.latlon[:, 0])
+        lon2 = np.radians(self.latlon[:, 1])
+        a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+        k = min(k, len(distances))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        ids = np.argpartition(distances, k - 1)[:k]
+        ids = ids[np.argsort(distances[ids])]
+        return ids, distances[ids]
+
+    def field(self, name, i):
+        blob, offsets = self._strings[name]
+        return bytes(blob[offsets[i]:offsets[i + 1]]).decode("utf-8")
+
+    def nearest(self, lat, lon, k=3, max_km=None):
+        """The ``k`` nearest facilities as dicts with their metadata and ``distance_km``"""
+        ids, distances = self.nearest_ids(lat, lon, k, max_km)
+        results = []
+        for i, distance in zip(ids.tolist(), distances.tolist()):
+            entry = {field: self.field(field, i) for field in self.manifest["fields"]}
+            entry.update({
+                "latitude": float(self.latlon[i, 0]),
+                "longitude": float(self.latlon[i, 1]),
+                "distance_km": round(distance, 2),
+            })
+            results.append(entry)
+        return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the offline stroke-center index")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="index a CSV or Parquet facility file")
+    build.add_argument("source")
+    build.add_argument("directory")
+    build.add_argument("--leaf-size", type=int, default=16)
+    query = commands.add_parser("query", help="look up the nearest facilities")
+    query.add_argument("directory")
+    query.add_argument("latitude", type=float)
+    query.add_argument("longitude", type=float)
+    query.add_argument("-k", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        manifest = build_index(args.source, args.directory, args.leaf_size)
+        print(f"Indexed {manifest['count']} facilities into {args.directory} "
+              f"({manifest['skipped_rows']} rows without valid coordinates skipped)")
+    else:
+        for entry in StrokeCenterIndex.load(args.directory).nearest(args.latitude, args.longitude, args.k):
+            print(f"{entry['distance_km']:>8.2f} km  {entry['name']}  {entry['phone']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
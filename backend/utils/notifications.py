@@ -0,0 +1,371 @@
+# utils/notifications.py - Outbound emergency notifications with retries and a durable outbox
+
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.metrics import SMS_SENDS
+
+logger = logging.getLogger(__name__)
+
+
+class SmsError(Exception):
+    """A failed send; ``retryable`` is False when repeating the request cannot help (e.g. a bad number)"""
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class TwilioSmsProvider:
+    """Sends SMS through one Twilio client whose HTTP session (and its connections) is reused"""
+
+    name = "twilio"
+
+    def __init__(self, account_sid, auth_token, from_number, timeout=10):
+        # Imported here so servers without Twilio configured never load the SDK
+        from twilio.http.http_client import TwilioHttpClient
+        from twilio.rest import Client
+
+        self.from_number = from_number
+        self.client = Client(
+            account_sid, auth_token,
+            http_client=TwilioHttpClient(pool_connections=True, timeout=timeout)
+        )
+
+    def send(self, to_number, body):
+        from twilio.base.exceptions import TwilioRestException
+
+        try:
+            message = self.client.messages.create(body=body, from_=self.from_number, to=to_number)
+        except TwilioRestException as e:
+            # 4xx other than rate limiting means the request itself is wrong
+            retryable = e.status is None or e.status == 429 or e.status >= 500
+            raise SmsError(f"Twilio error {e.status}: {e.msg}", retryable=retryable) from e
+        except Exception as e:
+            raise SmsError(f"Twilio request failed: {e}") from e
+        return message.sid
+
+
+class FakeSmsProvider:
+    """In-memory SMS provider for tests and local runs.
+
+    Records every delivered message in ``sent``. ``fail_first`` makes the
+    first n attempts to each number fail with a retryable error, numbers in
+    ``reject`` always fail permanently, and ``latency`` simulates the network.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency=0.0, fail_first=0, reject=()):
+        self.latency = latency
+        self.fail_first = fail_first
+        self.reject = set(reject)
+        self.sent = []
+        self.attempts = {}
+        self._lock = threading.Lock()
+
+    def send(self, to_number, body):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            attempt = self.attempts.get(to_number, 0) + 1
+            self.attempts[to_number] = attempt
+            if to_number in self.reject:
+                raise SmsError(f"Invalid number {to_number}", retryable=False)
+            if attempt <= self.fail_first:
+                raise SmsError("Simulated provider outage")
+            sid = f"FAKE{uuid.uuid4().hex[:16]}"
+            self.sent.append({"sid": sid, "to": to_number, "body": body})
+        return sid
+
+
+class Outbox:
+    """SQLite-backed queue of deliveries, so queued alerts survive a restart.
+
+    The database (and its directory) is created on first use, not on
+    construction. A claimed delivery is leased to one sender for ``lease``
+    seconds; if that sender never reports back (e.g. the process died mid-send),
+    the delivery becomes due again once the lease expires, and only the
+    holder of the current lease can record its outcome.
+    """
+
+    def __init__(self, path, lease=60.0):
+        self.path = path
+        self.lease = lease
+        self._db = None
+        self._lock = threading.Lock()
+
+    def open(self):
+        """Create the database if needed; called by every other method"""
+        with self._lock:
+            self._connect()
+
+    def _connect(self):
+        # Caller holds self._lock
+        if self._db is not None:
+            return self._db
+        if self.path != ":memory:":
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS dispatches ("
+            " id TEXT PRIMARY KEY, message TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS deliveries ("
+            " dispatch_id TEXT NOT NULL, contact TEXT NOT NULL,"
+            " status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,"
+            " next_attempt_at REAL NOT NULL, sid TEXT, error TEXT, updated_at REAL NOT NULL,"
+            " claim TEXT, lease_expires_at REAL,"
+            " PRIMARY KEY (dispatch_id, contact))"
+        )
+        # Outboxes written before leases existed
+        columns = {row[1] for row in db.execute("PRAGMA table_info(deliveries)")}
+        for column, kind in (("claim", "TEXT"), ("lease_expires_at", "REAL")):
+            if column not in columns:
+                db.execute(f"ALTER TABLE deliveries ADD COLUMN {column} {kind}")
+        db.execute(
+            "CREATE INDEX IF NOT EXISTS deliveries_due ON deliveries (status, next_attempt_at)"
+        )
+        self._db = db
+        return db
+
+    def add(self, message, contacts):
+        dispatch_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+            db.execute("BEGIN")
+            db.execute(
+                "INSERT INTO dispatches (id, message, created_at) VALUES (?, ?, ?)",
+                (dispatch_id, message, now)
+            )
+            db.executemany(
+                "INSERT OR IGNORE INTO deliveries (dispatch_id, contact, status, next_attempt_at, updated_at)"
+                " VALUES (?, ?, 'pending', ?, ?)",
+                [(dispatch_id, contact, now, now) for contact in contacts]
+            )
+            db.execute("COMMIT")
+        return dispatch_id
+
+    def recover(self):
+        """Requeue deliveries whose sender's lease expired without an outcome; returns how many"""
+        now = time.time()
+        with self._lock:
+            cursor = self._connect().execute(
+                "UPDATE deliveries SET status = 'pending', claim = NULL, lease_expires_at = NULL, updated_at = ?"
+                " WHERE status = 'sending' AND (lease_expires_at IS NULL OR lease_expires_at <= ?)",
+                (now, now)
+            )
+        return cursor.rowcount
+
+    def claim_due(self, limit):
+        """Lease up to ``limit`` due deliveries to the caller.
+
+        Returns ``(dispatch_id, contact, attempts, message, claim)`` rows;
+        ``claim`` must be passed back to ``update``. Deliveries whose previous
+        lease expired are due again.
+        """
+        now = time.time()
+        claim = uuid.uuid4().hex
+        with self._lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            rows = db.execute(
+                "SELECT d.dispatch_id, d.contact, d.attempts, m.message FROM deliveries d"
+                " JOIN dispatches m ON m.id = d.dispatch_id"
+                " WHERE (d.status = 'pending' AND d.next_attempt_at <= ?)"
+                " OR (d.status = 'sending' AND d.lease_expires_at <= ?)"
+                " ORDER BY d.next_attempt_at LIMIT ?",
+                (now, now, limit)
+            ).fetchall()
+            db.executemany(
+                "UPDATE deliveries SET status = 'sending', claim = ?, lease_expires_at = ?, updated_at = ?"
+                " WHERE dispatch_id = ? AND contact = ?",
+                [(claim, now + self.lease, now, row[0], row[1]) for row in rows]
+            )
+            db.execute("COMMIT")
+        return [row + (claim,) for row in rows]
+
+    def next_due_at(self):
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT MIN(CASE status WHEN 'pending' THEN next_attempt_at ELSE lease_expires_at END)"
+                " FROM deliveries WHERE status IN ('pending', 'sending')"
+            ).fetchone()
+        return row[0]
+
+    def update(self, dispatch_id, contact, claim, status, attempts, sid=None, error=None, next_attempt_at=None):
+        """Record the outcome of a claimed delivery; False if ``claim`` no longer holds its lease"""
+        now = time.time()
+        with self._lock:
+            cursor = self._connect().execute(
+                "UPDATE deliveries SET status = ?, attempts = ?, sid = ?, error = ?,"
+                " next_attempt_at = COALESCE(?, next_attempt_at), updated_at = ?,"
+                " claim = NULL, lease_expires_at = NULL"
+                " WHERE dispatch_id = ? AND contact = ? AND claim = ?",
+                (status, attempts, sid, error, next_attempt_at, now, dispatch_id, contact, claim)
+            )
+        return cursor.rowcount == 1
+
+    def status(self, dispatch_id):
+        with self._lock:
+            db = self._connect()
+            dispatch = db.execute(
+                "SELECT created_at FROM dispatches WHERE id = ?", (dispatch_id,)
+            ).fetchone()
+            if dispatch is None:
+                return None
+            rows = db.execute(
+                "SELECT contact, status, attempts, sid, error, updated_at FROM deliveries"
+                " WHERE dispatch_id = ? ORDER BY contact",
+                (dispatch_id,)
+            ).fetchall()
+        deliveries = [
+            {"contact": contact, "status": status, "attempts": attempts, "sid": sid,
+             "error": error, "updated_at": updated_at}
+            for contact, status, attempts, sid, error, updated_at in rows
+        ]
+        return {"created_at": dispatch[0], "deliveries": deliveries}
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+class NotificationDispatcher:
+    """Delivers outbox entries concurrently in the background, retrying with exponential backoff.
+
+    ``dispatch`` only writes to the outbox and returns a dispatch id, so
+    request handlers never wait on the network. A scheduler thread hands due
+    deliveries to a pool of ``concurrency`` sender threads; retryable failures
+    are rescheduled up to ``max_attempts`` times, with jittered backoff between
+    ``backoff_base`` and ``backoff_max`` seconds.
+    """
+
+    def __init__(self, provider, outbox, concurrency=8, max_attempts=4, backoff_base=0.5, backoff_max=30.0):
+        self.provider = provider
+        self.outbox = outbox
+        self.concurrency = max(1, concurrency)
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._pool = None
+        self._thread = None
+        self._wake = threading.Condition()
+        self._in_flight = 0
+        self._stopped = False
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.outbox.open()
+        recovered = self.outbox.recover()
+        if recovered:
+            logger.warning(f"Requeued {recovered} alert deliveries left mid-send by a previous run")
+        self._stopped = False
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="notify")
+        self._thread = threading.Thread(target=self._run, daemon=True, name="notify-scheduler")
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        with self._wake:
+            self._stopped = True
+            self._wake.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def dispatch(self, contacts, message):
+        """Queue ``message`` for every contact and return the dispatch id"""
+        contacts = list(dict.fromkeys(c.strip() for c in contacts if c and c.strip()))
+        dispatch_id = self.outbox.add(message, contacts)
+        with self._wake:
+            self._wake.notify_all()
+        return dispatch_id
+
+    def status(self, dispatch_id):
+        """Per-contact delivery state plus totals, or None for an unknown id"""
+        data = self.outbox.status(dispatch_id)
+        if data is None:
+            return None
+        counts = {"pending": 0, "sending": 0, "sent": 0, "failed": 0}
+        for delivery in data["deliveries"]:
+            counts[delivery["status"]] += 1
+        data.update({
+            "dispatch_id": dispatch_id,
+            "total_contacts": len(data["deliveries"]),
+            "notifications_sent": counts["sent"],
+            "failed_contacts": counts["failed"],
+            "complete": counts["pending"] + counts["sending"] == 0,
+        })
+        return data
+
+    def _run(self):
+        while True:
+            with self._wake:
+                while not self._stopped and self._in_flight >= self.concurrency:
+                    self._wake.wait()
+                if self._stopped:
+                    return
+                free = self.concurrency - self._in_flight
+            rows = self.outbox.claim_due(free)
+            for row in rows:
+                with self._wake:
+                    self._in_flight += 1
+                self._pool.submit(self._deliver, *row)
+
+            if rows:
+                continue
+            next_due = self.outbox.next_due_at()
+            timeout = 1.0 if next_due is None else min(1.0, max(0.0, next_due - time.time()))
+            with self._wake:
+                if not self._stopped:
+                    self._wake.wait(timeout)
+
+    def _backoff(self, attempts):
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+        # Full jitter keeps retries against a recovering provider from arriving in lockstep
+        return random.uniform(delay / 2, delay)
+
+    def _deliver(self, dispatch_id, contact, attempts, message, claim):
+        attempts += 1
+        try:
+            if self.provider is None:
+                raise SmsError("SMS provider not configured", retryable=False)
+            sid = self.provider.send(contact, message)
+        except Exception as e:
+            retryable = getattr(e, "retryable", True)
+            provider = getattr(self.provider, "name", "none")
+            if retryable and attempts < self.max_attempts:
+                SMS_SENDS.labels(provider, "retry").inc()
+                delay = self._backoff(attempts)
+                logger.warning(f"SMS to {contact} failed (attempt {attempts}), retrying in {delay:.1f}s: {e}")
+                self.outbox.update(dispatch_id, contact, claim, "pending", attempts, error=str(e),
+                                   next_attempt_at=time.time() + delay)
+            else:
+                SMS_SENDS.labels(provider, "failed").inc()
+                logger.error(f"Failed to send SMS to {contact} after {attempts} attempt(s): {e}")
+                self.outbox.update(dispatch_id, contact, claim, "failed", attempts, error=str(e))
+        else:
+            SMS_SENDS.labels(self.provider.name, "sent").inc()
+            logger.info(f"Emergency alert sent successfully to {contact}")
+            if not self.outbox.update(dispatch_id, contact, claim, "sent", attempts, sid=sid):
+                logger.warning(f"SMS to {contact} was sent after its lease expired; it may be delivered twice")
+        finally:
+            with self._wake:
+                self._in_flight -= 1
+                self._wake.notify_all()
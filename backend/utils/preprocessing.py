@@ -0,0 +1,290 @@
+# utils/preprocessing.py - Frame decoding shared by the analysis endpoints
+
+import asyncio
+import io
+import logging
+import os
+import queue
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from utils.lazy import LazyModule
+from utils.metrics import DECODE_SECONDS
+
+cv2 = LazyModule("cv2")
+
+logger = logging.getLogger(__name__)
+
+# cv2.imdecode releases the GIL, so a few threads can decode ahead of inference
+DECODE_WORKERS = int(os.getenv('DECODE_WORKERS', min(4, os.cpu_count() or 1)))
+DECODE_LOOKAHEAD = int(os.getenv('DECODE_LOOKAHEAD', DECODE_WORKERS * 2))
+
+_decode_pool = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="decode")
+
+
+# libjpeg can decode straight to 1/2, 1/4 or 1/8 scale, skipping most of the IDCT work
+_REDUCED_MODES = ((8, "IMREAD_REDUCED_COLOR_8"), (4, "IMREAD_REDUCED_COLOR_4"), (2, "IMREAD_REDUCED_COLOR_2"))
+
+# SOF markers carry the frame size; C4 (DHT), C8 (JPG) and CC (DAC) share the range but are not frames
+_JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def jpeg_dimensions(contents):
+    """Read ``(width, height)`` from a JPEG header without decoding, or None if not a JPEG"""
+    data = memoryview(contents)
+    if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:  # standalone markers
+            pos += 2
+            continue
+        length = (data[pos + 2] << 8) | data[pos + 3]
+        if marker in _JPEG_SOF_MARKERS:
+            if pos + 9 > len(data):
+                return None
+            height = (data[pos + 5] << 8) | data[pos + 6]
+            width = (data[pos + 7] << 8) | data[pos + 8]
+            return width, height
+        if marker == 0xDA:  # start of scan without a frame header
+            return None
+        pos += 2 + length
+    return None
+
+
+def reduced_decode_mode(width, height, max_side):
+    """Pick the strongest libjpeg reduction that still leaves at least ``max_side`` pixels"""
+    long_side = max(width, height)
+    for factor, mode in _REDUCED_MODES:
+        if long_side // factor >= max_side:
+            return getattr(cv2, mode)
+    return cv2.IMREAD_COLOR
+
+
+def decode_frame(contents, max_side=None):
+    """Decode JPEG/PNG bytes into a BGR image, or None if the bytes are not an image.
+
+    With ``max_side`` set, JPEGs are decoded at a reduced scale chosen from
+    the header so the long side stays at or just above ``max_side``.
+    """
+    start = time.perf_counter()
+    try:
+        mode = cv2.IMREAD_COLOR
+        if max_side:
+            dims = jpeg_dimensions(contents)
+            if dims is not None:
+                mode = reduced_decode_mode(dims[0], dims[1], max_side)
+        nparr = np.frombuffer(contents, np.uint8)
+        return cv2.imdecode(nparr, mode)
+    except Exception as e:
+        logger.warning(f"Error decoding frame: {e}")
+        return None
+    finally:
+        DECODE_SECONDS.observe(time.perf_counter() - start)
+
+
+class RgbFrameBuffer:
+    """Converts decoded BGR frames to RGB at model input size, reusing the same arrays.
+
+    One buffer belongs to one consumer; the returned array is overwritten by
+    the next call, so it must be fully used (e.g. by ``model.process``) first.
+    """
+
+    def __init__(self, max_side=None):
+        self.max_side = max_side
+        self._scaled = None
+        self._rgb = None
+
+    def _reuse(self, current, shape):
+        if current is None or current.shape != shape:
+            return np.empty(shape, dtype=np.uint8)
+        return current
+
+    def convert(self, image):
+        height, width = image.shape[:2]
+        long_side = max(width, height)
+        if self.max_side and long_side > self.max_side:
+            scale = self.max_side / long_side
+            size = (max(1, round(width * scale)), max(1, round(height * scale)))
+            self._scaled = self._reuse(self._scaled, (size[1], size[0], 3))
+            image = cv2.resize(image, size, dst=self._scaled, interpolation=cv2.INTER_AREA)
+
+        self._rgb = self._reuse(self._rgb, image.shape)
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=self._rgb)
+
+
+def iter_decoded_frames(frame_contents, max_side=None, lookahead=None):
+    """Yield ``(index, image)`` in frame order while later frames decode in the background.
+
+    At most ``lookahead`` frames are decoded ahead of the consumer, which
+    keeps memory bounded no matter how many frames the request carries.
+    ``max_side`` is passed to ``decode_frame`` for reduced-scale decoding.
+    Frames that fail to decode are yielded as None so indices stay aligned.
+    Closing the generator early cancels the decodes that have not started.
+
+    A FrameChannel is never waited on while a decoded frame is ready: only
+    frames that have already arrived are queued for decoding, so each frame
+    is yielded as soon as it is decoded rather than ``lookahead`` frames later.
+    """
+    lookahead = max(1, lookahead or DECODE_LOOKAHEAD)
+    live = isinstance(frame_contents, FrameChannel)
+    source = frame_contents if live else iter(frame_contents)
+    pending = deque()
+    ended = False
+
+    def take(block):
+        if live:
+            return source.take(block)
+        return next(source, FrameChannel.CLOSED)
+
+    def submit_available():
+        nonlocal ended
+        while not ended and len(pending) < lookahead:
+            contents = take(block=not live)
+            if contents is FrameChannel.EMPTY:
+                return
+            if contents is FrameChannel.CLOSED:
+                ended = True
+                return
+            pending.append(_decode_pool.submit(decode_frame, contents, max_side))
+
+    try:
+        index = 0
+        while True:
+            submit_available()
+            if not pending:
+                if ended:
+                    return
+                # Nothing has arrived yet: wait for the next frame
+                contents = take(block=True)
+                if contents is FrameChannel.CLOSED:
+                    return
+                pending.append(_decode_pool.submit(decode_frame, contents, max_side))
+            image = pending.popleft().result()
+            submit_available()
+            yield index, image
+            index += 1
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+class FrameChannel:
+    """Hands frames from the event loop to a worker thread as they arrive.
+
+    ``put`` waits while ``capacity`` frames are queued but not yet taken by
+    the consumer, so a fast sender cannot pile up unbounded memory. The
+    consumer simply iterates the channel, e.g. via ``iter_decoded_frames``.
+    """
+
+    # Returned by ``take`` once the channel is closed, and when nothing is queued without blocking
+    CLOSED = object()
+    EMPTY = object()
+
+    def __init__(self, capacity=4):
+        self._queue = queue.Queue()
+        self._slots = asyncio.Semaphore(max(1, capacity))
+        self._loop = asyncio.get_running_loop()
+        self._aborted = False
+        self._closed = False
+
+    async def put(self, contents):
+        await self._slots.acquire()
+        self._queue.put(contents)
+
+    def close(self):
+        self._queue.put(self.CLOSED)
+
+    def abort(self):
+        """Close the channel and drop the frames the consumer has not taken yet"""
+        self._aborted = True
+        self.close()
+
+    def take(self, block=True):
+        """The next frame, CLOSED once the channel is closed or aborted, or EMPTY if ``block`` is False and none is queued"""
+        if self._closed:
+            return self.CLOSED
+        try:
+            item = self._queue.get(block)
+        except queue.Empty:
+            return self.EMPTY
+        if item is self.CLOSED or self._aborted:
+            self._closed = True
+            return self.CLOSED
+        self._loop.call_soon_threadsafe(self._slots.release)
+        return item
+
+    def __iter__(self):
+        while True:
+            item = self.take()
+            if item is self.CLOSED:
+                return
+            yield item
+
+
+NPY_MAGIC = b"\x93NUMPY"
+NPY_HEADER_LIMIT = 16384
+
+
+def decode_landmark_tensor(body, landmarks, max_frames=None):
+    """Parse packed landmarks into ``(points, visibility)`` without copying the payload.
+
+    ``body`` is either a ``.npy`` file or a raw little-endian float32 buffer,
+    shaped (frames, landmarks, 4) as normalized x, y, z and visibility. A
+    ``.npy`` array may also be (frames, landmarks, 3), in which case every
+    landmark counts as visible. ``points`` and ``visibility`` are views into
+    ``body``. Raises ValueError for anything malformed.
+    """
+    data = memoryview(body)
+    if bytes(data[:len(NPY_MAGIC)]) == NPY_MAGIC:
+        # Only the header goes through a file object; the payload is viewed in place
+        stream = io.BytesIO(bytes(data[:NPY_HEADER_LIMIT]))
+        version = np.lib.format.read_magic(stream)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(stream)
+        elif version in ((2, 0), (3, 0)):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(stream)
+        else:
+            raise ValueError(f"Unsupported .npy version {version}")
+        if fortran_order:
+            raise ValueError(".npy array must be C-ordered")
+        if dtype.kind != "f":
+            raise ValueError(f".npy array must hold floats, got {dtype}")
+        count = int(np.prod(shape))
+        array = np.frombuffer(data, dtype=dtype, count=count, offset=stream.tell()).reshape(shape)
+    else:
+        channels = 4
+        if len(data) % (landmarks * channels * 4):
+            raise ValueError(
+                f"Raw payload of {len(data)} bytes is not a whole number of "
+                f"{landmarks} x {channels} float32 frames"
+            )
+        array = np.frombuffer(data, dtype="<f4").reshape(-1, landmarks, channels)
+
+    if array.ndim != 3 or array.shape[1] != landmarks or array.shape[2] not in (3, 4):
+        raise ValueError(f"Expected shape (frames, {landmarks}, 3 or 4), got {array.shape}")
+    if array.shape[0] == 0:
+        raise ValueError("No frames in payload")
+    if max_frames and array.shape[0] > max_frames:
+        raise ValueError(f"Too many frames ({array.shape[0]} > {max_frames})")
+
+    points = array[..., :3]
+    if not np.isfinite(points).all():
+        raise ValueError("Landmark coordinates must be finite")
+    if array.shape[2] == 4:
+        visibility = array[..., 3]
+        if not np.isfinite(visibility).all():
+            raise ValueError("Landmark visibility must be finite")
+    else:
+        visibility = np.ones(array.shape[:2], dtype=array.dtype)
+    return points, visibility
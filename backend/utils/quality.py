@@ -0,0 +1,196 @@
+# utils/quality.py - Load-adaptive quality tiers for the pooled models
+
+import logging
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from utils.metrics import QUALITY_TIER, QUALITY_TIER_CHANGES
+from utils.model_pool import ModelPool
+
+logger = logging.getLogger(__name__)
+
+
+class QualityTier:
+    """One operating point: FaceMesh refinement, Pose complexity and inference input size"""
+
+    def __init__(self, name, face_refine, pose_complexity, input_size):
+        self.name = name
+        self.face_refine = face_refine
+        self.pose_complexity = pose_complexity
+        self.input_size = input_size
+
+    def describe(self):
+        return {
+            "name": self.name,
+            "face_refine_landmarks": self.face_refine,
+            "pose_model_complexity": self.pose_complexity,
+            "input_size": self.input_size,
+        }
+
+    def __repr__(self):
+        return f"<QualityTier {self.name}>"
+
+
+class TieredModelRegistry:
+    """One ModelPool per model variant, created on first use.
+
+    ``variant(tier)`` names the constructor argument that differs between
+    tiers (e.g. Pose complexity), and ``factory(variant)`` builds a model for
+    it, so tiers sharing a variant share a pool.
+    """
+
+    def __init__(self, factory, variant, pool_size, name="model"):
+        self.factory = factory
+        self.variant = variant
+        self.pool_size = pool_size
+        self.name = name
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def pool(self, tier):
+        key = self.variant(tier)
+        pool = self._pools.get(key)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.get(key)
+                if pool is None:
+                    pool = ModelPool(lambda: self.factory(key), self.pool_size, name=f"{self.name}[{key}]")
+                    self._pools[key] = pool
+        return pool
+
+    def warm_up(self, tiers, run=None):
+        """Warm the pool of every variant used by ``tiers``; returns the number of instances created"""
+        pools = {id(pool): pool for pool in (self.pool(tier) for tier in tiers)}
+        return sum(pool.warm_up(run) for pool in pools.values())
+
+    def close(self):
+        with self._lock:
+            pools = list(self._pools.values())
+        for pool in pools:
+            pool.close()
+
+
+class QualityController:
+    """Steps the quality tier down when queue wait or inference latency breaks its SLO, and back up when load drops.
+
+    ``tiers`` are ordered best first. The p95 of each signal over the last
+    ``window`` seconds is compared with its SLO: if either is above, the
+    next cheaper tier is used; once both are below ``recover_ratio`` of their
+    SLO (or nothing was observed, i.e. the server is idle) the next better
+    tier is restored. Changes are at least ``cooldown`` seconds apart so each
+    step is judged on traffic served at that tier. ``limit_to`` keeps the
+    controller off tiers whose models are not loaded yet; when a step down is
+    blocked by it, ``on_limited(index)`` is called with the tier wanted.
+    """
+
+    def __init__(self, tiers, slo_queue_wait, slo_latency, start=0, best=0, worst=None,
+                 window=10.0, cooldown=5.0, recover_ratio=0.5, min_samples=5, enabled=True, on_limited=None):
+        self.tiers = list(tiers)
+        self.slo_queue_wait = slo_queue_wait
+        self.slo_latency = slo_latency
+        self.best = best
+        self.worst = len(self.tiers) - 1 if worst is None else worst
+        self.window = window
+        self.cooldown = cooldown
+        self.recover_ratio = recover_ratio
+        self.min_samples = min_samples
+        self.enabled = enabled
+        self.on_limited = on_limited
+        self.changes = 0
+        self.available = self.worst
+
+        self._index = min(max(start, self.best), self.worst)
+        self._changed_at = time.monotonic()
+        self._queue_waits = deque(maxlen=4096)
+        self._latencies = deque(maxlen=4096)
+        self._lock = threading.Lock()
+        QUALITY_TIER.set(self._index)
+
+    @property
+    def reachable(self):
+        """Tiers the controller may switch between"""
+        return self.tiers[self.best:self.worst + 1]
+
+    def limit_to(self, index):
+        """Allow tiers up to ``index`` (clamped to the configured range)"""
+        self.available = min(max(index, self.best), self.worst)
+
+    def tier(self, name):
+        for tier in self.tiers:
+            if tier.name == name:
+                return tier
+        raise KeyError(f"Unknown quality tier '{name}'")
+
+    def current(self):
+        """Tier for a new request; re-evaluates the SLOs first so idle recovery needs no observations"""
+        if self.enabled:
+            self._evaluate(time.monotonic())
+        return self.tiers[self._index]
+
+    def observe_queue_wait(self, seconds):
+        self._queue_waits.append((time.monotonic(), seconds))
+
+    def observe_latency(self, seconds):
+        self._latencies.append((time.monotonic(), seconds))
+
+    def _recent(self, samples, since):
+        # Appends come from many threads; iterate over a snapshot
+        return [value for at, value in list(samples) if at >= since]
+
+    def _evaluate(self, now):
+        if now - self._changed_at < self.cooldown:
+            return
+        with self._lock:
+            if now - self._changed_at < self.cooldown:
+                return
+            since = max(now - self.window, self._changed_at)
+            pressure = []
+            for samples, slo in ((self._queue_waits, self.slo_queue_wait), (self._latencies, self.slo_latency)):
+                values = self._recent(samples, since)
+                if 0 < len(values) < self.min_samples:
+                    # Some traffic, too little to judge this tier by: hold
+                    return
+                if values:
+                    pressure.append(float(np.percentile(values, 95)) / slo)
+            if any(ratio > 1 for ratio in pressure):
+                self._step(1, now, max(pressure))
+            elif all(ratio < self.recover_ratio for ratio in pressure):
+                self._step(-1, now, max(pressure, default=0.0))
+
+    def _step(self, direction, now, ratio):
+        wanted = min(max(self._index + direction, self.best), self.worst)
+        index = min(wanted, self.available)
+        if index < wanted and self.on_limited is not None:
+            self.on_limited(wanted)
+        if index == self._index:
+            return
+        old = self.tiers[self._index].name
+        self._index = index
+        self._changed_at = now
+        self.changes += 1
+        QUALITY_TIER.set(index)
+        QUALITY_TIER_CHANGES.labels("down" if direction > 0 else "up").inc()
+        logger.warning(
+            f"Quality tier {old} -> {self.tiers[index].name} (p95 at {ratio:.0%} of SLO)"
+        )
+
+    def stats(self):
+        now = time.monotonic()
+        since = now - self.window
+        queue_waits = self._recent(self._queue_waits, since)
+        latencies = self._recent(self._latencies, since)
+        return {
+            "enabled": self.enabled,
+            "tier": self.tiers[self._index].describe(),
+            "tiers": [tier.name for tier in self.reachable],
+            "available_tiers": [tier.name for tier in self.tiers[self.best:self.available + 1]],
+            "changes": self.changes,
+            "seconds_since_change": now - self._changed_at,
+            "p95_queue_wait_ms": float(np.percentile(queue_waits, 95)) * 1000 if queue_waits else None,
+            "p95_inference_ms": float(np.percentile(latencies, 95)) * 1000 if latencies else None,
+            "slo_queue_wait_ms": self.slo_queue_wait * 1000,
+            "slo_inference_ms": self.slo_latency * 1000,
+        }
@@ -0,0 +1,142 @@
+# utils/scoring.py - Vectorized landmark scoring for the symmetry analyzer
+
+import numpy as np
+
+# Enhanced facial landmark pairs for better symmetry detection
+FACIAL_SYMMETRY_PAIRS = [
+    (234, 454), (227, 447), (137, 366),  # Cheek landmarks
+    (130, 359), (133, 362), (145, 374),  # Eye region
+    (61, 291), (84, 314), (17, 18), (200, 199),  # Mouth region
+    (172, 397), (136, 365), (150, 379),  # Jawline
+    (98, 327), (115, 344),  # Nose region
+]
+
+# Face width is measured between the outer cheek points
+FACE_LEFT_CHEEK = 234
+FACE_RIGHT_CHEEK = 454
+
+# MediaPipe PoseLandmark indices used by the arm test
+LEFT_SHOULDER = 11
+RIGHT_SHOULDER = 12
+LEFT_WRIST = 15
+RIGHT_WRIST = 16
+ARM_LANDMARKS = [LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_WRIST, RIGHT_WRIST]
+
+MIN_ARM_VISIBILITY = 0.5
+
+# Arm score: (height, distance) weights of the two symmetry terms, and how steeply each falls with the difference
+ARM_SYMMETRY_WEIGHTS = (0.5, 0.5)
+ARM_SYMMETRY_SCALES = (4, 3)
+
+# Decision thresholds on average symmetry: below them a test is positive
+FACE_THRESHOLD = 0.75
+ARM_THRESHOLD = 0.7
+
+
+def landmarks_to_array(landmarks):
+    """Convert a MediaPipe landmark list into ``(points, visibility)`` float32 arrays.
+
+    ``points`` is (N, 3) x/y/z and ``visibility`` is (N,); landmarks without a
+    visibility field (FaceMesh) report 0.
+    """
+    values = np.array(
+        [(lm.x, lm.y, lm.z, lm.visibility) for lm in landmarks], dtype=np.float32
+    ).reshape(-1, 4)
+    return values[:, :3], values[:, 3]
+
+
+def _as_batch(points):
+    points = np.asarray(points)
+    single = points.ndim == 2
+    return (points[np.newaxis] if single else points), single
+
+
+def _gather(points, landmarks):
+    # Only the landmarks a score uses are widened to float64 (the scalar formulas ran on Python floats)
+    return points[:, landmarks].astype(np.float64)
+
+
+def face_symmetry_scores(points, pairs=FACIAL_SYMMETRY_PAIRS, pair_weights=None):
+    """Face symmetry for (frames, landmarks, 3) points, or a single (landmarks, 3) frame.
+
+    For every left/right pair the horizontal distances from the image centre
+    are compared and damped by how far the left point sits from the vertical
+    centre. The mean difference (weighted by ``pair_weights`` if given) is
+    normalised by half the face width.
+    """
+    points, single = _as_batch(points)
+    pairs = np.asarray(pairs)
+
+    left = _gather(points, pairs[:, 0])[..., :2]
+    right = _gather(points, pairs[:, 1])[..., :2]
+    left_dist = np.abs(left[..., 0] - 0.5)  # Face center at 0.5
+    right_dist = np.abs(right[..., 0] - 0.5)
+    y_factor = 1 + np.abs(left[..., 1] - 0.5) * 0.5
+    distance_diffs = np.abs(left_dist - right_dist) / y_factor
+
+    cheeks = _gather(points, [FACE_LEFT_CHEEK, FACE_RIGHT_CHEEK])
+    face_width = np.abs(cheeks[:, 0, 0] - cheeks[:, 1, 0]) + 1e-6
+    if pair_weights is None:
+        # Row-contiguous layout makes the per-frame mean use the same pairwise summation as np.mean on a list
+        avg_distance_diff = np.mean(np.ascontiguousarray(distance_diffs), axis=1)
+    else:
+        avg_distance_diff = np.average(distance_diffs, axis=1, weights=pair_weights)
+    scores = np.clip(1 - (avg_distance_diff / (face_width * 0.5)), 0, 1)
+    return scores[0] if single else scores
+
+
+def arm_symmetry_scores(points, visibility, min_visibility=MIN_ARM_VISIBILITY,
+                        weights=ARM_SYMMETRY_WEIGHTS, scales=ARM_SYMMETRY_SCALES):
+    """Arm symmetry for (frames, 33, 3) pose points; NaN where a key landmark is not visible.
+
+    Combines how evenly the wrists sit above/below the shoulder line with how
+    evenly they sit either side of the body centre.
+    """
+    height_weight, distance_weight = weights
+    height_scale, distance_scale = scales
+    points, single = _as_batch(points)
+    visibility = np.asarray(visibility).reshape(points.shape[0], -1)
+
+    left_shoulder, right_shoulder, left_wrist, right_wrist = np.moveaxis(_gather(points, ARM_LANDMARKS), 1, 0)
+
+    # Height symmetry
+    shoulder_midpoint_y = (left_shoulder[:, 1] + right_shoulder[:, 1]) / 2
+    left_wrist_height = np.abs(left_wrist[:, 1] - shoulder_midpoint_y)
+    right_wrist_height = np.abs(right_wrist[:, 1] - shoulder_midpoint_y)
+    height_diff = np.abs(left_wrist_height - right_wrist_height)
+    height_symmetry = np.maximum(0, 1 - (height_diff * height_scale))
+
+    # Distance symmetry
+    body_center_x = (left_shoulder[:, 0] + right_shoulder[:, 0]) / 2
+    left_wrist_dist = np.abs(left_wrist[:, 0] - body_center_x)
+    right_wrist_dist = np.abs(right_wrist[:, 0] - body_center_x)
+    dist_diff = np.abs(left_wrist_dist - right_wrist_dist)
+    distance_symmetry = np.maximum(0, 1 - (dist_diff * distance_scale))
+
+    combined_symmetry = (height_symmetry * height_weight + distance_symmetry * distance_weight)
+    scores = np.clip(combined_symmetry, 0, 1)
+
+    visible = np.all(visibility[:, ARM_LANDMARKS] >= min_visibility, axis=1)
+    scores = np.where(visible, scores, np.nan)
+    return scores[0] if single else scores
+
+
+def angles(p1, p2, p3):
+    """Angle in degrees at ``p2`` for broadcastable (..., >=2) point arrays, using x/y only"""
+    a = np.asarray(p1, dtype=np.float64)[..., :2]
+    b = np.asarray(p2, dtype=np.float64)[..., :2]
+    c = np.asarray(p3, dtype=np.float64)[..., :2]
+
+    ba = a - b
+    bc = c - b
+
+    norms = np.linalg.norm(ba, axis=-1) * np.linalg.norm(bc, axis=-1)
+    cosine_angle = np.sum(ba * bc, axis=-1) / (norms + 1e-8)
+    return np.degrees(np.arccos(np.clip(cosine_angle, -1.0, 1.0)))
+
+
+def distances(p1, p2):
+    """Euclidean x/y distance for broadcastable (..., >=2) point arrays"""
+    a = np.asarray(p1, dtype=np.float64)[..., :2]
+    b = np.asarray(p2, dtype=np.float64)[..., :2]
+    return np.sqrt(np.sum((a - b) ** 2, axis=-1))
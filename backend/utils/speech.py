@@ -0,0 +1,383 @@
+# utils/speech.py - In-memory acoustic analysis for the speech test
+
+import os
+import shutil
+import subprocess
+import tempfile
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# WAVE format tags
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+PITCH_MIN_HZ = 60.0
+PITCH_MAX_HZ = 400.0
+# Normalized autocorrelation peak above which a frame counts as periodic (voiced)
+VOICING_THRESHOLD = 0.45
+# Speech frames must be this far above the noise floor
+VAD_MARGIN_DB = 10.0
+VAD_MIN_DB = -60.0
+# Gaps in speech shorter than this are bridged, and speech bursts shorter than SPEECH_MIN_S dropped
+VAD_HANGOVER_S = 0.1
+SPEECH_MIN_S = 0.05
+PAUSE_MIN_S = 0.25
+# Syllable nuclei must rise this much above the surrounding energy dip
+NUCLEUS_PROMINENCE_DB = 3.0
+
+# Recordings ffmpeg can only read from a seekable file are spooled here (tmpfs if available)
+SPOOL_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+# Each component maps a feature onto [0, 1], 1 being typical of dysarthric speech:
+# (feature, weight, value scored 0, value scored 1)
+DYSARTHRIA_COMPONENTS = [
+    ("articulation_rate", 0.30, 4.0, 2.0),      # syllables per second of speech
+    ("pause_ratio", 0.20, 0.2, 0.5),            # share of the utterance spent in pauses
+    ("pitch_variability_st", 0.20, 3.0, 1.0),   # monopitch, std of f0 in semitones
+    ("loudness_variability_db", 0.15, 6.0, 2.0),  # monoloudness, std of frame energy
+    ("voiced_ratio", 0.15, 0.5, 0.2),           # share of speech frames that are periodic
+]
+
+
+def read_wav(data):
+    """Locate the PCM samples of a WAV file held in memory.
+
+    Returns ``(samples, sample_rate)`` where ``samples`` is a (frames, channels)
+    view into ``data`` in its stored dtype; nothing is copied or converted.
+    Supports 8/16/32-bit integer and 32-bit float PCM. Raises ValueError
+    for anything else.
+    """
+    view = memoryview(data)
+    if len(view) < 12 or bytes(view[:4]) != b"RIFF" or bytes(view[8:12]) != b"WAVE":
+        raise ValueError("Not a RIFF/WAVE file")
+
+    fmt = None
+    offset = 12
+    while offset + 8 <= len(view):
+        chunk_id = bytes(view[offset:offset + 4])
+        size = int.from_bytes(view[offset + 4:offset + 8], "little")
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            fmt = bytes(view[body:body + min(size, 40)])
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise ValueError("WAV data chunk before fmt chunk")
+            # Streaming recorders may leave the size unset; the data then runs to the end
+            end = len(view) if size in (0, 0xFFFFFFFF) else min(len(view), body + size)
+            return _pcm_view(view[body:end], fmt)
+        offset = body + size + (size & 1)
+    raise ValueError("WAV file has no data chunk")
+
+
+def _pcm_view(payload, fmt):
+    if len(fmt) < 16:
+        raise ValueError("Truncated WAV fmt chunk")
+    tag = int.from_bytes(fmt[0:2], "little")
+    channels = int.from_bytes(fmt[2:4], "little")
+    sample_rate = int.from_bytes(fmt[4:8], "little")
+    bits = int.from_bytes(fmt[14:16], "little")
+    if tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+        tag = int.from_bytes(fmt[24:26], "little")
+
+    if tag == WAVE_FORMAT_PCM and bits in (8, 16, 32):
+        dtype = {8: np.uint8, 16: np.dtype("<i2"), 32: np.dtype("<i4")}[bits]
+    elif tag == WAVE_FORMAT_IEEE_FLOAT and bits == 32:
+        dtype = np.dtype("<f4")
+    else:
+        raise ValueError(f"Unsupported WAV encoding (format {tag}, {bits} bits)")
+    if channels < 1 or sample_rate < 2 * PITCH_MAX_HZ:
+        raise ValueError(f"Unsupported WAV layout ({channels} channels at {sample_rate} Hz)")
+
+    frame_bytes = channels * np.dtype(dtype).itemsize
+    usable = len(payload) - len(payload) % frame_bytes
+    samples = np.frombuffer(payload[:usable], dtype=dtype).reshape(-1, channels)
+    return samples, sample_rate
+
+
+def pcm_view(data, sample_rate, channels=1):
+    """View raw little-endian 16-bit PCM as (frames, channels), like ``read_wav``"""
+    frame_bytes = 2 * channels
+    usable = len(data) - len(data) % frame_bytes
+    return np.frombuffer(memoryview(data)[:usable], dtype="<i2").reshape(-1, channels), sample_rate
+
+
+def needs_seekable_input(data):
+    """Whether an MP4/m4a recording keeps its index ('moov') after the audio ('mdat').
+
+    ffmpeg reads such a file only by seeking back to the index, which a
+    pipe cannot do. Other containers, and MP4s written with the index
+    first, decode from a pipe.
+    """
+    view = memoryview(data)
+    if len(view) < 8 or bytes(view[4:8]) != b"ftyp":
+        return False
+    offset = 0
+    while offset + 8 <= len(view):
+        size = int.from_bytes(view[offset:offset + 4], "big")
+        box = bytes(view[offset + 4:offset + 8])
+        if box == b"moov":
+            return False
+        if box == b"mdat":
+            return True
+        if size == 1 and offset + 16 <= len(view):
+            size = int.from_bytes(view[offset + 8:offset + 16], "big")
+        if size < 8:
+            # Size 0 runs to the end of the file; anything else is malformed
+            break
+        offset += size
+    return False
+
+
+def transcode_to_wav(data, ffmpeg="ffmpeg", timeout=30.0):
+    """Convert a compressed recording (AAC/m4a, MP3, Ogg, ...) to 16-bit mono WAV bytes with ffmpeg.
+
+    The recording goes to ffmpeg on stdin. Only an MP4 with its index at
+    the end (see ``needs_seekable_input``) is spooled to a file, in
+    SPOOL_DIR, which is tmpfs where the host has one, so the upload still
+    never reaches a disk.
+
+    ffmpeg is optional. Without it, or for input it cannot decode, this
+    raises ValueError, which the speech endpoints answer with 415.
+    """
+    executable = shutil.which(ffmpeg)
+    if executable is None:
+        raise ValueError("Send WAV or raw 16-bit PCM; the server has no ffmpeg to convert compressed recordings")
+    output = ["-vn", "-ac", "1", "-c:a", "pcm_s16le", "-f", "wav", "pipe:1"]
+    try:
+        if needs_seekable_input(data):
+            with tempfile.NamedTemporaryFile(suffix=".m4a", dir=SPOOL_DIR) as source:
+                source.write(data)
+                source.flush()
+                completed = subprocess.run(
+                    [executable, "-nostdin", "-loglevel", "error", "-i", source.name] + output,
+                    stdin=subprocess.DEVNULL, capture_output=True, timeout=timeout
+                )
+        else:
+            completed = subprocess.run(
+                [executable, "-loglevel", "error", "-i", "pipe:0"] + output,
+                input=data, capture_output=True, timeout=timeout
+            )
+    except subprocess.TimeoutExpired:
+        raise ValueError(f"Decoding the recording took over {timeout:g}s")
+    if completed.returncode != 0:
+        error = completed.stderr.decode(errors="replace").strip().splitlines()
+        raise ValueError(f"ffmpeg could not decode the recording: {error[-1] if error else completed.returncode}")
+    return completed.stdout
+
+
+def to_mono_float(block):
+    """Convert a (frames, channels) block of stored samples to mono float32 in [-1, 1]"""
+    if block.dtype == np.uint8:
+        mono = block.mean(axis=1, dtype=np.float32) - 128.0
+        return mono / 128.0
+    mono = block.mean(axis=1, dtype=np.float32)
+    if block.dtype.kind == "i":
+        mono /= float(-np.iinfo(block.dtype).min)
+    return mono
+
+
+class SpeechFeatureExtractor:
+    """Per-frame acoustic features computed chunk by chunk.
+
+    ``feed`` takes mono float samples in any chunk size; only the partial
+    frame at the end of a chunk is carried over, so working memory depends
+    on the chunk, not the recording. Each frame (``frame_ms`` long, every
+    ``hop_ms``) yields energy, zero-crossing rate, spectral centroid,
+    flatness and rolloff, and an autocorrelation pitch estimate with its
+    periodicity.
+    """
+
+    FEATURES = ("energy_db", "zcr", "centroid_hz", "flatness", "rolloff_hz", "f0_hz", "periodicity")
+
+    def __init__(self, sample_rate, frame_ms=40, hop_ms=10):
+        self.sample_rate = sample_rate
+        self.frame_length = int(round(sample_rate * frame_ms / 1000))
+        self.hop = int(round(sample_rate * hop_ms / 1000))
+        self.frame_seconds = self.hop / sample_rate
+        self.samples_seen = 0
+
+        self._window = np.hanning(self.frame_length).astype(np.float32)
+        self._nfft = 1 << (self.frame_length - 1).bit_length()
+        self._freqs = np.fft.rfftfreq(self._nfft, 1 / sample_rate).astype(np.float32)
+
+        # Autocorrelation needs twice the frame to avoid circular wrap-around
+        self._ac_nfft = 2 * self._nfft
+        self._lag_min = max(2, int(sample_rate / PITCH_MAX_HZ))
+        self._lag_max = min(int(sample_rate / PITCH_MIN_HZ), self.frame_length - 2)
+        window_ac = np.fft.irfft(np.abs(np.fft.rfft(self._window, self._ac_nfft)) ** 2)[:self._lag_max + 2]
+        # Dividing by the window's own autocorrelation removes the taper's decay with lag
+        self._window_ac = (window_ac / window_ac[0]).astype(np.float32)
+
+        self._carry = np.zeros(0, dtype=np.float32)
+        self._chunks = {name: [] for name in self.FEATURES}
+
+    def feed(self, samples):
+        samples = np.asarray(samples, dtype=np.float32)
+        self.samples_seen += len(samples)
+        buffer = np.concatenate([self._carry, samples]) if len(self._carry) else samples
+        if len(buffer) < self.frame_length:
+            self._carry = buffer.copy()
+            return
+        frames = sliding_window_view(buffer, self.frame_length)[::self.hop]
+        consumed = len(frames) * self.hop
+        self._carry = buffer[consumed:].copy()
+        for name, values in zip(self.FEATURES, self._frame_features(frames)):
+            self._chunks[name].append(values.astype(np.float32, copy=False))
+
+    def _frame_features(self, frames):
+        centred = frames - frames.mean(axis=1, keepdims=True)
+        energy_db = 10 * np.log10(np.mean(centred ** 2, axis=1) + 1e-10)
+        signs = np.signbit(centred)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (self.frame_length - 1)
+
+        windowed = centred * self._window
+        power = np.abs(np.fft.rfft(windowed, self._nfft, axis=1)) ** 2
+        total = power.sum(axis=1) + 1e-12
+        centroid = power @ self._freqs / total
+        flatness = np.exp(np.mean(np.log(power + 1e-12), axis=1)) / (total / power.shape[1])
+        rolloff = self._freqs[np.argmax(np.cumsum(power, axis=1) >= 0.85 * total[:, None], axis=1)]
+
+        ac = np.fft.irfft(np.abs(np.fft.rfft(windowed, self._ac_nfft, axis=1)) ** 2, axis=1)
+        ac = ac[:, :self._lag_max + 2] / (ac[:, :1] + 1e-12) / self._window_ac
+        search = ac[:, self._lag_min:self._lag_max + 1]
+        peak = np.argmax(search, axis=1)
+        lag = peak + self._lag_min
+        rows = np.arange(len(lag))
+        periodicity = np.minimum(search[rows, peak], 1.0)
+        # Parabolic interpolation around the peak refines the lag below one sample
+        left, centre, right = ac[rows, lag - 1], ac[rows, lag], ac[rows, lag + 1]
+        denominator = left - 2 * centre + right
+        shift = np.where(np.abs(denominator) > 1e-9, 0.5 * (left - right) / np.where(denominator == 0, 1, denominator), 0)
+        f0 = self.sample_rate / (lag + np.clip(shift, -0.5, 0.5))
+        return energy_db, zcr, centroid, flatness, rolloff, f0, periodicity
+
+    def features(self):
+        """All per-frame features so far, as a dict of equal-length float32 arrays"""
+        return {
+            name: np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32)
+            for name, chunks in self._chunks.items()
+        }
+
+
+def _runs(mask):
+    """``(starts, ends)`` of the runs of True in a boolean array (ends exclusive)"""
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def detect_speech(energy_db, frame_seconds):
+    """Voice activity per frame from an energy threshold adapted to the noise floor"""
+    if len(energy_db) == 0:
+        return np.zeros(0, dtype=bool)
+    noise_floor = np.percentile(energy_db, 10)
+    speech = energy_db > max(noise_floor + VAD_MARGIN_DB, VAD_MIN_DB)
+
+    # Bridge short gaps (stop closures, hangover) then drop isolated bursts (clicks)
+    starts, ends = _runs(~speech)
+    short = (ends - starts) * frame_seconds < VAD_HANGOVER_S
+    interior = (starts > 0) & (ends < len(speech))
+    for start, end in zip(starts[short & interior], ends[short & interior]):
+        speech[start:end] = True
+    starts, ends = _runs(speech)
+    for start, end in zip(starts, ends):
+        if (end - start) * frame_seconds < SPEECH_MIN_S:
+            speech[start:end] = False
+    return speech
+
+
+def count_syllable_nuclei(energy_db, voiced, frame_seconds):
+    """Syllable nuclei as prominent, voiced local maxima of the smoothed energy envelope"""
+    if len(energy_db) < 3:
+        return 0
+    envelope = np.convolve(energy_db, np.ones(5) / 5, mode="same")
+    # Nuclei are at least 70 ms apart (faster than any speaking rate)
+    peak_half = max(1, int(round(0.035 / frame_seconds)))
+    dip_half = max(peak_half, int(round(0.1 / frame_seconds)))
+    padded = np.pad(envelope, dip_half, mode="edge")
+    local_max = sliding_window_view(padded, 2 * peak_half + 1)[dip_half - peak_half:][:len(envelope)].max(axis=1)
+    local_min = sliding_window_view(padded, 2 * dip_half + 1)[:len(envelope)].min(axis=1)
+    nuclei = (envelope >= local_max) & voiced & (envelope - local_min >= NUCLEUS_PROMINENCE_DB)
+    # Flat-topped peaks count once
+    return int(np.count_nonzero(nuclei & ~np.concatenate([[False], nuclei[:-1]])))
+
+
+def summarize_features(features, frame_seconds):
+    """Utterance-level speech statistics from per-frame features, or None without enough speech"""
+    energy_db = features["energy_db"]
+    speech = detect_speech(energy_db, frame_seconds)
+    speech_frames = int(np.count_nonzero(speech))
+    if speech_frames * frame_seconds < 0.5:
+        return None
+
+    f0 = features["f0_hz"]
+    voiced = speech & (features["periodicity"] >= VOICING_THRESHOLD) & (f0 >= PITCH_MIN_HZ) & (f0 <= PITCH_MAX_HZ)
+    voiced_f0 = f0[voiced]
+    if len(voiced_f0) >= 2:
+        semitones = 12 * np.log2(voiced_f0 / np.median(voiced_f0))
+        pitch_variability = float(np.std(semitones))
+        mean_f0 = float(np.mean(voiced_f0))
+    else:
+        pitch_variability = 0.0
+        mean_f0 = None
+
+    # Pauses are silences between the first and the last speech frame
+    first, last = np.flatnonzero(speech)[[0, -1]]
+    starts, ends = _runs(~speech[first:last + 1])
+    lengths = (ends - starts) * frame_seconds
+    pauses = lengths[lengths >= PAUSE_MIN_S]
+    utterance_seconds = (last + 1 - first) * frame_seconds
+
+    speech_seconds = speech_frames * frame_seconds
+    nuclei = count_syllable_nuclei(energy_db, voiced, frame_seconds)
+    return {
+        "duration_s": float(len(energy_db) * frame_seconds),
+        "speech_s": float(speech_seconds),
+        "syllables": nuclei,
+        "speech_rate": float(nuclei / utterance_seconds),
+        "articulation_rate": float(nuclei / speech_seconds),
+        "pause_count": int(len(pauses)),
+        "pause_mean_s": float(pauses.mean()) if len(pauses) else 0.0,
+        "pause_max_s": float(pauses.max()) if len(pauses) else 0.0,
+        "pause_ratio": float(pauses.sum() / utterance_seconds),
+        "mean_f0_hz": mean_f0,
+        "pitch_variability_st": pitch_variability,
+        "loudness_variability_db": float(np.std(energy_db[speech])),
+        "voiced_ratio": float(np.count_nonzero(voiced) / speech_frames),
+        "spectral_centroid_hz": float(np.mean(features["centroid_hz"][speech])),
+        "spectral_flatness": float(np.mean(features["flatness"][speech])),
+        "spectral_rolloff_hz": float(np.mean(features["rolloff_hz"][speech])),
+        "zero_crossing_rate": float(np.mean(features["zcr"][speech])),
+    }
+
+
+def dysarthria_score(summary):
+    """Weighted 0-1 score from rate, pausing, prosody and voicing; higher is more dysarthria-like.
+
+    The component ranges follow typical values for healthy adult speech;
+    this is a screening heuristic, not a clinically validated measure.
+    """
+    components = {}
+    for name, weight, normal, impaired in DYSARTHRIA_COMPONENTS:
+        value = (summary[name] - normal) / (impaired - normal)
+        components[name] = float(min(1.0, max(0.0, value)))
+    score = sum(weight * components[name] for name, weight, _, _ in DYSARTHRIA_COMPONENTS)
+    return score, components
+
+
+def analyze_samples(samples, sample_rate, chunk_seconds=1.0):
+    """Extract features from (frames, channels) stored samples, converting one chunk at a time.
+
+    Returns ``(summary, score, components)``, or None when the recording
+    holds too little speech to judge.
+    """
+    extractor = SpeechFeatureExtractor(sample_rate)
+    chunk = max(extractor.frame_length, int(sample_rate * chunk_seconds))
+    for start in range(0, len(samples), chunk):
+        extractor.feed(to_mono_float(samples[start:start + chunk]))
+    summary = summarize_features(extractor.features(), extractor.frame_seconds)
+    if summary is None:
+        return None
+    score, components = dysarthria_score(summary)
+    return summary, score, components
@@ -0,0 +1,111 @@
+# utils/tracking.py - Session-scoped region-of-interest tracking
+
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class RoiTracker:
+    """Runs full-frame detection once, then feeds the model a padded crop around the subject.
+
+    ``detect(model, img_rgb)`` must return a landmark list (normalized to the
+    image it was given) or None. Landmarks found on a crop are mapped back in
+    place to full-frame coordinates, so scores computed from them are the same
+    as for a full-frame detection. The tracker falls back to a full-frame
+    detection whenever the crop result is missing, has low visibility on a
+    keypoint, or touches the crop border.
+
+    One tracker belongs to one session and one checked-out model; the model is
+    reset whenever the crop changes so its internal tracking and smoothing
+    never mix coordinates from two different crops.
+    """
+
+    def __init__(self, model, detect, keypoints=None, padding=0.25, edge_margin=0.02, min_visibility=0.5):
+        self.model = model
+        self.detect = detect
+        self.keypoints = keypoints
+        self.padding = padding
+        self.edge_margin = edge_margin
+        self.min_visibility = min_visibility
+        self.box = None
+        self.frame_size = None
+        self.full_detections = 0
+        self.tracked_frames = 0
+
+    def _points(self, landmarks):
+        if self.keypoints is None:
+            return list(landmarks)
+        return [landmarks[i] for i in self.keypoints]
+
+    def _visible(self, point):
+        # FaceMesh landmarks carry no visibility, which protobuf reports as 0.0
+        return not point.HasField("visibility") or point.visibility >= self.min_visibility
+
+    def _set_box(self, box):
+        if box != self.box:
+            self.model.reset()
+        self.box = box
+
+    def _fit(self, landmarks, width, height):
+        points = [p for p in self._points(landmarks) if self._visible(p)]
+        if not points:
+            return None
+        xs = np.array([p.x for p in points]) * width
+        ys = np.array([p.y for p in points]) * height
+        pad_x = (xs.max() - xs.min()) * self.padding
+        pad_y = (ys.max() - ys.min()) * self.padding
+        x0 = max(0, int(xs.min() - pad_x))
+        y0 = max(0, int(ys.min() - pad_y))
+        x1 = min(width, int(np.ceil(xs.max() + pad_x)))
+        y1 = min(height, int(np.ceil(ys.max() + pad_y)))
+        if x1 - x0 < 16 or y1 - y0 < 16:
+            return None
+        # A crop covering most of the frame saves nothing over full-frame detection
+        if (x1 - x0) * (y1 - y0) > 0.8 * width * height:
+            return None
+        return x0, y0, x1, y1
+
+    def _confident(self, landmarks):
+        low, high = self.edge_margin, 1 - self.edge_margin
+        for point in self._points(landmarks):
+            if not self._visible(point):
+                if self.keypoints is not None:
+                    return False
+                continue
+            if not (low <= point.x <= high and low <= point.y <= high):
+                return False
+        return True
+
+    def _to_frame(self, landmarks, width, height):
+        x0, y0, x1, y1 = self.box
+        crop_w, crop_h = x1 - x0, y1 - y0
+        for point in landmarks:
+            point.x = (point.x * crop_w + x0) / width
+            point.y = (point.y * crop_h + y0) / height
+            point.z = point.z * crop_w / width
+
+    def process(self, img_rgb):
+        """Return full-frame landmarks for ``img_rgb``, or None if nothing was detected"""
+        height, width = img_rgb.shape[:2]
+        if self.frame_size != (width, height):
+            self.frame_size = (width, height)
+            self._set_box(None)
+
+        if self.box is not None:
+            x0, y0, x1, y1 = self.box
+            crop = np.ascontiguousarray(img_rgb[y0:y1, x0:x1])
+            landmarks = self.detect(self.model, crop)
+            if landmarks is not None and self._confident(landmarks):
+                self._to_frame(landmarks, width, height)
+                self.tracked_frames += 1
+                return landmarks
+            logger.debug("ROI tracking lost, re-detecting on the full frame")
+            self._set_box(None)
+
+        landmarks = self.detect(self.model, img_rgb)
+        self.full_detections += 1
+        if landmarks is not None:
+            self._set_box(self._fit(landmarks, width, height))
+        return landmarks
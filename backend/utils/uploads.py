@@ -0,0 +1,160 @@
+# utils/uploads.py - Incremental, bounded body parsing for the upload endpoints
+
+import asyncio
+from collections import deque
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+
+class UploadError(Exception):
+    """Rejected upload; ``status_code`` is 400 for malformed bodies, 408 for stalled ones and 413 for oversized ones"""
+
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def iter_multipart_files(chunks, content_type, field, max_part_bytes, max_total_bytes, max_parts):
+    """Async iterator over the bytes of each ``field`` part of a multipart body, yielded as soon as the part is complete.
+
+    ``chunks`` is the raw request stream (e.g. ``request.stream()``). Only
+    the part being received is buffered, so memory per request stays at one
+    part plus whatever the consumer holds. Other fields are skipped. Limits
+    are enforced while the body is read, so oversized uploads are rejected
+    before they have been received in full. The content type is checked
+    immediately, before any of the body is read.
+    """
+    parts = iter_multipart_parts(chunks, content_type, {field: (max_part_bytes, max_parts)}, max_total_bytes)
+    return _contents(parts)
+
+
+async def _contents(parts):
+    async for _, data in parts:
+        yield data
+
+
+def iter_multipart_parts(chunks, content_type, limits, max_total_bytes):
+    """Like ``iter_multipart_files`` for several fields at once, yielding ``(field, bytes)`` in body order.
+
+    ``limits`` maps each accepted field name to ``(max_part_bytes, max_parts)``;
+    parts of any other field are skipped without being buffered.
+    """
+    mime_type, params = parse_options_header(content_type)
+    boundary = params.get(b"boundary")
+    if mime_type != b"multipart/form-data" or not boundary:
+        raise UploadError(400, "Expected a multipart/form-data body")
+    limits = {name.encode(): limit for name, limit in limits.items()}
+    return _iter_parts(chunks, boundary, limits, max_total_bytes)
+
+
+async def _iter_parts(chunks, boundary, limits, max_total_bytes):
+    completed = deque()
+    headers = {}
+    header_field = bytearray()
+    header_value = bytearray()
+    part = {"name": None, "data": bytearray(), "limit": 0}
+    counts = dict.fromkeys(limits, 0)
+
+    def on_part_begin():
+        headers.clear()
+        part["name"] = None
+        part["data"] = bytearray()
+
+    def on_header_field(data, start, end):
+        header_field.extend(data[start:end])
+
+    def on_header_value(data, start, end):
+        header_value.extend(data[start:end])
+
+    def on_header_end():
+        headers[bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished():
+        _, options = parse_options_header(headers.get(b"content-disposition"))
+        name = options.get(b"name")
+        if name not in limits:
+            return
+        max_part_bytes, max_parts = limits[name]
+        counts[name] += 1
+        if counts[name] > max_parts:
+            raise UploadError(413, f"Too many '{name.decode()}' parts (limit {max_parts})")
+        part["name"] = name
+        part["limit"] = max_part_bytes
+
+    def on_part_data(data, start, end):
+        if part["name"] is None:
+            return
+        if len(part["data"]) + (end - start) > part["limit"]:
+            name = part["name"].decode()
+            raise UploadError(413, f"Part {counts[part['name']]} of '{name}' exceeds {part['limit']} bytes")
+        part["data"].extend(data[start:end])
+
+    def on_part_end():
+        if part["name"] is not None:
+            completed.append((part["name"].decode(), bytes(part["data"])))
+        part["data"] = bytearray()
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+    })
+
+    received = 0
+    async for chunk in chunks:
+        received += len(chunk)
+        if received > max_total_bytes:
+            raise UploadError(413, f"Request body exceeds {max_total_bytes} bytes")
+        try:
+            parser.write(chunk)
+        except UploadError:
+            raise
+        except Exception as e:
+            raise UploadError(400, f"Malformed multipart body: {e}")
+        while completed:
+            yield completed.popleft()
+
+    parser.finalize()
+    while completed:
+        yield completed.popleft()
+
+
+async def with_part_timeout(parts, timeout):
+    """Re-yield ``parts``, raising UploadError (408) when the next one takes over ``timeout`` seconds to arrive.
+
+    Bounds how long a slow sender can keep a job that is already running
+    waiting for input. A ``timeout`` of 0 or less disables the limit.
+    """
+    iterator = parts.__aiter__()
+    while True:
+        try:
+            item = await asyncio.wait_for(iterator.__anext__(), timeout if timeout > 0 else None)
+        except StopAsyncIteration:
+            return
+        except asyncio.TimeoutError:
+            raise UploadError(408, f"No part received for {timeout:g} seconds")
+        yield item
+
+
+async def read_body(chunks, max_bytes):
+    """The whole body of ``chunks``, raising UploadError (413) as soon as it grows past ``max_bytes``.
+
+    Unlike ``request.body()`` it never holds more than ``max_bytes``, whatever
+    the client claimed in Content-Length (or when it sent none).
+    """
+    body = bytearray()
+    async for chunk in chunks:
+        if len(body) + len(chunk) > max_bytes:
+            raise UploadError(413, f"Request body exceeds {max_bytes} bytes")
+        body += chunk
+    return body